@@ -0,0 +1,9 @@
+"""
+benchmarks
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Benchmarks for hyperpyron. Each module is run with
+python -m benchmarks.<module>. See the docstring of each
+for usage. bench_suite runs the whole pipeline on data
+from synthetic and saves machine readable results.
+"""
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/bench_amounts.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Compares vectorized amount parsing against the original
+per-row code on a column of amounts.
+
+Usage:
+python -m benchmarks.bench_amounts [nrows]
+"""
+
+# python
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+
+# hyperpyron
+from hyperpyron.parsers import parse_amounts
+
+REPEATS = 3
+
+def legacy_amounts(column,expenditures_positive=True):
+    "The original per-row amount handling"
+    if not np.any(column.apply(lambda x: type(x) is float)):
+        column = column.apply(lambda x: float(x.lstrip("$")))
+    if expenditures_positive:
+        column = column.apply(lambda x: x*-1)
+    return column
+
+def per_row_amounts(column,expenditures_positive=True):
+    """The original per-row approach, extended to the
+    accounting format it can't parse, e.g., '($1,234.50)'
+    """
+    def parse(x):
+        x = x.replace('$','').replace(',','')
+        if x.startswith('(') and x.endswith(')'):
+            return -float(x[1:-1])
+        return float(x)
+    column = column.apply(parse)
+    if expenditures_positive:
+        column = column.apply(lambda x: x*-1)
+    return column
+
+def vectorized_amounts(column,expenditures_positive=True):
+    "Amount handling with parse_amounts"
+    column = parse_amounts(column)
+    if expenditures_positive:
+        column = -column
+    return column
+
+def make_amounts(rng,nrows,style):
+    "Makes nrows amounts formatted as a bank might"
+    values = np.round(rng.normal(0,500,size=nrows),2)
+    if style == 'plain':
+        text = ['{:.2f}'.format(v) for v in values]
+    elif style == 'dollar':
+        text = ['${:.2f}'.format(v) for v in values]
+    else:
+        text = ['(${:,.2f})'.format(-v) if v < 0
+                else '${:,.2f}'.format(v) for v in values]
+    return pd.Series(text,dtype=object)
+
+def best_of(f,column):
+    return min(timeit.repeat(lambda: f(column),
+                             number=1,repeat=REPEATS))
+
+def main(nrows):
+    rng = np.random.default_rng(42)
+    print("{:>12} {:>12} {:>14} {:>10}".format(
+        "format","legacy (s)","vectorized (s)","speedup"))
+    for style in ['plain','dollar','accounting']:
+        column = make_amounts(rng,nrows,style)
+        t_new = best_of(vectorized_amounts,column)
+        # the original code can't parse accounting amounts
+        # at all, so they're compared against doing the
+        # same clean up row by row
+        legacy = per_row_amounts if style == 'accounting' else legacy_amounts
+        if not np.allclose(legacy(column),vectorized_amounts(column)):
+            raise ValueError("Amount parsers disagree")
+        t_old = best_of(legacy,column)
+        print("{:>12} {:>12.4f} {:>14.4f} {:>9.1f}x".format(
+            style,t_old,t_new,t_old/t_new))
+
+if __name__ == "__main__":
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    main(nrows)
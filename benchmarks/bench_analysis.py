@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/bench_analysis.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Benchmarks every public function in hyperpyron.analysis
+on compact, date-indexed frames of several sizes.
+Requires pytest-benchmark.
+
+Usage:
+python -m pytest benchmarks/bench_analysis.py
+python -m pytest benchmarks/bench_analysis.py --benchmark-json=out.json
+"""
+
+# python
+import numpy as np
+import pandas as pd
+import pytest
+import matplotlib
+matplotlib.use('Agg')
+
+# hyperpyron
+from hyperpyron import analysis
+from hyperpyron.categories import CATEGORIES
+from hyperpyron.schema import compact,index_by_date
+from hyperpyron.rollup import Rollup
+
+SIZES = [1000,100000,1000000]
+YEARS = 10
+CUTOFF = 5.0
+
+def make_frame(nrows,seed=42):
+    "Makes a compact, date-indexed transaction frame"
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2010-01-01')
+    days = np.sort(rng.integers(365*YEARS,size=nrows))
+    merchants = np.array(['MERCHANT {:04d}'.format(i)
+                          for i in range(2000)],dtype=object)
+    frame = pd.DataFrame({
+        'Date' : start + pd.to_timedelta(days,unit='D'),
+        'Description' : merchants[rng.integers(len(merchants),
+                                               size=nrows)],
+        'Amount' : np.round(rng.normal(-50,100,size=nrows),2),
+        'Category' : np.array(sorted(CATEGORIES),dtype=object)[
+            rng.integers(len(CATEGORIES),size=nrows)],
+        'Account' : rng.choice(['checking','credit'],size=nrows)})
+    return index_by_date(compact(frame))
+
+def make_budget(frame):
+    "A budget with the same categories as frame"
+    categories = analysis.sum_by_category(frame).index
+    budget = pd.Series(-100.0,index=categories,name="Budget")
+    budget["Total"] = budget.sum()
+    return budget
+
+@pytest.fixture(scope='module',params=SIZES,ids=lambda n: str(n))
+def frame(request):
+    return make_frame(request.param)
+
+@pytest.fixture(scope='module')
+def window(frame):
+    "The last year of frame"
+    after = frame.index[-1]
+    return after - pd.Timedelta(days=365),after
+
+def test_filter_frame_between_dates(benchmark,frame,window):
+    benchmark(analysis.filter_frame_between_dates,frame,*window)
+
+def test_get_dates_for_n_days_ago_and_now(benchmark):
+    benchmark(analysis.get_dates_for_n_days_ago_and_now,30)
+
+def test_dataframe_from_n_days_ago_to_now(benchmark,frame):
+    benchmark(analysis.dataframe_from_n_days_ago_to_now,frame,365*YEARS)
+
+def test_ignore_income(benchmark,frame):
+    benchmark(analysis.ignore_income,frame)
+
+def test_sum_by_category(benchmark,frame):
+    benchmark(analysis.sum_by_category,frame)
+
+def test_calculate_percentages(benchmark,frame):
+    benchmark(analysis.calculate_percentages,frame)
+
+def test_calculate_percentages_rollup(benchmark,frame,window):
+    rollup = Rollup.from_frame(frame).window(*window)
+    benchmark(analysis.calculate_percentages,rollup)
+
+def test_combine_percentages(benchmark,frame):
+    percentages = analysis.calculate_percentages(frame)
+    benchmark(analysis.combine_percentages,percentages,CUTOFF)
+
+def test_get_category_sums(benchmark,frame):
+    benchmark(analysis.get_category_sums,frame)
+
+def test_get_category_sums_rollup(benchmark,frame,window):
+    rollup = Rollup.from_frame(frame).window(*window)
+    benchmark(analysis.get_category_sums,rollup)
+
+def test_combine_expenses(benchmark,frame):
+    benchmark(analysis.combine_expenses,frame,CUTOFF)
+
+def test_plot_percent_expenditures(benchmark,frame):
+    benchmark(analysis.plot_percent_expenditures,frame,
+              show=False,cutoff=CUTOFF)
+
+def test_plot_net_cashflow(benchmark,frame):
+    benchmark(analysis.plot_net_cashflow,frame,
+              show=False,cutoff=CUTOFF)
+
+def test_compare_cashflow_to_budget(benchmark,frame):
+    budget = make_budget(frame)
+    benchmark(analysis.compare_cashflow_to_budget,frame,budget,
+              show=False)
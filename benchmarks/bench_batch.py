@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/bench_batch.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Measures the throughput of the batch driver on many
+small synthetic homes, with one worker and with one
+per core. See hyperpyron.batch and benchmarks.synthetic.
+
+Usage:
+python -m benchmarks.bench_batch [--homes N] [--rows N] [--report PERIOD]
+"""
+
+# python
+import os
+import argparse
+import tempfile
+
+# hyperpyron
+from hyperpyron.batch import run_batch
+from benchmarks import synthetic
+
+HOMES = 16
+ROWS = 10000
+FILES = 4
+KEYWORDS = 100
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks batch ingestion of many homes")
+    parser.add_argument('--homes',type=int,default=HOMES,
+                        help="Number of homes")
+    parser.add_argument('--rows',type=int,default=ROWS,
+                        help="Transactions in each home")
+    parser.add_argument('--report',choices=['week','month','year'],
+                        help="Also render reports for every period")
+    return parser
+
+def main():
+    args = get_parser().parse_args()
+    cores = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as d:
+        homes = []
+        for i in range(args.homes):
+            home = os.path.join(d,'home-{:04d}'.format(i))
+            synthetic.generate(home,FILES,args.rows,KEYWORDS,seed=i)
+            homes.append(home)
+        print("{:>8} {:>8} {:>10} {:>10} {:>12} {:>14}".format(
+            "homes","jobs","rows","wall (s)","rows/s","homes/s"))
+        for jobs in sorted(set([1,cores])):
+            results,summary = run_batch(homes,jobs,'process',
+                                        args.report,rebuild=True)
+            assert summary['failed'] == 0
+            print("{:>8} {:>8} {:>10} {:>10.2f} {:>12.0f} {:>14.2f}".format(
+                args.homes,jobs,summary['rows'],summary['wall'],
+                summary['rows_per_s'],summary['workspaces_per_s']))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/bench_cache.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Compares save and load times of the frame cache formats,
+for the whole frame and for a 30 day window.
+
+Usage:
+python -m benchmarks.bench_cache [nrows ...]
+"""
+
+# python
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+# hyperpyron
+from hyperpyron.categories import CATEGORIES
+from hyperpyron.cacheformats import cache_formats
+
+SIZES = [10000,1000000,10000000]
+YEARS = 10
+
+def make_frame(rng,nrows):
+    "Makes a date-sorted transaction frame with nrows rows"
+    start = pd.Timestamp('2010-01-01')
+    days = np.sort(rng.integers(365*YEARS,size=nrows))
+    merchants = np.array(['MERCHANT {:04d}'.format(i)
+                          for i in range(2000)],dtype=object)
+    return pd.DataFrame({
+        'Date' : start + pd.to_timedelta(days,unit='D'),
+        'Description' : merchants[rng.integers(len(merchants),
+                                               size=nrows)],
+        'Amount' : np.round(rng.normal(-50,100,size=nrows),2),
+        'Category' : np.array(sorted(CATEGORIES),dtype=object)[
+            rng.integers(len(CATEGORIES),size=nrows)]})
+
+def timed(f,*args):
+    "Returns the result of f(*args) and the wall time it took"
+    start = time.perf_counter()
+    out = f(*args)
+    return out,time.perf_counter()-start
+
+def main(sizes):
+    rng = np.random.default_rng(42)
+    print("{:>10} {:>8} {:>10} {:>10} {:>10}".format(
+        "rows","format","save (s)","load (s)","30 days (s)"))
+    for nrows in sizes:
+        frame = make_frame(rng,nrows)
+        after = frame.Date.iloc[-1]
+        before = after - timedelta(days=30)
+        for name,FormatClass in sorted(cache_formats.items()):
+            if not FormatClass.available():
+                print("{:>10d} {:>8} unavailable".format(nrows,name))
+                continue
+            fmt = FormatClass()
+            with tempfile.TemporaryDirectory() as d:
+                target = fmt.target(d,'frame')
+                _,t_save = timed(fmt.save,frame,target)
+                _,t_load = timed(fmt.load,target)
+                window,t_window = timed(fmt.load,target,before,after)
+            print("{:>10d} {:>8} {:>10.4f} {:>10.4f} {:>10.4f}".format(
+                nrows,name,t_save,t_load,t_window))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sizes = [int(n) for n in sys.argv[1:]]
+    else:
+        sizes = SIZES
+    main(sizes)
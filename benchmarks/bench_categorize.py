@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/bench_categorize.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Compares the compiled CategoryMatcher against the original
+keyword-by-keyword categorization loop as the number of
+keywords grows.
+
+Usage:
+python -m benchmarks.bench_categorize [nrows]
+"""
+
+# python
+import sys
+import string
+import timeit
+import numpy as np
+import pandas as pd
+
+# hyperpyron
+from hyperpyron.categories import CATEGORIES
+from hyperpyron.matching import CategoryMatcher
+
+RULE_COUNTS = [10,100,300,1000]
+REPEATS = 3
+
+def random_words(rng,n,length=8):
+    "Makes n random lowercase words"
+    letters = np.array(list(string.ascii_lowercase))
+    chars = rng.choice(letters,size=(n,length))
+    return [''.join(row) for row in chars]
+
+def make_rules(rng,nkeywords):
+    "Spreads nkeywords random keywords over the categories"
+    categories = {c : [] for c in CATEGORIES}
+    order = sorted(CATEGORIES)
+    for i,word in enumerate(random_words(rng,nkeywords)):
+        categories[order[i % len(order)]].append(word)
+    return categories
+
+def make_descriptions(rng,nrows,keywords,nmerchants=5000):
+    """Makes nrows descriptions drawn from a pool of merchants,
+    about half of which contain a keyword.
+    """
+    merchants = random_words(rng,nmerchants,12)
+    for i in range(0,nmerchants,2):
+        k = keywords[rng.integers(len(keywords))]
+        merchants[i] = "POS "+merchants[i][:4]+k.upper()+" #123"
+    picks = rng.integers(nmerchants,size=nrows)
+    return pd.Series(np.array(merchants,dtype=object)[picks])
+
+def legacy_categorize(descriptions,categories):
+    "The original per-keyword categorization loop"
+    out = pd.Series(np.full(len(descriptions),None,dtype=object),
+                    index=descriptions.index)
+    for c in CATEGORIES:
+        for d in categories[c]:
+            row_mask = descriptions.apply(lambda x: d in x.lower())
+            out.loc[row_mask] = c
+    return out
+
+def compiled_categorize(descriptions,categories):
+    "Builds a matcher and categorizes with it"
+    return CategoryMatcher(categories).match(descriptions)
+
+def main(nrows):
+    rng = np.random.default_rng(42)
+    print("{:>10} {:>12} {:>12} {:>10}".format("keywords",
+                                               "legacy (s)",
+                                               "compiled (s)",
+                                               "speedup"))
+    for nkeywords in RULE_COUNTS:
+        categories = make_rules(rng,nkeywords)
+        keywords = [k for v in categories.values() for k in v]
+        descriptions = make_descriptions(rng,nrows,keywords)
+        legacy = legacy_categorize(descriptions,categories)
+        compiled = compiled_categorize(descriptions,categories)
+        if np.any(legacy.fillna('').values
+                  != compiled.fillna('').values):
+            raise ValueError("Matchers disagree for "
+                             +str(nkeywords)+" keywords")
+        t_legacy = min(timeit.repeat(
+            lambda: legacy_categorize(descriptions,categories),
+            number=1,repeat=REPEATS))
+        t_compiled = min(timeit.repeat(
+            lambda: compiled_categorize(descriptions,categories),
+            number=1,repeat=REPEATS))
+        print("{:>10d} {:>12.4f} {:>12.4f} {:>9.1f}x".format(
+            nkeywords,t_legacy,t_compiled,t_legacy/t_compiled))
+
+if __name__ == "__main__":
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    main(nrows)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/bench_formats.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Measures ingestion throughput of each data format's
+parser, from file on disk to normalized frame, in rows
+and megabytes per second. The same transactions are
+written as CSV, OFX, QIF and JSON Lines. The per-file
+cache is not used, so every run parses.
+
+Usage:
+python -m benchmarks.bench_formats [nrows ...]
+"""
+
+# python
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+# hyperpyron
+from hyperpyron.parsers import get_data_parser
+
+SIZES = [10000,100000,1000000]
+REPEATS = 3
+YEARS = 10
+
+def make_transactions(rng,nrows):
+    "Makes nrows transactions as a bank might export them"
+    start = pd.Timestamp('2010-01-01')
+    days = np.sort(rng.integers(365*YEARS,size=nrows))
+    merchants = np.array(['MERCHANT {:04d}'.format(i)
+                          for i in range(2000)],dtype=object)
+    cats = np.array(['Groceries','Dining','Gas','Shopping','Salary'],
+                    dtype=object)
+    return pd.DataFrame({
+        'Date' : start + pd.to_timedelta(days,unit='D'),
+        'Description' : merchants[rng.integers(len(merchants),
+                                               size=nrows)],
+        'Amount' : np.round(rng.normal(-50,100,size=nrows),2),
+        'Category' : cats[rng.integers(len(cats),size=nrows)],
+        'Id' : np.arange(nrows)})
+
+def write_csv(frame,fpath):
+    frame.to_csv(fpath,index=False,date_format='%Y-%m-%d')
+
+def write_ofx(frame,fpath):
+    "Writes frame as an SGML, version 1.x, OFX file"
+    records = ("<STMTTRN>\n<TRNTYPE>OTHER\n"
+               + "<DTPOSTED>" + frame['Date'].dt.strftime('%Y%m%d')
+               + "120000\n<TRNAMT>" + frame['Amount'].map('{:.2f}'.format)
+               + "\n<FITID>" + frame['Id'].astype(str)
+               + "\n<NAME>" + frame['Description']
+               + "\n</STMTTRN>\n")
+    with open(fpath,'w') as f:
+        f.write("OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\n\n"
+                "<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>"
+                "<BANKTRANLIST>\n")
+        f.write("".join(records))
+        f.write("</BANKTRANLIST></STMTRS></STMTTRNRS>"
+                "</BANKMSGSRSV1></OFX>\n")
+
+def write_qif(frame,fpath):
+    records = ("D" + frame['Date'].dt.strftime('%m/%d/%Y')
+               + "\nT" + frame['Amount'].map('{:,.2f}'.format)
+               + "\nP" + frame['Description']
+               + "\nL" + frame['Category']
+               + "\n^\n")
+    with open(fpath,'w') as f:
+        f.write("!Type:Bank\n")
+        f.write("".join(records))
+
+def write_jsonl(frame,fpath):
+    out = frame.assign(Date=frame['Date'].dt.strftime('%Y-%m-%d'))
+    out.to_json(fpath,orient='records',lines=True)
+
+CATEGORIES = {'Dining' : 'Restaurants',
+              'Gas' : 'Automotive',
+              'Shopping' : 'Retail',
+              'Salary' : 'Income'}
+COLUMNS = {'Date' : 'Date',
+           'Description' : 'Description',
+           'Amount' : 'Amount',
+           'Category' : 'Category'}
+FORMATS = {'csv' : (write_csv,{'type' : 'csv',
+                               'use column names' : True,
+                               'columns' : COLUMNS,
+                               'categories' : CATEGORIES}),
+           'ofx' : (write_ofx,{'type' : 'ofx',
+                               'duplicate checking' : True}),
+           'qif' : (write_qif,{'type' : 'qif',
+                               'categories' : CATEGORIES}),
+           'jsonl' : (write_jsonl,{'type' : 'jsonl',
+                                   'columns' : COLUMNS,
+                                   'categories' : CATEGORIES})}
+
+def ingest(rules,fpath):
+    "Parses fpath all the way to a normalized frame"
+    ParserClass = get_data_parser(rules['type'])
+    parser = ParserClass(dict(rules),lazy=True)
+    return parser.import_files([fpath])
+
+def best_of(f):
+    times = []
+    for i in range(REPEATS):
+        start = time.perf_counter()
+        out = f()
+        times.append(time.perf_counter()-start)
+    return min(times),out
+
+def main(sizes):
+    rng = np.random.default_rng(42)
+    print("{:>10} {:>8} {:>10} {:>10} {:>12} {:>8}".format(
+        "rows","format","size (MB)","time (s)","rows/s","MB/s"))
+    for nrows in sizes:
+        frame = make_transactions(rng,nrows)
+        for name,(write,rules) in FORMATS.items():
+            with tempfile.TemporaryDirectory() as d:
+                fpath = os.path.join(d,'data.'+name)
+                write(frame,fpath)
+                rules = dict(rules,directory=d)
+                megabytes = os.path.getsize(fpath)/2**20
+                t,out = best_of(lambda: ingest(rules,fpath))
+            assert len(out) == nrows, (name,len(out))
+            print("{:>10} {:>8} {:>10.1f} {:>10.3f} {:>12.0f} {:>8.1f}".format(
+                nrows,name,megabytes,t,nrows/t,megabytes/t))
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    main(sizes)
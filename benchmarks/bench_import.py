@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/bench_import.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Times how long it takes to start hyperpyron in a fresh
+interpreter, for the paths that should not load pandas
+or matplotlib and for the ones that must, along with a
+bare interpreter for reference. Also reports which of
+the heavy packages each path imported.
+
+Usage:
+python -m benchmarks.bench_import [repeats]
+"""
+
+# python
+import sys
+import time
+import subprocess
+
+REPEATS = 10
+HEAVY = ['numpy','pandas','matplotlib','yaml']
+CASES = [('python',['-c','pass']),
+         ('import hyperpyron',['-c','import hyperpyron']),
+         ('hyperpyron --help',['-m','hyperpyron','--help']),
+         ('hyperpyron --init',['-m','hyperpyron','--init']),
+         ('import analysis',['-c','import hyperpyron.analysis']),
+         ('import hyperparse',['-c','import hyperpyron.hyperparse'])]
+
+def startup_time(args,repeats):
+    "The fastest of repeats runs of python with args, in seconds"
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable]+args,
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter()-start)
+    return min(times)
+
+def heavy_imports(args):
+    "Which of HEAVY the interpreter imported when run with args"
+    out = subprocess.run([sys.executable,'-X','importtime']+args,
+                         stdout=subprocess.DEVNULL,
+                         stderr=subprocess.PIPE,
+                         universal_newlines=True).stderr
+    imported = set(line.split('|')[-1].strip()
+                   for line in out.splitlines()
+                   if line.startswith('import time:'))
+    return [name for name in HEAVY if name in imported]
+
+def main(repeats):
+    print("{:>20} {:>10}  {}".format("case","time (ms)","heavy imports"))
+    for name,args in CASES:
+        t = startup_time(args,repeats)
+        heavy = heavy_imports(args)
+        print("{:>20} {:>10.1f}  {}".format(name,1e3*t,
+                                            ", ".join(heavy) or "-"))
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else REPEATS
+    main(repeats)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/bench_suite.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Runs the whole pipeline on synthetic data at one or more
+sizes and records how long each step takes: cold and
+warm ingest, streaming ingest, cache save and load,
+categorization, date filtering, every aggregation and
+every plot, on the transaction frame, the rollup cube
+and the SQLite store where all are accepted. See benchmarks.synthetic.
+
+Results are written as JSON, along with the commit and
+library versions, so runs can be compared across
+commits. Comparing prints the ratio of the new time to
+the old for every case, and exits with status 1 if any
+case slowed down by more than the threshold.
+
+Each size runs in its own interpreter, against its own
+HYPERPYRON_HOME, so that sizes share neither caches
+nor memory.
+
+Usage:
+python -m benchmarks.bench_suite [--rows N ...] [-o results.json]
+python -m benchmarks.bench_suite --compare old.json new.json
+"""
+
+# python
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+# benchmarks
+from benchmarks import synthetic
+
+SIZES = [10000,100000]
+REPEATS = 3
+CHUNKSIZE = 50000
+WINDOW_DAYS = 90
+THRESHOLD = 1.10
+RESULTS_FILENAME = "bench-results.json"
+
+def measure(results,group,name,f,repeats,setup=None,rows=None):
+    """Times f, repeats times, calling setup before each
+    run without timing it. Appends the result to results
+    and returns what f returned the last time.
+    """
+    times = []
+    for i in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        out = f()
+        times.append(time.perf_counter()-start)
+    results.append({'group' : group,
+                    'name' : name,
+                    'rows' : rows,
+                    'repeats' : repeats,
+                    'min' : min(times),
+                    'median' : statistics.median(times),
+                    'rows_per_s' : rows/min(times) if rows else None})
+    return out
+
+def run_cases(repeats,plotdir):
+    """Runs every case against the HYPERPYRON_HOME in
+    the environment and returns the results
+    """
+    import pandas as pd
+    from hyperpyron import hyperparse,analysis,trends,reports
+    from hyperpyron.budget import get_budget,track_budget
+    from hyperpyron.categories import get_categories
+    from hyperpyron.matching import CategoryMatcher,get_matcher
+    from hyperpyron.parseconfig import DataRulesParser
+    from hyperpyron.rollup import Rollup
+    from hyperpyron.sysdirs import get_workspace
+    workspace = get_workspace()
+    cache_dir = workspace.cache_dir
+    parse_conf_dir = workspace.parse_conf_dir
+    results = []
+    def clear_cache():
+        shutil.rmtree(cache_dir,ignore_errors=True)
+
+    # ingest
+    measure(results,'ingest','stream',
+            lambda: hyperparse.stream_to_cache(workspace,CHUNKSIZE),
+            repeats,clear_cache)
+    frame = measure(results,'ingest','cold',
+                    lambda: hyperparse.parse_from_data(workspace),
+                    repeats,clear_cache)
+    rows = len(frame)
+    for r in results:
+        # rows ingested are only known afterwards
+        r.update(rows=rows,rows_per_s=rows/r['min'])
+    measure(results,'ingest','warm',
+            lambda: hyperparse.parse_from_data(workspace),
+            repeats,rows=rows)
+    after = frame['Date'].iloc[-1]
+    window = (after - pd.Timedelta(days=WINDOW_DAYS),after)
+
+    # cache
+    measure(results,'cache','save',
+            lambda: hyperparse.save_to_cache(workspace,frame),
+            repeats,rows=rows)
+    measure(results,'cache','load',
+            lambda: hyperparse.load_from_cache(workspace),
+            repeats,rows=rows)
+    measure(results,'cache','load window',
+            lambda: hyperparse.load_from_cache(workspace,*window),repeats)
+    rollup = measure(results,'cache','load rollup',
+                     lambda: hyperparse.load_rollup(workspace),repeats)
+    def clear_store():
+        hyperparse.get_store(workspace).clear()
+    measure(results,'cache','store sync',
+            lambda: hyperparse.save_to_store(workspace,frame),
+            repeats,clear_store,rows=rows)
+    measure(results,'cache','store resync',
+            lambda: hyperparse.save_to_store(workspace,frame),
+            repeats,rows=rows)
+    store = hyperparse.load_store(workspace)
+    measure(results,'rollup','build',lambda: Rollup.from_frame(frame),
+            repeats,rows=rows)
+
+    # configs, which are memoized after the first load
+    measure(results,'config','load',
+            lambda: (DataRulesParser(parse_conf_dir),
+                     get_categories(workspace),get_budget(None,workspace),
+                     get_matcher(workspace)),
+            repeats)
+
+    # categorize
+    descriptions = frame['Description']
+    measure(results,'categorize','match',
+            lambda: CategoryMatcher(
+                get_categories(workspace)).match(descriptions),
+            repeats,rows=rows)
+
+    # filter, aggregate and plot
+    budget = get_budget(None,workspace)
+    data = {'frame' : frame,'rollup' : rollup,'store' : store}
+    for kind,d in data.items():
+        measure(results,'filter',kind,
+                lambda: analysis.filter_frame_between_dates(d,*window),
+                repeats)
+    aggregations = {
+        'calculate_percentages' : analysis.calculate_percentages,
+        'get_category_sums' : analysis.get_category_sums,
+        'combine_expenses' : lambda d: analysis.combine_expenses(d,5.0),
+        'spending_by_period' : trends.spending_by_period,
+        'net_by_period' : trends.net_by_period,
+        'rolling_cashflow' : trends.rolling_cashflow,
+        'cumulative_cashflow' : trends.cumulative_cashflow,
+        'period_over_period' : trends.period_over_period,
+        'track_budget' : lambda d: track_budget(d,budget)}
+    frame_only = {
+        'ignore_income' : analysis.ignore_income,
+        'sum_by_category' : analysis.sum_by_category}
+    def savepath(name):
+        return os.path.join(plotdir,name+'.png')
+    plots = {
+        'plot_percent_expenditures' : lambda d: (
+            analysis.plot_percent_expenditures(
+                d,savepath('percent'),False,5.0)),
+        'plot_net_cashflow' : lambda d: (
+            analysis.plot_net_cashflow(d,savepath('cashflow'),False,5.0)),
+        'compare_cashflow_to_budget' : lambda d: (
+            analysis.compare_cashflow_to_budget(
+                d,budget,savepath('budget'),False)),
+        'plot_spending_trends' : lambda d: (
+            trends.plot_spending_trends(d,'month',savepath('trends'),
+                                        False,5.0)),
+        'plot_rolling_cashflow' : lambda d: (
+            trends.plot_rolling_cashflow(d,savepath('rolling'),False)),
+        'plot_cumulative_cashflow' : lambda d: (
+            trends.plot_cumulative_cashflow(d,savepath('cumulative'),
+                                            False)),
+        'plot_period_over_period' : lambda d: (
+            trends.plot_period_over_period(d,'month',savepath('deltas'),
+                                           False)),
+        'batch_report' : lambda d: (
+            reports.batch_report(d,plotdir,'year',jobs=1,
+                                 executor='serial',budget=budget))}
+    for group,cases,kinds in [('aggregate',aggregations,data),
+                              ('aggregate',frame_only,['frame']),
+                              ('plot',plots,data)]:
+        for name,f in cases.items():
+            for kind in kinds:
+                measure(results,group,'{} ({})'.format(name,kind),
+                        lambda: f(data[kind]),repeats)
+    return results
+
+def run_size(nrows,nfiles,nkeywords,repeats):
+    """Generates a synthetic home with nrows transactions
+    and runs every case against it, in a new interpreter.
+    """
+    with tempfile.TemporaryDirectory() as d:
+        home = os.path.join(d,'home')
+        params = synthetic.generate(home,nfiles,nrows,nkeywords)
+        out = os.path.join(d,'results.json')
+        env = dict(os.environ,HYPERPYRON_HOME=home)
+        subprocess.run([sys.executable,'-m','benchmarks.bench_suite',
+                        '--worker',out,'--repeats',str(repeats)],
+                       env=env,check=True,
+                       stdout=subprocess.DEVNULL)
+        with open(out,'r') as f:
+            results = json.load(f)
+    for r in results:
+        r.update(size=nrows,files=params['files'],
+                 keywords=params['keywords'])
+    return results
+
+def metadata():
+    "Where and on what the benchmarks ran"
+    import numpy,pandas,matplotlib
+    def git(*args):
+        try:
+            return subprocess.run(['git']+list(args),
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL,
+                                  universal_newlines=True).stdout.strip()
+        except OSError:
+            return None
+    return {'commit' : git('rev-parse','HEAD'),
+            'dirty' : bool(git('status','--porcelain',
+                               '--untracked-files=no')),
+            'date' : datetime.now().isoformat(timespec='seconds'),
+            'python' : platform.python_version(),
+            'numpy' : numpy.__version__,
+            'pandas' : pandas.__version__,
+            'matplotlib' : matplotlib.__version__,
+            'platform' : platform.platform(),
+            'cpus' : os.cpu_count()}
+
+def compare(old,new,threshold=THRESHOLD):
+    """Prints the ratio of new to old minimum times for
+    every case in both. Returns the number of cases
+    slower than threshold times the old time.
+    """
+    key = lambda r: (r['size'],r['group'],r['name'])
+    before = {key(r) : r for r in old['results']}
+    print("old: {} {}".format(old['meta']['commit'],old['meta']['date']))
+    print("new: {} {}".format(new['meta']['commit'],new['meta']['date']))
+    print("{:>8} {:>10} {:>44} {:>10} {:>10} {:>7}".format(
+        "size","group","case","old (s)","new (s)","ratio"))
+    slower = 0
+    for r in new['results']:
+        if key(r) not in before:
+            continue
+        t0,t1 = before[key(r)]['min'],r['min']
+        ratio = t1/t0 if t0 > 0 else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = ' slower'
+            slower += 1
+        print("{:>8} {:>10} {:>44} {:>10.4f} {:>10.4f} {:>7.2f}{}".format(
+            r['size'],r['group'],r['name'],t0,t1,ratio,flag))
+    return slower
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks hyperpyron on synthetic data")
+    parser.add_argument('--rows',type=int,nargs='+',default=SIZES,
+                        help="Transactions in each run")
+    parser.add_argument('--files',type=int,default=synthetic.FILES,
+                        help="Statements per account")
+    parser.add_argument('--keywords',type=int,
+                        default=synthetic.KEYWORDS,
+                        help="Keywords in the categories file")
+    parser.add_argument('--repeats',type=int,default=REPEATS,
+                        help="Times each case is run. The fastest counts.")
+    parser.add_argument('-o','--output',default=RESULTS_FILENAME,
+                        help="Where to write the results")
+    parser.add_argument('--compare',nargs=2,metavar=('OLD','NEW'),
+                        help="Compares two results files")
+    parser.add_argument('--threshold',type=float,default=THRESHOLD,
+                        help="Ratio above which a case counts as slower")
+    parser.add_argument('--worker',help=argparse.SUPPRESS)
+    return parser
+
+def main():
+    args = get_parser().parse_args()
+    if args.worker:
+        with tempfile.TemporaryDirectory() as plotdir:
+            results = run_cases(args.repeats,plotdir)
+        with open(args.worker,'w') as f:
+            json.dump(results,f)
+        return os.EX_OK
+    if args.compare:
+        with open(args.compare[0],'r') as f:
+            old = json.load(f)
+        with open(args.compare[1],'r') as f:
+            new = json.load(f)
+        return 1 if compare(old,new,args.threshold) else os.EX_OK
+    results = []
+    for nrows in args.rows:
+        print("Running",nrows,"rows...")
+        results += run_size(nrows,args.files,args.keywords,args.repeats)
+    with open(args.output,'w') as f:
+        json.dump({'meta' : metadata(),'results' : results},f,indent=1)
+    print("{:>8} {:>10} {:>44} {:>10} {:>12}".format(
+        "size","group","case","min (s)","rows/s"))
+    for r in results:
+        print("{:>8} {:>10} {:>44} {:>10.4f} {:>12}".format(
+            r['size'],r['group'],r['name'],r['min'],
+            '-' if r['rows_per_s'] is None
+            else '{:.0f}'.format(r['rows_per_s'])))
+    print("Saved results to",args.output)
+    return os.EX_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+"""
+benchmarks/synthetic.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Generates a synthetic HYPERPYRON_HOME: bank style CSV
+statements for two accounts, the parse rules that read
+them, a categories file and a budget. The two accounts
+are written differently, to exercise both CSV code paths:
+
+checking  named columns, one signed amount column with
+          currency symbols and thousands separators,
+          and duplicate checking on a reference column
+credit    columns by position, separate debit and credit
+          columns, and statements that overlap, with
+          cross-file duplicate checking
+
+About half of all descriptions contain a keyword from
+the categories file, and transfers are ignored.
+Everything is reproducible from the seed.
+
+Usage:
+python -m benchmarks.synthetic HOME [--files N] [--rows N] [--keywords N]
+"""
+
+# python
+import os
+import string
+import argparse
+import numpy as np
+import pandas as pd
+import yaml
+
+# The categories in the bank's exports, and what they mean
+BANK_CATEGORIES = {'Supermarkets' : 'Groceries',
+                   'Dining' : 'Restaurants',
+                   'Pharmacy' : 'Healthcare',
+                   'Shopping' : 'Retail',
+                   'Gas' : 'Automotive',
+                   'Payroll' : 'Income',
+                   'ATM' : 'Cash',
+                   'Movies' : 'Entertainment',
+                   'Payment' : 'Transfer',
+                   'Rent' : 'Housing',
+                   'Misc' : 'Other'}
+KEYWORD_CATEGORIES = ['Groceries','Restaurants','Healthcare',
+                      'Retail','Automotive','Entertainment',
+                      'Housing']
+ACCOUNTS = ['checking','credit']
+FILES = 12
+ROWS = 100000
+KEYWORDS = 300
+YEARS = 5
+OVERLAP = 0.01
+START = pd.Timestamp('2015-01-01')
+
+def random_words(rng,n,length=8):
+    "Makes n random lowercase words"
+    letters = np.array(list(string.ascii_lowercase))
+    chars = rng.choice(letters,size=(n,length))
+    return [''.join(row) for row in chars]
+
+def make_keywords(rng,nkeywords):
+    """Spreads nkeywords random keywords over
+    KEYWORD_CATEGORIES, as in a categories file
+    """
+    categories = {c : [] for c in KEYWORD_CATEGORIES}
+    for i,word in enumerate(random_words(rng,nkeywords)):
+        c = KEYWORD_CATEGORIES[i % len(KEYWORD_CATEGORIES)]
+        categories[c].append(word)
+    # payments between the accounts would be counted twice
+    categories['Ignore'] = ['Transfer']
+    return categories
+
+def make_transactions(rng,nrows,keywords,years=YEARS,nmerchants=5000):
+    """Makes nrows transactions sorted by date. About half
+    of the merchants have a keyword in their name.
+    """
+    merchants = random_words(rng,nmerchants,12)
+    for i in range(0,nmerchants,2):
+        k = keywords[rng.integers(len(keywords))]
+        merchants[i] = merchants[i][:4]+k+merchants[i][4:]
+    merchants = np.array(["POS "+m.upper()+" #"+str(1000+i)
+                          for i,m in enumerate(merchants)],dtype=object)
+    days = np.sort(rng.integers(365*years,size=nrows))
+    names = np.array(sorted(BANK_CATEGORIES),dtype=object)
+    category = names[rng.integers(len(names),size=nrows)]
+    amount = -np.abs(np.round(rng.lognormal(3.5,1.0,size=nrows),2))
+    income = category == 'Payroll'
+    amount[income] = np.round(rng.normal(2500,300,size=income.sum()),2)
+    return pd.DataFrame({
+        'Date' : START + pd.to_timedelta(days,unit='D'),
+        'Description' : merchants[rng.integers(nmerchants,size=nrows)],
+        'Amount' : amount,
+        'Category' : category})
+
+def format_amounts(amounts):
+    "Formats amounts as '$1,234.50' and '-$3.00'"
+    text = pd.Series(np.abs(amounts)).map('${:,.2f}'.format)
+    return np.where(amounts < 0,'-','') + text
+
+def statements(frame,nfiles,overlap=0.0):
+    """Splits frame into nfiles consecutive statements.
+    Each statement also repeats the first overlap fraction
+    of rows of the next, as overlapping downloads do.
+    """
+    bounds = np.linspace(0,len(frame),nfiles+1).astype(int)
+    extra = int(overlap*len(frame)/max(nfiles,1))
+    for i in range(nfiles):
+        stop = bounds[i+1]
+        if i < nfiles-1:
+            stop = min(stop+extra,len(frame))
+        yield frame.iloc[bounds[i]:stop]
+
+def write_checking(frame,directory,nfiles):
+    os.makedirs(directory,exist_ok=True)
+    out = pd.DataFrame({
+        'Posting Date' : frame['Date'].dt.strftime('%m/%d/%Y'),
+        'Reference' : np.arange(len(frame)),
+        'Description' : frame['Description'],
+        'Type' : frame['Category'],
+        'Amount' : format_amounts(frame['Amount'].values)})
+    for i,part in enumerate(statements(out,nfiles)):
+        part.to_csv(os.path.join(directory,
+                                 'statement-{:03d}.csv'.format(i)),
+                    index=False)
+    return {'type' : 'csv',
+            'directory' : directory,
+            'account' : 'checking',
+            'use column names' : True,
+            'columns' : {'Date' : 'Posting Date',
+                         'Description' : 'Description',
+                         'Amount' : 'Amount',
+                         'Category' : 'Type'},
+            'categories' : dict(BANK_CATEGORIES),
+            'duplicate checking' : True,
+            'hash column' : 'Reference'}
+
+def write_credit(frame,directory,nfiles):
+    os.makedirs(directory,exist_ok=True)
+    amounts = frame['Amount'].values
+    out = pd.DataFrame({
+        'Date' : frame['Date'].dt.strftime('%Y-%m-%d'),
+        'Description' : frame['Description'],
+        'Category' : frame['Category'],
+        'Debit' : np.where(amounts < 0,-amounts,np.nan),
+        'Credit' : np.where(amounts >= 0,amounts,np.nan)})
+    for i,part in enumerate(statements(out,nfiles,OVERLAP)):
+        part.to_csv(os.path.join(directory,
+                                 'activity-{:03d}.csv'.format(i)),
+                    index=False)
+    return {'type' : 'csv',
+            'directory' : directory,
+            'account' : 'credit',
+            'use column names' : False,
+            'columns' : {'Date' : 0,
+                         'Description' : 1,
+                         'Category' : 2},
+            'debit column' : 3,
+            'credit column' : 4,
+            'categories' : dict(BANK_CATEGORIES),
+            'cross-file duplicates' : True}
+
+def make_budget():
+    "A monthly budget for every category"
+    return {'Groceries' : 400,
+            'Restaurants' : [150,50],
+            'Housing' : {'rent' : 1500,'utilities' : 150},
+            'Healthcare' : {'period' : 'year','insurance' : 2400},
+            'Automotive' : 200,
+            'Retail' : 300,
+            'Entertainment' : 100,
+            'Income' : 5000}
+
+def generate(home,nfiles=FILES,nrows=ROWS,nkeywords=KEYWORDS,
+             years=YEARS,seed=42):
+    """Writes a synthetic HYPERPYRON_HOME to home, with
+    about nrows transactions in nfiles statements for each
+    of ACCOUNTS, spanning years, and nkeywords keywords in
+    the categories file. Returns a description of what
+    was written.
+    """
+    rng = np.random.default_rng(seed)
+    conf = os.path.join(home,'conf')
+    parse = os.path.join(conf,'parse')
+    data = os.path.join(home,'data')
+    os.makedirs(parse,exist_ok=True)
+    keywords = make_keywords(rng,nkeywords)
+    all_keywords = [k for c in KEYWORD_CATEGORIES for k in keywords[c]]
+    writers = {'checking' : write_checking,'credit' : write_credit}
+    for i,account in enumerate(ACCOUNTS):
+        part = nrows//len(ACCOUNTS) + (i < nrows % len(ACCOUNTS))
+        frame = make_transactions(rng,part,all_keywords,years)
+        rules = writers[account](frame,os.path.join(data,account),
+                                 nfiles)
+        with open(os.path.join(parse,account+'.yaml'),'w') as f:
+            yaml.safe_dump(rules,f,default_flow_style=False)
+    with open(os.path.join(conf,'categories.yaml'),'w') as f:
+        yaml.safe_dump(keywords,f,default_flow_style=None)
+    with open(os.path.join(conf,'budget.yaml'),'w') as f:
+        yaml.safe_dump(make_budget(),f,default_flow_style=None)
+    return {'files' : nfiles*len(ACCOUNTS),
+            'rows' : nrows,
+            'keywords' : nkeywords,
+            'years' : years,
+            'seed' : seed}
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Writes a synthetic HYPERPYRON_HOME")
+    parser.add_argument('home',help="Where to write it")
+    parser.add_argument('--files',type=int,default=FILES,
+                        help="Statements per account")
+    parser.add_argument('--rows',type=int,default=ROWS,
+                        help="Transactions in all")
+    parser.add_argument('--keywords',type=int,default=KEYWORDS,
+                        help="Keywords in the categories file")
+    parser.add_argument('--years',type=int,default=YEARS,
+                        help="Years of transactions")
+    parser.add_argument('--seed',type=int,default=42)
+    return parser
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    print(generate(args.home,args.files,args.rows,args.keywords,
+                   args.years,args.seed))
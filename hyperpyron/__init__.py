@@ -5,27 +5,40 @@ hyperpyron/__init__.py
 Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
 """
 
-# Python
-import os
-import errno
+# python
+import importlib
 
 # Hyperpyron
 from . import iconfig
 from ._version import __version__
-from .sysdirs import cache_dir,conf_dir,parse_conf_dir
-from .analysis import *
-from .hyperparse import *
+from .sysdirs import Workspace,get_workspace
 
-def _make_sure_path_exists(path):
-    "Make the path, if it doesn't already exist"
-    try:
-        os.makedirs(path)
-    except OSError as exception:
-        if exception.errno != errno.EEXIST:
-            raise
+# Everything in these modules is available from the
+# package, but they import pandas and matplotlib, so
+# they are only imported when something is used.
+# Later modules take precedence.
+_lazy_modules = ['analysis','hyperparse']
 
-# Check directories and make them if necessary
-_make_sure_path_exists(cache_dir)
-_make_sure_path_exists(conf_dir)
-_make_sure_path_exists(parse_conf_dir)
+def __getattr__(name):
+    """Imports the lazy modules on first use. See PEP 562."""
+    if name in _lazy_modules:
+        return importlib.import_module('.'+name,__name__)
+    if name in ['cache_dir','conf_dir','parse_conf_dir']:
+        # those of the default workspace
+        return getattr(get_workspace(),name)
+    if not name.startswith('_'):
+        for modname in reversed(_lazy_modules):
+            module = importlib.import_module('.'+modname,__name__)
+            if hasattr(module,name):
+                value = getattr(module,name)
+                globals()[name] = value
+                return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+        __name__,name))
 
+def __dir__():
+    names = set(globals().keys())
+    for modname in _lazy_modules:
+        module = importlib.import_module('.'+modname,__name__)
+        names.update(n for n in dir(module) if not n.startswith('_'))
+    return sorted(names)
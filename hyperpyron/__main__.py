@@ -13,16 +13,14 @@ import importlib
 from datetime import date,timedelta,datetime
 
 # hyperpyron
+# Only what --help and --init need is imported here.
+# pandas and matplotlib are imported once data is loaded.
 import hyperpyron
 from hyperpyron import iconfig
-from hyperpyron import analysis
-from hyperpyron import hyperparse
-from hyperpyron.sysdirs import cache_dir,conf_dir,parse_conf_dir
-from hyperpyron.budget import get_budget
+from hyperpyron.sysdirs import get_workspace
 
-def main():
-    """The hyperpyron CLI interface"""
-    
+def get_parser():
+    "Builds the parser for the hyperpyron CLI"
     parser = argparse.ArgumentParser(
         description = ("Take your finance into your hands!"
                        +" Reads in your plaintext configuration files"
@@ -46,7 +44,48 @@ def main():
                         dest='reload',
                         action="store_true",
                         help=('Forces Hyperpyron to reload financial data'
-                              +' from file rather than using internal cache.'))
+                              +' from file rather than using internal cache.'
+                              +' Only new or changed files are re-read.'))
+    parser.add_argument('--rebuild',
+                        dest='rebuild',
+                        action="store_true",
+                        help=('Like --reload, but re-reads every file,'
+                              +' discarding the per-file cache.'))
+    parser.add_argument('-j','--jobs',
+                        dest='jobs',
+                        type=int,
+                        default=None,
+                        help=('Number of files to parse in parallel'
+                              +' when loading from file.'
+                              +' 0 uses every core. Defaults to '
+                              +str(iconfig.JOBS)+', or with --batch'
+                              +' to one process per home, up to'
+                              +' the number of cores.'))
+    parser.add_argument('--executor',
+                        dest='executor',
+                        choices=['serial','thread','process'],
+                        default=iconfig.EXECUTOR,
+                        help=('How to parse files in parallel.'
+                              +' Processes sidestep the GIL'
+                              +' but cost more to start.'))
+    parser.add_argument('--chunksize',
+                        dest='chunksize',
+                        type=int,
+                        help=('Streams data files into the cache'
+                              +' CHUNKSIZE rows at a time,'
+                              +' so memory use does not grow with'
+                              +' the size of your history, apart from'
+                              +' a hash per row of rule sets with'
+                              +' cross-file duplicates.'
+                              +' Implies --reload.'))
+    parser.add_argument('--store',
+                        dest='store',
+                        action='store_true',
+                        help=('Keeps transactions in an SQLite database'
+                              +' in the cache directory, and computes'
+                              +' totals over the chosen dates in SQL,'
+                              +' so the rest of your history is never'
+                              +' loaded.'))
     parser.add_argument('-s','--save',
                         dest='savedir',
                         type=str,
@@ -69,6 +108,50 @@ def main():
                         dest='budget',
                         action="store_true",
                         help=("Compares net cashflow to budget."))
+    parser.add_argument('-t','--trends',
+                        dest='trends',
+                        action="store_true",
+                        help=("Plots expenditures per period"
+                              +" by category. See --period."))
+    parser.add_argument('--rolling',
+                        dest='rolling',
+                        action="store_true",
+                        help=("Plots net cashflow over trailing"
+                              +" 30, 90 and 365 day windows."))
+    parser.add_argument('--cumulative',
+                        dest='cumulative',
+                        action="store_true",
+                        help=("Plots net cashflow accumulated"
+                              +" over time."))
+    parser.add_argument('--deltas',
+                        dest='deltas',
+                        action="store_true",
+                        help=("Plots the change in expenditures"
+                              +" from one period to the next."))
+    parser.add_argument('--track',
+                        dest='track',
+                        action="store_true",
+                        help=("Reports actual cashflow against the"
+                              +" budget in every period, with the burn"
+                              +" rate and projected overrun of periods"
+                              +" still in progress. If '-s' is set,"
+                              +" the report is saved as CSV."))
+    parser.add_argument('--period',
+                        dest='period',
+                        choices=sorted(iconfig.PERIODS),
+                        default='month',
+                        help=("The period used by --trends,"
+                              +" --deltas and --track."))
+    parser.add_argument('--report',
+                        dest='report',
+                        choices=sorted(iconfig.PERIODS),
+                        help=("Batch mode. Renders the plots chosen"
+                              +" with -p, -f and -u, or all three,"
+                              +" for every week, month or year in the"
+                              +" selected dates, each into its own"
+                              +" directory under '-s'. Plots are"
+                              +" rendered headless, in parallel"
+                              +" according to -j and --executor."))
     parser.add_argument('-d','--days',
                         type=int,
                         dest='ndays',
@@ -89,45 +172,155 @@ def main():
                         default=0.0,
                         help=('In plots, consolidates all data less than'
                               +' minpercentage into the "Other" category.'))
+    parser.add_argument('--memory',
+                        dest='memory',
+                        action='store_true',
+                        help=("Reports how much memory the loaded"
+                              +" data takes up, by column."))
     parser.add_argument('--pdf',
                         dest='pdf',
                         action='store_true',
                         help="Saves plots as pdfs instead of pngs.")
-                        
+    parser.add_argument('--profile',
+                        dest='profile',
+                        nargs='?',
+                        const=iconfig.PROFILE_FILENAME,
+                        default=None,
+                        metavar='FILE',
+                        help=("Records how long each stage of loading,"
+                              +" parsing and plotting takes, how many"
+                              +" rows it handles and its peak memory."
+                              +" Prints a summary and saves a JSON trace"
+                              +" to FILE, which defaults to "
+                              +iconfig.PROFILE_FILENAME+"."
+                              +" Open it in chrome://tracing or Perfetto."))
+    parser.add_argument('--serve',
+                        dest='serve',
+                        action='store_true',
+                        help=("Runs a server that keeps your data,"
+                              +" categories and budget loaded, and"
+                              +" reloads them when their files change."
+                              +" Runs until interrupted."))
+    parser.add_argument('--watch',
+                        dest='watch',
+                        action='store_true',
+                        help=("Watches your data directories and adds"
+                              +" new files to the cache as they land,"
+                              +" so the next run starts fresh."
+                              +" Runs until interrupted."))
+    parser.add_argument('--remote',
+                        dest='remote',
+                        action='store_true',
+                        help=("Sends the other options to a server"
+                              +" started with --serve, instead of"
+                              +" loading data here. Plots are saved,"
+                              +" not shown."))
+    parser.add_argument('--batch',
+                        dest='batch',
+                        nargs='+',
+                        metavar='HOME',
+                        help=("Ingests data for many hyperpyron homes,"
+                              +" each with its own configs and caches,"
+                              +" in parallel processes, and prints a"
+                              +" summary of throughput. Each HOME is a"
+                              +" HYPERPYRON_HOME or a directory of them."
+                              +" With --report, also renders each home's"
+                              +" reports into its reports directory, or"
+                              +" into a directory named after it"
+                              +" under '-s'. Use -j to set the number"
+                              +" of processes."))
+    return parser
+
+def main():
+    """The hyperpyron CLI interface"""
+    parser = get_parser()
     if len(sys.argv)==1:
         parser.print_help()
         sys.exit(1)
 
     args = parser.parse_args()
 
+    if args.remote:
+        from hyperpyron import server
+        argv = [a for a in sys.argv[1:] if a != '--remote']
+        workspace = get_workspace()
+        sys.exit(server.request(argv,
+                                server.server_address(workspace),
+                                server.read_token(workspace)))
+    if args.batch:
+        from hyperpyron import batch
+        sys.exit(batch.run(args))
+
     print("Welcome to Hyperpyron! Take your finances into your own hands!")
     # init
+    workspace = get_workspace()
+    workspace.make_directories()
     if args.init:
         print("Hyperpyron uses the following directories:")
-        print("\tcache directory:",cache_dir)
-        print("\tconfig directory:",conf_dir)
-        print("\tparser config directory:",parse_conf_dir)
+        print("\tcache directory:",workspace.cache_dir)
+        print("\tconfig directory:",workspace.conf_dir)
+        print("\tparser config directory:",workspace.parse_conf_dir)
         print("They have been created if they did not already exist.")
         sys.exit(os.EX_OK)
+    if args.serve:
+        from hyperpyron import server
+        if args.store:
+            print("--store can't be combined with --serve.")
+            sys.exit(os.EX_USAGE)
+        server.serve(workspace,args.jobs,args.executor)
+        sys.exit(os.EX_OK)
+    if args.watch:
+        from hyperpyron import watch
+        watch.run(workspace,args.jobs,args.executor)
+        sys.exit(os.EX_OK)
+    run(args)
+
+def run(args,state=None):
+    """Loads data and makes the plots and reports asked
+    for in args. If state is a server.WarmState, data,
+    categories and budgets are taken from it instead
+    of from the cache or files. With --profile, every
+    stage is recorded, one at a time so that each
+    stage's peak memory is its own. See profiling.Profiler.
+    """
+    if not args.profile:
+        analyze(args,state)
+        return
+    if args.jobs not in [None,1]:
+        print("Profiling runs serially, so peak memory"
+              " can be attributed to each stage.")
+    args.executor,args.jobs = 'serial',1
+    from hyperpyron.profiling import profiler
+    profiler.enable()
+    try:
+        analyze(args,state)
+    finally:
+        profiler.disable()
+        profiler.report()
+        profiler.save(args.profile)
+        print("Saved profile to",args.profile)
+
+def analyze(args,state=None):
+    "Does the work of run"
+    # the scientific stack
+    from hyperpyron import analysis
+    from hyperpyron import schema
+    from hyperpyron import trends
+    from hyperpyron import reports
+    from hyperpyron.budget import get_budget,track_budget
     # ensure consistency
     if args.minpercentage < 0 or args.minpercentage > 100:
         print("Consolidation must be a percentage between 0 and 100.")
         sys.exit(os.EX_DATAERR)
+    if args.store and args.chunksize:
+        print("--store can't be combined with --chunksize.")
+        sys.exit(os.EX_USAGE)
+    if args.report and not args.savedir:
+        print("--report requires a directory to save to with -s.")
+        sys.exit(os.EX_USAGE)
     if args.savedir and not os.path.isdir(args.savedir):
-        print("Path {} is not a valid directory.".format(args.savepath))
+        print("Path {} is not a valid directory.".format(args.savedir))
         sys.exit(os.EX_DATAERR)
-    # load data
-    if args.reload:
-        frame = hyperparse.parse_from_data()
-        print("Loaded data from files.")
-    else:
-        frame = hyperparse.load_from_cache()
-        if frame is None:
-            frame = hyperparse.parse_from_data()
-            print("Loaded data from files.")
-        else:
-            print("Loaded data from cache.")
-    hyperparse.save_to_cache(frame)
     # figure date cuts
     before,after=None,None
     if args.ndays > -1:
@@ -137,11 +330,22 @@ def main():
                                    '%Y-%m-%d')
         after = datetime.strptime(args.between[1],
                                   '%Y-%m-%d')
+    # load data
+    if state is None:
+        workspace = get_workspace()
+        frame = load_data(workspace,args,before,after)
+        budgets = lambda period=None: get_budget(period,workspace)
+    else:
+        frame = state.load(args)
+        budgets = state.budget
     if before and after:
         frame = analysis.filter_frame_between_dates(frame,
                                                     before,
                                                     after)
         print("Using data from",before,"to",after)
+    if args.memory:
+        print("Memory use in bytes:")
+        print(schema.memory_report(frame))
 
     # plots
     show = not args.hide
@@ -149,7 +353,17 @@ def main():
         suffix='.pdf'
     else:
         suffix='.png'
-    if args.percentages:
+    if args.report:
+        plots = [name for name in reports.REPORT_PLOTS
+                 if getattr(args,name)]
+        written = reports.batch_report(frame,args.savedir,args.report,
+                                       before,after,
+                                       plots or reports.REPORT_PLOTS,
+                                       args.minpercentage,suffix,
+                                       args.jobs,args.executor,
+                                       budgets(args.report))
+        print("Saved",len(written),"plots to",args.savedir)
+    if args.percentages and not args.report:
         if args.savedir:
             savepath = path.join(args.savedir,
                                  iconfig.PERCENT_FILENAME+suffix)
@@ -157,7 +371,7 @@ def main():
             savepath=None
         analysis.plot_percent_expenditures(frame,savepath,
                                            show,args.minpercentage)
-    if args.cashflow:
+    if args.cashflow and not args.report:
         if args.savedir:
             savepath = path.join(args.savedir,
                                  iconfig.CASHFLOW_FILENAME+suffix)
@@ -165,16 +379,107 @@ def main():
             savepath=None
         analysis.plot_net_cashflow(frame,savepath,show,
                                    args.minpercentage)
-    if args.budget:
+    if args.budget and not args.report:
         if args.savedir:
             savepath = path.join(args.savedir,
                                  iconfig.BUDGET_FILENAME+suffix)
         else:
             savepath=None
-        budget = get_budget()
+        budget = budgets()
         analysis.compare_cashflow_to_budget(frame,budget,
                                             savepath,show)
+    if args.trends:
+        if args.savedir:
+            savepath = path.join(args.savedir,
+                                 iconfig.TRENDS_FILENAME+suffix)
+        else:
+            savepath=None
+        trends.plot_spending_trends(frame,args.period,savepath,
+                                    show,args.minpercentage)
+    if args.rolling:
+        if args.savedir:
+            savepath = path.join(args.savedir,
+                                 iconfig.ROLLING_FILENAME+suffix)
+        else:
+            savepath=None
+        trends.plot_rolling_cashflow(frame,savepath,show)
+    if args.cumulative:
+        if args.savedir:
+            savepath = path.join(args.savedir,
+                                 iconfig.CUMULATIVE_FILENAME+suffix)
+        else:
+            savepath=None
+        trends.plot_cumulative_cashflow(frame,savepath,show)
+    if args.deltas:
+        if args.savedir:
+            savepath = path.join(args.savedir,
+                                 iconfig.DELTAS_FILENAME+suffix)
+        else:
+            savepath=None
+        trends.plot_period_over_period(frame,args.period,
+                                       savepath,show)
+    if args.track:
+        report = track_budget(frame,budgets(args.period),
+                              args.period,after)
+        print("Budget by {}:".format(args.period))
+        print(report)
+        if args.savedir:
+            report.to_csv(path.join(args.savedir,
+                                    iconfig.TRACKING_FILENAME))
     print("All done!")
 
+def load_data(workspace,args,before,after):
+    """Loads the data of workspace that args asks for,
+    from the cache if possible and from file otherwise.
+    """
+    from hyperpyron import hyperparse
+    if args.store:
+        return load_store(workspace,args,before,after)
+    if args.chunksize:
+        nrows = hyperparse.stream_to_cache(workspace,args.chunksize)
+        print("Streamed",nrows,"rows from files into cache.")
+    if (args.reload or args.rebuild) and not args.chunksize:
+        frame = None
+    elif args.memory:
+        frame = hyperparse.load_from_cache(workspace,before,after)
+    else:
+        # The plots only need totals by category,
+        # which the rollup cube holds.
+        frame = hyperparse.load_rollup(workspace)
+    if frame is None:
+        frame = hyperparse.parse_from_data(workspace,
+                                           args.rebuild,
+                                           args.jobs,
+                                           args.executor)
+        hyperparse.save_to_cache(workspace,frame)
+        print("Loaded data from files.")
+    else:
+        print("Loaded data from cache.")
+    return frame
+
+def load_store(workspace,args,before,after):
+    """Loads the data of workspace that args asks for from
+    the transaction store, syncing it with the data files
+    first if needed. See store.TransactionStore.
+    """
+    from hyperpyron import hyperparse
+    data = None
+    if not (args.reload or args.rebuild):
+        data = hyperparse.load_store(workspace)
+    if data is None:
+        frame = hyperparse.parse_from_data(workspace,
+                                           args.rebuild,
+                                           args.jobs,
+                                           args.executor)
+        hyperparse.save_to_cache(workspace,frame)
+        hyperparse.save_to_store(workspace,frame)
+        data = hyperparse.get_store(workspace).window()
+        print("Loaded data from files.")
+    else:
+        print("Loaded data from store.")
+    if args.memory:
+        return data.window(before,after).transactions()
+    return data
+
 if __name__ == "__main__":
     main()
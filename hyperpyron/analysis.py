@@ -1,20 +1,20 @@
 #!/usr/bin/env python
 
 """
-hyperpyron/vis.py
+hyperpyron/analysis.py
 Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
 """
 
 # python
 import numpy as np
 import pandas as pd
-from datetime import date,timedelta,datetime
-import matplotlib as mpl
-from matplotlib import pyplot as plt
-mpl.rcParams.update({'font.size': 16})
+from datetime import date,timedelta
 
 # hyperpyron
-from . import iconfig
+from .schema import compact,to_dollars,date_slice
+from .rollup import Rollup
+from .plotting import new_figure,finish_figure,label_empty
+from .profiling import profiled
 
 def filter_frame_between_dates(frame,before,after):
     """Filters a dataframe and selects for
@@ -25,9 +25,19 @@ def filter_frame_between_dates(frame,before,after):
     YYYY-MM-DD
     format
     or standard datetime format
+
+    If frame is indexed by date, as frames from
+    hyperparse are, this is a binary search and
+    returns a view rather than a copy.
+
+    frame may also be a rollup.Rollup, in which case
+    the window of the cube is returned. For a
+    store.StoreRollup, nothing is read until totals
+    are asked for, and then only the window is read.
     """
-    mask = (frame.Date >= before) & (frame.Date <= after)
-    return frame.loc[mask]
+    if isinstance(frame,Rollup):
+        return frame.window(before,after)
+    return date_slice(frame,before,after)
 
 def get_dates_for_n_days_ago_and_now(n):
     """Given a number n, calculates the date n
@@ -46,21 +56,56 @@ def dataframe_from_n_days_ago_to_now(frame,n):
     return filter_frame_between_dates(frame,then,now)
 
 def ignore_income(frame):
-    """Returns a dataframe ignoring income in frame"""
-    mask = frame.Amount < 0
-    out = frame.copy(deep=True)
-    out = out.loc[mask]
-    out.Amount *= -1.0
-    return out
+    """Returns a dataframe ignoring income in frame,
+    with expenditures made positive. frame itself
+    is not copied or modified.
+    """
+    out = frame.loc[frame['Amount'].values < 0]
+    return out.assign(Amount=-out['Amount'])
+
+def sum_by_category(frame,expenses=False):
+    """Sums Amount in each category of frame, using
+    np.bincount over the category codes rather than
+    splitting frame into groups. Only categories that
+    appear in frame are returned, as with
+    groupby('Category',observed=True).sum().
+
+    If expenses is True, only expenditures are summed,
+    as positive numbers, and categories with none are
+    left out.
+    """
+    category = frame['Category']
+    if not isinstance(category.dtype,pd.CategoricalDtype):
+        category = category.astype('category')
+    categories = category.cat.categories
+    codes = category.cat.codes.values
+    amounts = frame['Amount'].values
+    if expenses:
+        mask = amounts < 0
+        codes,amounts = codes[mask],-amounts[mask]
+    mask = codes >= 0
+    codes,amounts = codes[mask],amounts[mask]
+    counts = np.bincount(codes,minlength=len(categories))
+    sums = np.bincount(codes,weights=amounts,
+                       minlength=len(categories))
+    if np.issubdtype(amounts.dtype,np.integer):
+        sums = np.rint(sums).astype(amounts.dtype)
+    present = counts > 0
+    return pd.Series(sums[present],
+                     index=pd.Index(categories[present],
+                                    name='Category'))
 
 def calculate_percentages(frame):
     """Calculates the percentage expenditure in
     each category and returns a dataframe with this
     information.
+
+    frame may be a transaction frame or a rollup.Rollup.
     """
-    out = ignore_income(frame)
-    out = out.groupby('Category').apply(
-        lambda x: x['Amount'].sum())
+    if isinstance(frame,Rollup):
+        out = frame.expenses()
+    else:
+        out = sum_by_category(frame,expenses=True)
     tot = out.sum()
     out = 100*out/tot
     return out
@@ -69,6 +114,7 @@ def combine_percentages(frame,cutoff):
     """Combines percentages for a frame showing
     percentages for a frame. All percentages less
     than cutoff get placed into the "other" category.
+    Returns a Series, like frame.
 
     IMPORTANT: assumes frame has already
     passed through "analysis.calculate_percentages.
@@ -80,17 +126,20 @@ def combine_percentages(frame,cutoff):
                          " of expenditures!")
     remaining = frame.loc[frame >= cutoff]
     consolidated = frame.loc[frame < cutoff]
-    if "Other" in remaining.index.tolist():
-        remaining = remaining.copy(deep=True)
-        remaining["Other"] += consolidated.sum()
-        return remaining
-    sum_df = pd.DataFrame([consolidated.sum()],
-                          index=["Other"])
-    out = pd.concat([remaining,sum_df])
-    out = out.rename(columns = {out.columns[0]:'Value'})
-    out.columns.name = 'Category'
-    return out
+    return add_to_other(remaining,consolidated.sum())
 
+def add_to_other(series,value):
+    """Adds value to the "Other" entry of series,
+    appending one if there is none. Always returns
+    a Series, with "Other" last if it was appended.
+    """
+    if "Other" in series.index.tolist():
+        series = series.copy(deep=True)
+        series.loc["Other"] += value
+        return series
+    return pd.concat([series,pd.Series([value],index=["Other"])])
+
+@profiled()
 def plot_percent_expenditures(frame,
                               savepath=None,
                               show=True,
@@ -103,10 +152,15 @@ def plot_percent_expenditures(frame,
     """
     scale = 0.5
     toplot = calculate_percentages(frame)
+    if len(toplot) == 0:
+        fig,ax = new_figure(show)
+        label_empty(ax,'No expenditures in this window')
+        finish_figure(fig,savepath,show)
+        return
     toplot = combine_percentages(toplot,cutoff)
     toplot = toplot.sort_values(ascending=False)
     labels = toplot.index.tolist()
-    vals = toplot.as_matrix()
+    vals = toplot.to_numpy()
     num_categories = len(vals)
     transition_num = 4
     calibration_categories = 9
@@ -119,31 +173,28 @@ def plot_percent_expenditures(frame,
         explode = emin+emax*x*x
     else:
         explode = emin*np.ones_like(vals)
-    plt.pie(vals,labels=labels,
-            radius = scale*1.2,
-            shadow=True,
-            explode=explode,
-            startangle=90,
-            pctdistance=0.8,
-            autopct='%1.1f%%')
-    plt.tight_layout()
-    if savepath:
-        plt.savefig(savepath,bbox_inches='tight')
-        if iconfig.DEBUG:
-            print("saved file ",savepath)
-    if show:
-        plt.show()
-    plt.cla()
-    plt.clf()
-    plt.close()
-    return    
+    fig,ax = new_figure(show)
+    ax.pie(vals,labels=labels,
+           radius = scale*1.2,
+           shadow=True,
+           explode=explode,
+           startangle=90,
+           pctdistance=0.8,
+           autopct='%1.1f%%')
+    finish_figure(fig,savepath,show)
+    return
 
 def get_category_sums(frame):
-    """Sums up all categories
+    """Sums up all categories, in dollars,
     and adds a total column
+
+    frame may be a transaction frame or a rollup.Rollup.
     """
-    out = frame.groupby('Category').apply(
-        lambda x:x['Amount'].sum())
+    if isinstance(frame,Rollup):
+        out = frame.sums()
+    else:
+        out = sum_by_category(compact(frame))
+    out = to_dollars(out)
     sum_df = pd.DataFrame([out.sum()],
                           index=["Total"])
     out = pd.concat([out,sum_df])
@@ -155,11 +206,15 @@ def combine_expenses(frame,cutoff):
     """Calculates net category sums as above,
     but if the percentages of the total are less than
     cutoff, consolidates them into the "Other" category.
+    Returns a Series of sums, including the Total.
     """
-    if len(frame.shape) > 1 and frame.shape[1] > 1:
+    if (isinstance(frame,Rollup)
+        or (len(frame.shape) > 1 and frame.shape[1] > 1)):
         sums = get_category_sums(frame)
     else:
         sums = frame
+    if isinstance(sums,pd.DataFrame):
+        sums = sums.iloc[:,0]
     if cutoff <= 0:
         return sums
     if cutoff >= 100:
@@ -168,22 +223,11 @@ def combine_expenses(frame,cutoff):
     positive = np.abs(sums)
     positive.loc["Total"] = positive.drop("Total").sum()
     percentages = 100*positive/positive.loc["Total"]
-    percentages = percentages.squeeze()
     remaining = sums.loc[percentages >= cutoff]
     consolidated = sums.loc[percentages < cutoff]
-    if "Other" in remaining.index.tolist():
-        remaining = remaining.copy(deep=True)
-        remaining.loc["Other"] += consolidated.sum()
-        return remaining
-    if "Total" in consolidated.index.tolist():
-        raise ValueError("Total got consolidated.")
-    sum_df = pd.DataFrame([consolidated.sum()],
-                          index=["Other"])
-    out = pd.concat([remaining,sum_df])
-    out = out.rename(columns = {out.columns[0]:'Value'})
-    out.columns.name = 'Category'
-    return out
+    return add_to_other(remaining,consolidated.sum())
 
+@profiled()
 def plot_net_cashflow(frame,
                       savepath=None,
                       show=True,
@@ -196,25 +240,18 @@ def plot_net_cashflow(frame,
     """
     toplot = combine_expenses(frame,cutoff)
     labels = toplot.index.tolist()
-    vals = toplot.as_matrix().flatten()
-    plt.bar(labels,vals,
-            color='b',
-            alpha = 0.8)
-    plt.xticks(rotation=90)
-    plt.ylabel('Net Cashflow ($)')
-    plt.xlabel('Category')
-    plt.tight_layout()
-    if savepath:
-        plt.savefig(savepath,bbox_inches='tight')
-        if iconfig.DEBUG:
-            print("saved file ",savepath)
-    if show:
-        plt.show()
-    plt.cla()
-    plt.clf()
-    plt.close()
+    vals = toplot.to_numpy().flatten()
+    fig,ax = new_figure(show)
+    ax.bar(labels,vals,
+           color='b',
+           alpha = 0.8)
+    ax.tick_params(axis='x',labelrotation=90)
+    ax.set_ylabel('Net Cashflow ($)')
+    ax.set_xlabel('Category')
+    finish_figure(fig,savepath,show)
     return
 
+@profiled()
 def compare_cashflow_to_budget(data,budget,
                                savepath=None,
                                show=True):
@@ -223,46 +260,40 @@ def compare_cashflow_to_budget(data,budget,
     in a bar chart.
 
     Does not consolidate data into "Other."
+    Every category that is budgeted or has transactions
+    is shown. Those missing from one side are shown
+    with zero cashflow on that side.
     """
     # TODO: consolidate data into "Other"
     # in a meaningful way
     d_plotable = combine_expenses(data,0)
     b_plotable = combine_expenses(budget,0)
-    d_labels = d_plotable.index.tolist()
-    b_labels = b_plotable.index.tolist()
-    d_vals = d_plotable.as_matrix().flatten()
-    b_vals = b_plotable.as_matrix().flatten()
+    labels = [l for l in b_plotable.index if l != "Total"]
+    labels += [l for l in d_plotable.index
+               if l not in labels and l != "Total"]
+    labels.append("Total")
+    d_plotable = d_plotable.reindex(labels,fill_value=0)
+    b_plotable = b_plotable.reindex(labels,fill_value=0)
+    d_vals = d_plotable.to_numpy().flatten()
+    b_vals = b_plotable.to_numpy().flatten()
     width = 1.
-    for d,b in zip(d_labels,b_labels):
-        if d != b:
-            raise ValueError("Labels not the same!")
-    ind = 1.1*2*width*np.arange(len(b_labels))
-    plt.bar(ind-0.5*width,d_vals,
-            width=width,
-            color='r',
-            alpha=0.8,
-            label = "actual")
-    plt.bar(ind+0.5*width,b_vals,
-            width=width,
-            color='b',
-            alpha=0.8,
-            label = "budgeted")
-    plt.legend(loc="best")
-    plt.xticks(rotation=90)
-    plt.ylabel('Net Cashflow ($)')
-    plt.xlabel('Category')
-    ax = plt.gca()
+    ind = 1.1*2*width*np.arange(len(labels))
+    fig,ax = new_figure(show)
+    ax.bar(ind-0.5*width,d_vals,
+           width=width,
+           color='r',
+           alpha=0.8,
+           label = "actual")
+    ax.bar(ind+0.5*width,b_vals,
+           width=width,
+           color='b',
+           alpha=0.8,
+           label = "budgeted")
+    ax.legend(loc="best")
+    ax.set_ylabel('Net Cashflow ($)')
+    ax.set_xlabel('Category')
     ax.set_xticks(ind)
-    ax.set_xticklabels(b_labels)
-    plt.tight_layout()
-    if savepath:
-        plt.savefig(savepath,bbox_inches='tight')
-        if iconfig.DEBUG:
-            print("saved file ",savepath)
-    if show:
-        plt.show()
-    plt.cla()
-    plt.clf()
-    plt.close()
+    ax.set_xticklabels(labels,rotation=90)
+    finish_figure(fig,savepath,show)
     return
 
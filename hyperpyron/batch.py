@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/batch.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import io
+import os
+import time
+import traceback
+from os import path
+from contextlib import redirect_stdout
+
+# hyperpyron
+from . import iconfig
+from .sysdirs import Workspace
+from .executors import get_executor
+
+def is_home(d):
+    "Whether d looks like a hyperpyron home, with parse rules"
+    return path.isdir(path.join(d,iconfig.CONF_DIR,iconfig.PARSECONF_DIR))
+
+def find_workspaces(paths):
+    """Expands paths into hyperpyron homes. Each path is
+    either a home itself or a directory of homes. Returns
+    absolute paths, sorted and without repeats.
+    """
+    homes = set()
+    for p in paths:
+        p = path.abspath(p)
+        if is_home(p):
+            homes.add(p)
+        elif path.isdir(p):
+            homes.update(path.join(p,name) for name in os.listdir(p)
+                         if is_home(path.join(p,name)))
+    return sorted(homes)
+
+def process_workspace(task):
+    """Ingests the data of one workspace into its own cache
+    and, if a period is given, renders its reports. Output
+    is captured rather than printed. Returns what was done
+    and how long it took. Errors are returned, not raised,
+    so one bad workspace doesn't stop the batch.
+    """
+    home,options = task
+    out = {'home' : home,
+           'rows' : 0,
+           'files' : 0,
+           'plots' : 0,
+           'ingest' : 0.0,
+           'report' : 0.0,
+           'error' : None}
+    log = io.StringIO()
+    try:
+        workspace = Workspace(home)
+        with redirect_stdout(log):
+            from . import hyperparse
+            from .rollup import Rollup
+            from .budget import get_budget
+            from .reports import batch_report
+            from .filecache import FileCache
+            start = time.perf_counter()
+            frame = hyperparse.parse_from_data(workspace,options['rebuild'],
+                                               1,'serial')
+            rollup = Rollup.from_frame(frame)
+            hyperparse.save_to_cache(workspace,frame,rollup=rollup)
+            out['ingest'] = time.perf_counter() - start
+            out['rows'] = len(frame)
+            out['files'] = len(FileCache(workspace.cache_dir).manifest)
+            if options['period']:
+                start = time.perf_counter()
+                savedir = options['savedir']
+                if savedir is None:
+                    savedir = path.join(home,iconfig.REPORTS_DIR)
+                else:
+                    savedir = path.join(savedir,path.basename(home))
+                os.makedirs(savedir,exist_ok=True)
+                written = batch_report(rollup,savedir,options['period'],
+                                       plots=options['plots'],
+                                       suffix=options['suffix'],
+                                       jobs=1,executor='serial',
+                                       budget=get_budget(options['period'],
+                                                         workspace))
+                out['plots'] = len(written)
+                out['report'] = time.perf_counter() - start
+    except Exception:
+        out['error'] = traceback.format_exc()
+    return out
+
+def summarize(results,wall):
+    """Totals for a batch that took wall seconds.
+    Throughput is per second of wall time. busy is the
+    time spent in workspaces, summed over workers.
+    """
+    rows = sum(r['rows'] for r in results)
+    busy = sum(r['ingest']+r['report'] for r in results)
+    return {'workspaces' : len(results),
+            'failed' : sum(r['error'] is not None for r in results),
+            'rows' : rows,
+            'files' : sum(r['files'] for r in results),
+            'plots' : sum(r['plots'] for r in results),
+            'wall' : wall,
+            'busy' : busy,
+            'rows_per_s' : rows/wall if wall > 0 else None,
+            'workspaces_per_s' : len(results)/wall if wall > 0 else None}
+
+def run_batch(homes,jobs=None,executor='process',period=None,
+              plots=None,savedir=None,suffix='.png',rebuild=False):
+    """Ingests, and reports for, every home in homes,
+    jobs at a time. Each home gets its own caches, in its
+    own cache directory. Reports are rendered for every
+    period, 'week', 'month' or 'year', if period is given,
+    into each home's reports directory, or into a directory
+    named after it in savedir.
+
+    jobs defaults to one per home, up to the number of
+    cores. Each home's output is captured by redirecting
+    stdout, which a process only has one of, so executor
+    must be 'process' or 'serial'. Returns the result for
+    each home, see process_workspace, and the summary,
+    see summarize.
+    """
+    if executor not in ['process','serial']:
+        raise ValueError("Workspaces must be processed by"
+                         " 'process' or 'serial' executors.")
+    if jobs is None:
+        jobs = max(min(os.cpu_count() or 1,len(homes)),1)
+    if plots is None:
+        from .reports import REPORT_PLOTS
+        plots = REPORT_PLOTS
+    options = {'rebuild' : rebuild,
+               'period' : period,
+               'plots' : list(plots),
+               'savedir' : savedir and path.abspath(savedir),
+               'suffix' : suffix}
+    tasks = [(home,options) for home in homes]
+    start = time.perf_counter()
+    with get_executor(executor,jobs) as pool:
+        results = list(pool.map(process_workspace,tasks))
+    return results,summarize(results,time.perf_counter()-start)
+
+def print_summary(results,summary):
+    "Prints the failures, if any, and the summary"
+    for r in results:
+        if r['error'] is not None:
+            print("Failed:",r['home'])
+            print(r['error'])
+    print("{:>12} {:>8} {:>10} {:>8} {:>8} {:>10} {:>10} {:>12}".format(
+        "workspaces","failed","rows","files","plots",
+        "wall (s)","busy (s)","rows/s"))
+    print("{:>12} {:>8} {:>10} {:>8} {:>8} {:>10.2f} {:>10.2f} {:>12}".format(
+        summary['workspaces'],summary['failed'],summary['rows'],
+        summary['files'],summary['plots'],summary['wall'],
+        summary['busy'],
+        '-' if summary['rows_per_s'] is None
+        else '{:.0f}'.format(summary['rows_per_s'])))
+
+def run(args):
+    """Runs the batch asked for by the CLI args. Returns
+    the exit status.
+    """
+    homes = find_workspaces(args.batch)
+    if not homes:
+        print("No hyperpyron homes found in",", ".join(args.batch))
+        return os.EX_DATAERR
+    if args.savedir and not os.path.isdir(args.savedir):
+        print("Path {} is not a valid directory.".format(args.savedir))
+        return os.EX_DATAERR
+    from .reports import REPORT_PLOTS
+    plots = [name for name in REPORT_PLOTS if getattr(args,name)]
+    executor = 'serial' if args.executor == 'serial' else 'process'
+    print("Processing",len(homes),"workspaces...")
+    results,summary = run_batch(homes,args.jobs,executor,
+                                args.report,plots or None,
+                                args.savedir,
+                                '.pdf' if args.pdf else '.png',
+                                args.rebuild)
+    print_summary(results,summary)
+    return 1 if summary['failed'] else os.EX_OK
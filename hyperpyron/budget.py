@@ -6,37 +6,111 @@ Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
 """
 
 # python
-import yaml
 import os
 import numpy as np
 import pandas as pd
 from os import path
+from datetime import date
 
 # hyperpyron
-from .sysdirs import conf_dir
+from . import iconfig
+from .sysdirs import get_workspace
 from .categories import CATEGORIES,get_categories
+from .trends import net_by_period
+from .rollup import Rollup
+from .configs import read_config,derived,freeze
 
 default_budget = {c : 0 for c in CATEGORIES}
-budget_file = path.join(conf_dir,"budget.yaml")
 
-def get_budget():
-    "Load budget file, or try"
-    budget = default_budget
-    categories = get_categories()
+# How budget.yaml may name each period
+PERIOD_NAMES = {'week' : 'week',
+                'weekly' : 'week',
+                'month' : 'month',
+                'monthly' : 'month',
+                'year' : 'year',
+                'yearly' : 'year',
+                'annual' : 'year',
+                'annually' : 'year'}
+# The average length of each period, in days
+PERIOD_DAYS = {'week' : 7.,
+               'month' : 365.25/12,
+               'year' : 365.25}
+# pandas periods matching trends.PERIODS
+PANDAS_PERIODS = {'week' : 'W',
+                  'month' : 'M',
+                  'year' : 'Y'}
+
+def period_name(name):
+    "The canonical name, 'week', 'month' or 'year', of a period"
+    try:
+        return PERIOD_NAMES[str(name).lower()]
+    except KeyError:
+        raise ValueError("Unknown budget period: "+str(name))
+
+def read_budget_file(workspace=None):
+    """Reads workspace's budget file, by default the one
+    HYPERPYRON_HOME points to. Returns a dict mapping each
+    category to a tuple of (amount, period) pairs.
+
+    The file maps categories to an amount, a list of amounts
+    or a dict of named amounts. Amounts are per month, unless
+    the file has a top level 'period' key, e.g.,
+    period: weekly
+    A dict may also set the period of its own amounts, e.g.,
+    Healthcare: {period: annual, insurance: 1200}
+    Periods may be weekly, monthly or annual.
+
+    The file is only read again once it changes, and the
+    result is read-only. See configs.
+    """
+    if workspace is None:
+        workspace = get_workspace()
+    fpath = workspace.budget_file
+    return derived(fpath,'budget',lambda: parse_budget_file(fpath))
+
+def parse_budget_file(fpath):
+    "Does the work of read_budget_file"
     try:
-        with open(budget_file,'r') as f:
-            user_budget = yaml.load(f)
+        user_budget = read_config(fpath)
     except OSError:
-        budget = default_budget
-    else:
-        for category,contributions in user_budget.items():
-            if type(contributions) is dict:
-                contributions = list(contributions.values())
-            total = np.sum(contributions)
-            if category in CATEGORIES:
-                budget[category] += total
-            else:
-                budget["Other"] += total
+        return freeze({})
+    user_budget = dict(user_budget or {})
+    default = period_name(user_budget.pop('period',
+                                          iconfig.BUDGET_PERIOD))
+    out = {}
+    for category,contributions in user_budget.items():
+        period = default
+        if isinstance(contributions,dict):
+            contributions = dict(contributions)
+            if 'period' in contributions:
+                period = period_name(contributions.pop('period'))
+            contributions = list(contributions.values())
+        if category not in CATEGORIES:
+            category = "Other"
+        out.setdefault(category,[]).append((np.sum(contributions),
+                                            period))
+    return freeze(out)
+
+def get_budget(period=None,workspace=None):
+    """Load budget file, or try.
+
+    Returns a series of the budget for each category in
+    one period, 'week', 'month' or 'year', which defaults
+    to iconfig.BUDGET_PERIOD. Amounts budgeted for other
+    periods are scaled by the average length of each.
+    Expenditures are negative and income positive.
+    The budget is workspace's, see read_budget_file.
+    """
+    if period is None:
+        period = iconfig.BUDGET_PERIOD
+    period = period_name(period)
+    budget = dict(default_budget)
+    categories = get_categories(workspace)
+    for category,amounts in read_budget_file(workspace).items():
+        for amount,source in amounts:
+            if source != period:
+                amount = amount*PERIOD_DAYS[period]/PERIOD_DAYS[source]
+            budget[category] += amount
     for cat,cost in budget.items():
         budget[cat] = -np.abs(cost)
     budget["Income"] = np.abs(budget["Income"])
@@ -47,3 +121,109 @@ def get_budget():
             del budget[c]
     budget = pd.Series(budget,name="Budget")
     return budget
+
+def until(frame,asof):
+    """The part of frame, a transaction frame or a
+    rollup.Rollup, up to the end of the day asof
+    """
+    if isinstance(frame,Rollup):
+        # buckets are whole days
+        if frame.after is not None:
+            asof = min(asof,pd.Timestamp(frame.after))
+        return frame.window(frame.before,asof)
+    stop = asof + pd.Timedelta(days=1)
+    index = frame.index
+    if (isinstance(index,pd.DatetimeIndex)
+        and index.is_monotonic_increasing):
+        return frame.iloc[:index.searchsorted(stop,'left')]
+    return frame.loc[(pd.to_datetime(frame['Date']) < stop).values]
+
+def covered_periods(frame,freq):
+    "Every period from the first date in frame to the last"
+    if isinstance(frame,Rollup):
+        frame = frame.days()
+    dates = pd.DatetimeIndex(frame['Date'])
+    if len(dates) == 0:
+        return pd.PeriodIndex([],freq=freq)
+    return pd.period_range(dates.min(),dates.max(),freq=freq)
+
+def track_budget(frame,budget=None,period='month',asof=None):
+    """Compares actual cashflow to the budget in every
+    period covered by frame, for every category at once.
+    frame may be a transaction frame or a rollup.Rollup.
+
+    budget is a series as returned by get_budget(period),
+    which is loaded if None. asof is the date the report
+    is made, by default today. Only transactions up to
+    the end of asof count, so periods that start after
+    it have no actual cashflow. Periods that are not yet
+    over by asof are projected to their end at the rate
+    spent so far.
+
+    Returns a frame indexed by period start and category,
+    including "Total", with the columns
+      Actual             net cashflow so far, in dollars
+      Budget             budgeted cashflow for the period
+      Variance           Actual - Budget
+      Elapsed            fraction of the period before asof
+      Burn Rate          Actual per elapsed day
+      Projected          Actual extrapolated to the period end
+      Projected Variance Projected - Budget
+    Expenditures and overruns are negative.
+    """
+    period = period_name(period)
+    if budget is None:
+        budget = get_budget(period)
+    if asof is None:
+        asof = date.today()
+    asof = pd.Timestamp(asof).normalize()
+    freq = PANDAS_PERIODS[period]
+    periods = covered_periods(frame,freq)
+    actual = net_by_period(until(frame,asof),period)
+    actual.index = actual.index.to_period(freq)
+    actual = actual.reindex(periods,fill_value=0.)
+    categories = [c for c in budget.index if c != "Total"]
+    categories += [c for c in actual.columns if c not in categories]
+    actual = actual.reindex(columns=categories,fill_value=0.)
+    actual["Total"] = actual.sum(axis=1)
+    budgeted = budget.reindex(categories,fill_value=0.)
+    budgeted["Total"] = budgeted.sum()
+    budgeted = np.broadcast_to(budgeted.to_numpy(dtype=float),
+                               actual.shape)
+
+    starts = actual.index.start_time
+    lengths = ((actual.index.end_time - starts).ceil('D')
+               // pd.Timedelta(days=1)).to_numpy()
+    elapsed = ((asof - starts) // pd.Timedelta(days=1)).to_numpy() + 1
+    elapsed = np.clip(elapsed,0,lengths)[:,None]
+    lengths = lengths[:,None]
+    values = actual.to_numpy()
+    with np.errstate(divide='ignore',invalid='ignore'):
+        burn = np.where(elapsed > 0,values/elapsed,np.nan)
+    projected = burn*lengths
+    columns = {
+        'Actual' : values,
+        'Budget' : budgeted,
+        'Variance' : values - budgeted,
+        'Elapsed' : np.broadcast_to(elapsed/lengths,values.shape),
+        'Burn Rate' : burn,
+        'Projected' : projected,
+        'Projected Variance' : projected - budgeted}
+    index = pd.MultiIndex.from_product([starts.rename('Date'),
+                                        actual.columns.rename('Category')])
+    return pd.DataFrame({k : np.ravel(v) for k,v in columns.items()},
+                        index=index)
+
+def overruns(report):
+    """Selects the rows of a track_budget report that
+    are over budget, or projected to be.
+    """
+    return report.loc[(report['Variance'] < 0)
+                      | (report['Projected Variance'] < 0)]
+
+def __getattr__(name):
+    "budget_file is the default workspace's. See PEP 562."
+    if name == 'budget_file':
+        return get_workspace().budget_file
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+        __name__,name))
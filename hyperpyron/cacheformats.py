@@ -0,0 +1,464 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/cacheformats.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import os
+import shutil
+import pickle
+import numpy as np
+import pandas as pd
+from abc import ABC,abstractmethod
+from os import path
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# hyperpyron
+from . import iconfig
+from .schema import date_slice
+
+class CacheFormat(ABC):
+    """
+    This is the base class for on-disk formats
+    of the frame cache.
+
+    Subclasses set suffix, which is appended to
+    the cache name, and implement save, load,
+    writer and append. load takes optional before
+    and after dates. Formats that can will only read
+    rows in that window. Other formats read everything
+    and filter afterwards. writer returns a CacheWriter,
+    which saves a frame one chunk at a time. append
+    adds rows to a saved cache without rewriting it
+    where the format allows.
+    """
+    name = None
+    suffix = None
+
+    @classmethod
+    def available(cls):
+        "Whether the libraries this format needs are installed"
+        return True
+
+    def target(self,directory,basename):
+        "The path this format saves to"
+        return path.join(directory,basename+self.suffix)
+
+    def remove(self,target):
+        "Deletes whatever is saved at target"
+        if path.isdir(target):
+            shutil.rmtree(target)
+        elif path.exists(target):
+            os.remove(target)
+
+    def temporary(self,target):
+        """A path next to target to write to, before
+        moving it into place with replace
+        """
+        return "{}.{}.tmp".format(target,os.getpid())
+
+    def replace(self,tmp,target):
+        """Moves what was written to tmp to target in one
+        rename, so readers see either the old cache or the
+        new one, never half of one. Directories can't be
+        renamed over, so an old directory is moved aside
+        first. If nothing was written, target is removed.
+        """
+        if not path.exists(tmp):
+            self.remove(target)
+        elif path.isdir(target):
+            old = self.temporary(target) + '.old'
+            self.remove(old)
+            os.replace(target,old)
+            os.replace(tmp,target)
+            self.remove(old)
+        else:
+            os.replace(tmp,target)
+
+    @abstractmethod
+    def save(self,frame,target):
+        "Save frame to target"
+
+    @abstractmethod
+    def load(self,target,before=None,after=None):
+        "Load a frame from target"
+
+    @abstractmethod
+    def writer(self,target,chunked=False):
+        """Returns a CacheWriter that appends chunks to target.
+        chunked should be True if more than one chunk may be
+        written, in which case categorical columns may be
+        stored decoded.
+        """
+
+    @abstractmethod
+    def append(self,frame,target):
+        """Adds the rows of frame to the cache saved at
+        target, after its other rows. As with a streamed
+        cache, the rows are not sorted by date with the
+        rest. load_from_cache sorts them.
+        """
+
+class CacheWriter(ABC):
+    """
+    Writes a frame to the cache one chunk at a time,
+    so the whole frame never has to be in memory.
+    Chunks go to a temporary path, path, which replaces
+    target once the writer is closed. If writing fails,
+    the old cache is left as it was.
+    Use as a context manager:
+
+    with fmt.writer(target) as w:
+        for chunk in chunks:
+            w.write(chunk)
+    """
+    def __init__(self,target,fmt):
+        self.target = target
+        self.fmt = fmt
+        self.path = fmt.temporary(target)
+        fmt.remove(self.path)
+        self.rows = 0
+
+    def write(self,chunk):
+        "Append chunk to the cache"
+        self.append(chunk)
+        self.rows += len(chunk)
+
+    @abstractmethod
+    def append(self,chunk):
+        "Append chunk to the cache"
+
+    @abstractmethod
+    def finish(self):
+        "Finish writing to path"
+
+    def close(self):
+        "Finish writing and move the cache into place"
+        self.finish()
+        self.fmt.replace(self.path,self.target)
+
+    def abort(self):
+        "Stop writing and discard what was written"
+        self.finish()
+        self.fmt.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,*args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class PickleFormat(CacheFormat):
+    """Pickles the whole frame. Always available,
+    but slow, not memory-mapped, and only safe to
+    load from a cache directory you trust.
+    """
+    name = 'pickle'
+    suffix = '.pickle'
+
+    def save(self,frame,target):
+        tmp = self.temporary(target)
+        frame.to_pickle(tmp)
+        self.replace(tmp,target)
+
+    def load(self,target,before=None,after=None):
+        # A streamed cache holds one pickled frame per chunk.
+        frames = []
+        with open(target,'rb') as f:
+            while True:
+                try:
+                    frames.append(pickle.load(f))
+                except EOFError:
+                    break
+        if not frames:
+            return None
+        if len(frames) == 1:
+            frame = frames[0]
+        else:
+            frame = pd.concat(frames,ignore_index=True)
+        return date_slice(frame,before,after)
+
+    def writer(self,target,chunked=False):
+        return PickleWriter(target,self)
+
+    def append(self,frame,target):
+        # Another pickled frame at the end of the file, as a
+        # streamed cache has. If writing fails, it is cut off
+        # again so the file still loads.
+        with open(target,'ab') as f:
+            size = f.tell()
+            try:
+                pickle.dump(frame,f,pickle.HIGHEST_PROTOCOL)
+            except BaseException:
+                f.truncate(size)
+                raise
+
+class PickleWriter(CacheWriter):
+    "Pickles each chunk after the previous one in a single file"
+    def __init__(self,target,fmt):
+        super().__init__(target,fmt)
+        self.f = open(self.path,'wb')
+
+    def append(self,chunk):
+        pickle.dump(chunk,self.f,pickle.HIGHEST_PROTOCOL)
+
+    def finish(self):
+        self.f.close()
+
+class ArrowFormat(CacheFormat):
+    """Shared machinery for the formats
+    backed by pyarrow.
+    """
+    @classmethod
+    def available(cls):
+        return pa is not None
+
+    @staticmethod
+    def date_scalar(table,date):
+        "Converts date to an arrow scalar matching table.Date"
+        return pa.scalar(pd.Timestamp(date),
+                         type=table.schema.field('Date').type)
+
+    def filter_table(self,table,before,after):
+        "Selects rows of table between before and after"
+        if before is not None:
+            table = table.filter(pc.greater_equal(
+                table['Date'],self.date_scalar(table,before)))
+        if after is not None:
+            table = table.filter(pc.less_equal(
+                table['Date'],self.date_scalar(table,after)))
+        return table
+
+    def writer(self,target,chunked=False):
+        return ArrowWriter(target,self,chunked)
+
+class ArrowWriter(CacheWriter):
+    """Converts each chunk to an arrow table with the
+    same schema as the first, then hands it to the
+    format's write_table.
+
+    Arrow files can only hold one dictionary per column,
+    but the categories of each chunk may differ. So when
+    chunked, categorical columns are stored decoded.
+    """
+    def __init__(self,target,fmt,chunked=False):
+        super().__init__(target,fmt)
+        self.chunked = chunked
+        self.schema = None
+        self.sink = None
+        self.chunks = 0
+
+    def append(self,chunk):
+        self.append_table(pa.Table.from_pandas(chunk,
+                                               preserve_index=False))
+
+    def append_table(self,table):
+        "Append table, an arrow table, to the cache"
+        if self.chunked:
+            table = self.decode(table)
+        if self.schema is None:
+            self.schema = table.schema
+            self.sink = self.fmt.open_sink(self.path,table.schema)
+        else:
+            table = table.cast(self.schema)
+        self.fmt.write_table(self.sink,table,self.chunks)
+        self.chunks += 1
+
+    @staticmethod
+    def decode(table):
+        "Replaces dictionary-encoded columns with their values"
+        for i,field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                values = pc.cast(table.column(i),field.type.value_type)
+                table = table.set_column(i,field.name,values)
+        return table
+
+    def finish(self):
+        if self.sink is not None:
+            self.fmt.close_sink(self.sink)
+            self.sink = None
+
+class FeatherFormat(ArrowFormat):
+    """Saves the frame as an uncompressed Arrow IPC
+    (Feather v2) file. The file is memory-mapped
+    when loading, and each record batch is cut down
+    to the date window before anything is converted,
+    so only the rows in the window are copied into
+    pandas.
+    """
+    name = 'feather'
+    suffix = '.feather'
+
+    def open_sink(self,target,schema):
+        return pa.ipc.new_file(target,schema)
+
+    def write_table(self,sink,table,i):
+        sink.write_table(table)
+
+    def close_sink(self,sink):
+        sink.close()
+
+    def save(self,frame,target):
+        with self.writer(target) as w:
+            w.write(frame)
+
+    def append(self,frame,target):
+        # Arrow IPC files can't grow, so the saved record
+        # batches are copied from the memory map into a new
+        # file, followed by frame. They are never converted
+        # to pandas.
+        source = pa.memory_map(target,'r')
+        reader = pa.ipc.open_file(source)
+        with self.writer(target,chunked=True) as w:
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                w.append_table(pa.Table.from_batches([batch]))
+            w.write(frame)
+
+    @staticmethod
+    def slice_batch(batch,before,after):
+        """The rows of batch between before and after.
+        Batches sorted by date, as saved by save_to_cache,
+        are sliced by binary search without copying.
+        """
+        if before is None and after is None:
+            return batch
+        dates = batch.column(batch.schema.get_field_index('Date'))
+        dates = dates.to_numpy(zero_copy_only=False)
+        if before is not None:
+            before = pd.Timestamp(before).to_datetime64()
+        if after is not None:
+            after = pd.Timestamp(after).to_datetime64()
+        if len(dates) < 2 or np.all(dates[1:] >= dates[:-1]):
+            start,stop = 0,len(dates)
+            if before is not None:
+                start = np.searchsorted(dates,before,'left')
+            if after is not None:
+                stop = np.searchsorted(dates,after,'right')
+            return batch.slice(start,max(stop-start,0))
+        mask = np.ones(len(dates),dtype=bool)
+        if before is not None:
+            mask &= dates >= before
+        if after is not None:
+            mask &= dates <= after
+        return batch.filter(pa.array(mask))
+
+    def load(self,target,before=None,after=None):
+        # The map stays open for as long as arrow
+        # buffers reference it.
+        source = pa.memory_map(target,'r')
+        reader = pa.ipc.open_file(source)
+        batches = [self.slice_batch(reader.get_batch(i),before,after)
+                   for i in range(reader.num_record_batches)]
+        table = pa.Table.from_batches([b for b in batches
+                                       if b.num_rows > 0],
+                                      schema=reader.schema)
+        return table.to_pandas()
+
+class ParquetFormat(ArrowFormat):
+    """Saves the frame as a Parquet dataset partitioned
+    by year and month. Loading a date window only
+    opens the partitions that overlap it.
+    """
+    name = 'parquet'
+    suffix = '.parquet'
+    partitions = ['year','month']
+
+    def save(self,frame,target):
+        with self.writer(target) as w:
+            w.write(frame)
+
+    def open_sink(self,target,schema):
+        return target
+
+    def append(self,frame,target):
+        # New files in the partitions of the existing dataset.
+        # Their names are unique, so nothing is overwritten.
+        table = pa.Table.from_pandas(frame,preserve_index=False)
+        self.write_table(target,table,'append-{}-{}'.format(
+            os.getpid(),pd.Timestamp.now().value))
+
+    def write_table(self,sink,table,i):
+        dates = table['Date']
+        table = table.append_column('year',pc.year(dates))
+        table = table.append_column('month',pc.month(dates))
+        pq.write_to_dataset(table,sink,
+                            partition_cols=self.partitions,
+                            basename_template=('part-'+str(i)
+                                               +'-{i}.parquet'))
+
+    def close_sink(self,sink):
+        pass
+
+    def partition_filter(self,before,after):
+        "A dataset expression selecting partitions in the window"
+        year,month = ds.field('year'),ds.field('month')
+        expression = None
+        if before is not None:
+            before = pd.Timestamp(before)
+            expression = ((year > before.year)
+                          | ((year == before.year)
+                             & (month >= before.month)))
+        if after is not None:
+            after = pd.Timestamp(after)
+            upper = ((year < after.year)
+                     | ((year == after.year)
+                        & (month <= after.month)))
+            if expression is None:
+                expression = upper
+            else:
+                expression = expression & upper
+        return expression
+
+    def load(self,target,before=None,after=None):
+        dataset = ds.dataset(target,format='parquet',
+                             partitioning='hive')
+        table = dataset.to_table(
+            filter=self.partition_filter(before,after))
+        table = self.filter_table(table,before,after)
+        table = table.drop(self.partitions)
+        frame = table.to_pandas()
+        frame.sort_values("Date",kind='mergesort',inplace=True)
+        frame.reset_index(drop=True,inplace=True)
+        return frame
+
+cache_formats = {f.name : f for f in [PickleFormat,
+                                      FeatherFormat,
+                                      ParquetFormat]}
+
+def get_cache_format(name=None):
+    """Returns the cache format called name. By default,
+    uses iconfig.CACHE_FORMAT. 'auto' picks Feather if
+    pyarrow is installed and pickle otherwise. Falls
+    back to pickle if the requested format is unavailable.
+    Raises ValueError if there is no format called name.
+    """
+    if name is None:
+        name = iconfig.CACHE_FORMAT
+    if name == 'auto':
+        if FeatherFormat.available():
+            name = 'feather'
+        else:
+            name = 'pickle'
+    if name not in cache_formats:
+        raise ValueError("Unknown cache format {!r}. Available: {}.".format(
+            name,", ".join(['auto']+sorted(cache_formats))))
+    FormatClass = cache_formats[name]
+    if not FormatClass.available():
+        if iconfig.DEBUG:
+            print("Cache format",name,
+                  "unavailable. Falling back to pickle.")
+        FormatClass = PickleFormat
+    return FormatClass()
@@ -6,12 +6,12 @@ Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
 """
 
 # python
-import yaml
 import os
 from os import path
 
 # hyperpyron
-from .sysdirs import cache_dir,conf_dir,parse_conf_dir
+from .sysdirs import get_workspace
+from .configs import read_config,derived,freeze
 
 CATEGORIES = set(['Groceries',
                   'Restaurants',
@@ -26,8 +26,7 @@ CATEGORIES = set(['Groceries',
                   'Other'])
 COLUMNS = ['Date','Description','Amount','Category']
 
-categories_file=path.join(conf_dir,"categories.yaml")
-default_categories = {
+default_categories = freeze({
     'Automotive': [],
     'Cash': [],
     'Entertainment': [],
@@ -40,18 +39,38 @@ default_categories = {
     'Restaurants': [],
     'Retail': [],
     'Transfer': []
-}
-def get_categories():
-    "Load categories file, or try"
+})
+def get_categories(workspace=None):
+    """Load categories file, or try.
+
+    Returns a read-only mapping from each category to
+    a tuple of its keywords. The file is only read and
+    validated again once it changes. See configs.
+    The file is workspace's, by default the one
+    HYPERPYRON_HOME points to. See sysdirs.
+    """
+    if workspace is None:
+        workspace = get_workspace()
+    fpath = workspace.categories_file
+    return derived(fpath,'categories',lambda: read_categories(fpath))
+
+def read_categories(fpath):
+    "Extends the default categories with the categories file fpath"
+    categories = {k : list(v) for k,v in default_categories.items()}
     try:
-        categories = default_categories
-        with open(categories_file,'r') as f:
-            user_categories = yaml.load(f)
-        for k in user_categories.keys():
-            if k not in default_categories.keys():
-                raise ValueError("Unknown category key: \n"
-                                 +str(k))
-            categories[k] += user_categories[k]
+        user_categories = read_config(fpath)
     except OSError:
-        categories = default_categories
-    return categories
+        return freeze(categories)
+    for k,v in (user_categories or {}).items():
+        if k not in default_categories.keys():
+            raise ValueError("Unknown category key: \n"
+                             +str(k))
+        categories[k] += list(v or [])
+    return freeze(categories)
+
+def __getattr__(name):
+    "categories_file is the default workspace's. See PEP 562."
+    if name == 'categories_file':
+        return get_workspace().categories_file
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+        __name__,name))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/configs.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import os
+import threading
+import yaml
+from os import path
+try:
+    from yaml import CSafeLoader as Loader
+except ImportError:
+    from yaml import SafeLoader as Loader
+
+# hyperpyron
+from .utils import file_digest
+
+class FrozenDict(dict):
+    """
+    A dict that can't be changed once made. Configs are
+    shared by every caller, so they are handed out frozen.
+    Copy one with dict() to get a mutable version.
+
+    Anything derived from a FrozenDict can be cached on it
+    with memoize, since the dict itself never changes.
+    """
+    def _immutable(self,*args,**kwargs):
+        raise TypeError("Configs can't be modified. Copy with dict().")
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    __ior__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+
+    def __reduce__(self):
+        return (FrozenDict,(dict(self),))
+
+    def memoize(self,key,build):
+        "Returns build(), computed once for each key"
+        memo = self.__dict__.setdefault('memo',{})
+        if key not in memo:
+            memo[key] = build()
+        return memo[key]
+
+def freeze(obj):
+    """Returns a read-only copy of obj, with dicts made
+    FrozenDicts and lists tuples, all the way down.
+    """
+    if isinstance(obj,dict):
+        return FrozenDict((k,freeze(v)) for k,v in obj.items())
+    if isinstance(obj,(list,tuple)):
+        return tuple(freeze(v) for v in obj)
+    if isinstance(obj,set):
+        return frozenset(obj)
+    return obj
+
+class ConfigCache:
+    """
+    Memoizes config files, and anything derived from
+    them, by path. A file is only read again once its
+    modification time or size changes, and anything
+    derived from it is only rebuilt if its contents did.
+    YAML is parsed with the C loader when PyYAML was
+    built with it.
+
+    Use the module level functions, read_config,
+    config_digest and derived.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.RLock()
+
+    def clear(self):
+        "Forgets every file"
+        with self.lock:
+            self.entries = {}
+
+    def entry(self,fpath):
+        """The entry for fpath, made afresh if the file
+        changed since it was last seen. Missing files
+        have no digest.
+        """
+        fpath = path.abspath(fpath)
+        try:
+            stat = os.stat(fpath)
+            version = (stat.st_mtime_ns,stat.st_size)
+        except OSError:
+            version = None
+        with self.lock:
+            entry = self.entries.get(fpath)
+            if entry is not None and entry['version'] == version:
+                return entry
+            digest = None
+            if version is not None:
+                try:
+                    digest = file_digest(fpath)
+                except OSError:
+                    version = None
+            if entry is None or entry['digest'] != digest:
+                entry = {'digest' : digest,'values' : {}}
+                self.entries[fpath] = entry
+            entry['version'] = version
+            return entry
+
+    def digest(self,fpath):
+        "The sha256 hex digest of fpath, or None if it is missing"
+        return self.entry(fpath)['digest']
+
+    def derived(self,fpath,name,build):
+        """Returns build(), computed once per version of
+        fpath. name tells apart things derived from the
+        same file. Exceptions are not cached.
+        """
+        with self.lock:
+            values = self.entry(fpath)['values']
+            if name not in values:
+                values[name] = build()
+            return values[name]
+
+    def read(self,fpath):
+        """The parsed and frozen contents of the YAML
+        file fpath. Raises OSError if it can't be read.
+        """
+        def load():
+            with open(fpath,'r') as f:
+                return freeze(yaml.load(f,Loader=Loader))
+        return self.derived(fpath,'yaml',load)
+
+config_cache = ConfigCache()
+
+def read_config(fpath):
+    "Reads the YAML file fpath, once per version. See ConfigCache."
+    return config_cache.read(fpath)
+
+def config_digest(fpath):
+    "The digest of fpath, computed once per version"
+    return config_cache.digest(fpath)
+
+def derived(fpath,name,build):
+    "Returns build(), computed once per version of fpath"
+    return config_cache.derived(fpath,name,build)
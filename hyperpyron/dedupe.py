@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/dedupe.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import os
+import threading
+import numpy as np
+import pandas as pd
+from os import path
+
+# hyperpyron
+from . import iconfig
+from .schema import to_cents
+from .utils import make_sure_path_exists
+
+def normalize_descriptions(descriptions):
+    """Lowercases descriptions and collapses whitespace,
+    so that the same transaction exported twice with
+    different spacing or capitalization compares equal.
+    Each distinct description is only normalized once.
+    """
+    codes,uniques = pd.factorize(descriptions)
+    uniques = (pd.Series(uniques,dtype=object).astype(str)
+               .str.lower()
+               .str.replace(r'\s+',' ',regex=True)
+               .str.strip()).values
+    return np.append(uniques,'')[codes]
+
+def transaction_keys(frame):
+    """Hashes each row's amount, to the cent, and
+    normalized description into a uint64.
+    """
+    keys = pd.DataFrame({
+        'Description' : normalize_descriptions(frame['Description']),
+        'Amount' : to_cents(frame['Amount'])})
+    return pd.util.hash_pandas_object(keys,index=False).values
+
+def transaction_days(frame):
+    "Each row's date, as whole days since the epoch"
+    dates = pd.to_datetime(frame['Date']).values
+    return dates.astype('datetime64[D]').astype(np.int64)
+
+def transaction_hashes(keys,days,occurrence,shift=0):
+    """Combines keys, days shifted by shift, and
+    occurrence into one uint64 hash per row.
+    """
+    parts = pd.DataFrame({'key' : keys,
+                          'day' : days + shift,
+                          'occurrence' : occurrence})
+    return pd.util.hash_pandas_object(parts,index=False).values
+
+class OccurrenceCounts:
+    """
+    Counts the identical rows seen so far in one file on
+    each day, so that a file read in chunks is hashed as
+    the whole file would be. See
+    DuplicateIndex.drop_duplicates.
+
+    Initiate with
+    counts = OccurrenceCounts()
+    """
+    def __init__(self):
+        # sorted hashes of each key and day, and how
+        # many rows have been seen with each
+        self.pairs = np.zeros(0,dtype=np.uint64)
+        self.counts = np.zeros(0,dtype=np.int64)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def occurrence(self,keys,days):
+        """Returns how many identical rows precede each row
+        on its day, in this chunk and the ones before it,
+        then counts this chunk's rows.
+        """
+        pairs,inverse,sizes = np.unique(transaction_hashes(keys,days,0),
+                                        return_inverse=True,
+                                        return_counts=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse,kind='stable')
+        within = np.empty(len(inverse),dtype=np.int64)
+        within[order] = (np.arange(len(inverse))
+                         - np.repeat(np.cumsum(sizes)-sizes,sizes))
+        pos = np.searchsorted(self.pairs,pairs)
+        known = pos < len(self.pairs)
+        known[known] = self.pairs[pos[known]] == pairs[known]
+        seen = np.zeros(len(pairs),dtype=np.int64)
+        seen[known] = self.counts[pos[known]]
+        self.counts[pos[known]] += sizes[known]
+        self.pairs = np.insert(self.pairs,pos[~known],pairs[~known])
+        self.counts = np.insert(self.counts,pos[~known],sizes[~known])
+        return within + seen[inverse]
+
+class DuplicateIndex:
+    """
+    Remembers a hash of every transaction ingested from
+    files that opt in to cross-file duplicate checking,
+    along with the file each hash came from. It is saved
+    in the cache directory, so checking a new file only
+    costs a lookup per new row, however long the history.
+
+    A row is hashed from its date, amount and normalized
+    description, and from how many identical rows precede
+    it on the same day in the same file. So two identical
+    purchases in one statement are both kept, but the same
+    purchases in an overlapping statement are dropped.
+
+    The index also records which files lost rows to which.
+    If a file is modified or deleted, the files that lost
+    rows to it must be re-read. See dependents.
+
+    New hashes are held apart from the rest until merge,
+    which save calls, so that ingesting many files only
+    copies the index once.
+
+    Initiate with
+    d = DuplicateIndex(cache_dir)
+    """
+    def __init__(self,cache_dir):
+        self.target = path.join(cache_dir,iconfig.DEDUPE_INDEX_NAME)
+        self.lock = threading.Lock()
+        self.load()
+
+    def clear(self):
+        "Forgets everything"
+        self.hashes = np.zeros(0,dtype=np.uint64)
+        self.owners = np.zeros(0,dtype=np.int32)
+        self.pending = []
+        self.recent_hashes = np.zeros(0,dtype=np.uint64)
+        self.recent_owners = np.zeros(0,dtype=np.int32)
+        self.paths = []
+        self.ids = {}
+        self.ingested = set()
+        self.lost_to = {}
+        self.rules_digest = None
+
+    def load(self):
+        "Read the index from disk, if there is one"
+        self.clear()
+        try:
+            with np.load(self.target,allow_pickle=False) as data:
+                self.hashes = data['hashes']
+                self.owners = data['owners']
+                self.paths = [str(p) for p in data['paths']]
+                self.ids = {p : i for i,p in enumerate(self.paths)}
+                self.ingested = set(self.paths[i] for i in data['ingested'])
+                for i,j in zip(data['lost_from'],data['lost_to']):
+                    self.lost_to.setdefault(self.paths[i],
+                                            set()).add(self.paths[j])
+                self.rules_digest = str(data['rules_digest'])
+        except (OSError,ValueError,KeyError):
+            self.clear()
+
+    def save(self):
+        "Write the index to disk"
+        self.merge()
+        make_sure_path_exists(path.dirname(self.target))
+        ids = self.ids
+        pairs = [(ids[f],ids[g])
+                 for f,targets in sorted(self.lost_to.items())
+                 for g in sorted(targets)]
+        pairs = np.array(pairs,dtype=np.int32).reshape(-1,2)
+        ingested = np.array(sorted(ids[f] for f in self.ingested),
+                            dtype=np.int32)
+        tmp = self.target + '.tmp.npz'
+        np.savez(tmp,
+                 hashes=self.hashes,
+                 owners=self.owners,
+                 paths=np.array(self.paths,dtype=str),
+                 ingested=ingested,
+                 lost_from=pairs[:,0],
+                 lost_to=pairs[:,1],
+                 rules_digest=np.array(str(self.rules_digest)))
+        os.replace(tmp,self.target)
+
+    def owner_id(self,fpath):
+        "The integer id of fpath, adding it if needed"
+        if fpath not in self.ids:
+            self.ids[fpath] = len(self.paths)
+            self.paths.append(fpath)
+        return self.ids[fpath]
+
+    def files(self):
+        "Every file that has been through the index"
+        return sorted(self.ingested)
+
+    def __contains__(self,fpath):
+        return path.abspath(fpath) in self.ingested
+
+    def dependents(self,fpaths):
+        """Every file that, directly or indirectly,
+        lost rows to a file in fpaths.
+        """
+        fpaths = set(path.abspath(f) for f in fpaths)
+        out = set()
+        changed = True
+        while changed:
+            changed = False
+            for f,targets in self.lost_to.items():
+                if f not in out and targets & (fpaths | out):
+                    out.add(f)
+                    changed = True
+        return sorted(out - fpaths)
+
+    def forget(self,fpaths):
+        "Removes the hashes of every file in fpaths"
+        drop = [self.ids[path.abspath(f)] for f in fpaths
+                if path.abspath(f) in self.ids]
+        for f in fpaths:
+            self.ingested.discard(path.abspath(f))
+            self.lost_to.pop(path.abspath(f),None)
+        if drop:
+            self.sort_recent()
+            keep = ~np.isin(self.owners,drop)
+            self.hashes = self.hashes[keep]
+            self.owners = self.owners[keep]
+            keep = ~np.isin(self.recent_owners,drop)
+            self.recent_hashes = self.recent_hashes[keep]
+            self.recent_owners = self.recent_owners[keep]
+
+    def find(self,probes,exclude=-1):
+        """Returns a mask of which probes are in the index
+        for a file other than the one with id exclude, and
+        the id of one such file for each probe.
+        """
+        self.sort_recent()
+        found = np.zeros(len(probes),dtype=bool)
+        owners = np.full(len(probes),-1,dtype=np.int32)
+        for hashes,ids in [(self.hashes,self.owners),
+                           (self.recent_hashes,self.recent_owners)]:
+            # every entry equal to each probe, as the same
+            # transaction may be recorded for several files
+            start = np.searchsorted(hashes,probes,'left')
+            sizes = np.searchsorted(hashes,probes,'right') - start
+            probe = np.repeat(np.arange(len(probes)),sizes)
+            offset = np.arange(len(probe)) - np.repeat(np.cumsum(sizes)
+                                                       - sizes,sizes)
+            entry = ids[np.repeat(start,sizes) + offset]
+            other = entry != exclude
+            found[probe[other]] = True
+            owners[probe[other]] = entry[other]
+        return found,owners
+
+    def add(self,hashes,owner):
+        """Adds hashes belonging to owner. They are searched
+        along with the rest, but only merged into the sorted
+        index by merge.
+        """
+        self.pending.append((hashes,np.full(len(hashes),owner,
+                                            dtype=np.int32)))
+
+    def sort_recent(self):
+        """Sorts the hashes added since the last merge, so
+        that they can be searched.
+        """
+        if not self.pending:
+            return
+        hashes = np.concatenate([h for h,_ in self.pending])
+        owners = np.concatenate([o for _,o in self.pending])
+        order = np.argsort(hashes,kind='stable')
+        pos = np.searchsorted(self.recent_hashes,hashes[order],'right')
+        self.recent_hashes = np.insert(self.recent_hashes,pos,
+                                       hashes[order])
+        self.recent_owners = np.insert(self.recent_owners,pos,
+                                       owners[order])
+        self.pending = []
+
+    def merge(self):
+        "Merges every added hash into the sorted index"
+        self.sort_recent()
+        if len(self.recent_hashes) == 0:
+            return
+        pos = np.searchsorted(self.hashes,self.recent_hashes,'right')
+        self.hashes = np.insert(self.hashes,pos,self.recent_hashes)
+        self.owners = np.insert(self.owners,pos,self.recent_owners)
+        self.recent_hashes = self.recent_hashes[:0]
+        self.recent_owners = self.recent_owners[:0]
+
+    def drop_duplicates(self,fpath,frame,tolerance=0,counts=None):
+        """Removes the rows of frame, parsed from fpath,
+        that were already ingested from another file, then
+        records the remaining rows. Dates may differ by up
+        to tolerance days. Any hashes previously recorded
+        for fpath are replaced.
+
+        To read fpath in chunks, pass the same
+        OccurrenceCounts as counts with every chunk of it,
+        so the chunks are hashed as the whole file would be,
+        and earlier chunks are kept rather than replaced.
+        """
+        fpath = path.abspath(fpath)
+        keys = transaction_keys(frame)
+        days = transaction_days(frame)
+        first = counts is None or len(counts) == 0
+        if counts is None:
+            occurrence = (pd.DataFrame({'key' : keys,'day' : days})
+                          .groupby(['key','day']).cumcount().values)
+        else:
+            occurrence = counts.occurrence(keys,days)
+        with self.lock:
+            if first:
+                self.forget([fpath])
+            owner = self.owner_id(fpath)
+            duplicate = np.zeros(len(frame),dtype=bool)
+            for shift in range(-tolerance,tolerance+1):
+                probes = transaction_hashes(keys,days,occurrence,shift)
+                # earlier chunks of the same file don't count
+                found,owners = self.find(probes,owner)
+                if found.any():
+                    duplicate |= found
+                    lost = self.lost_to.setdefault(fpath,set())
+                    lost.update(self.paths[i]
+                                for i in np.unique(owners[found]))
+            kept = transaction_hashes(keys,days,occurrence)[~duplicate]
+            self.add(kept,owner)
+            self.ingested.add(fpath)
+        if iconfig.DEBUG and duplicate.any():
+            print("Dropping",duplicate.sum(),
+                  "duplicate rows from",path.basename(fpath))
+        return frame.loc[~duplicate]
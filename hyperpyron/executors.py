@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/executors.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import os
+from concurrent.futures import ThreadPoolExecutor,ProcessPoolExecutor
+
+# hyperpyron
+from . import iconfig
+
+class SerialExecutor:
+    """
+    Runs tasks one after another in the calling thread.
+    Supports the subset of the concurrent.futures
+    executor interface that hyperpyron uses, so it
+    can stand in for a pool.
+    """
+    def __init__(self,max_workers=None,initializer=None,initargs=()):
+        self.max_workers = 1
+        if initializer is not None:
+            initializer(*initargs)
+
+    def map(self,fn,*iterables):
+        return map(fn,*iterables)
+
+    def shutdown(self,wait=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.shutdown()
+        return False
+
+executors = {'serial' : SerialExecutor,
+             'thread' : ThreadPoolExecutor,
+             'process' : ProcessPoolExecutor}
+
+def get_executor(kind=None,jobs=None,initializer=None,initargs=()):
+    """Returns an executor of the given kind,
+    'serial', 'thread' or 'process', with jobs workers.
+    kind and jobs default to iconfig.EXECUTOR and
+    iconfig.JOBS. jobs of 0 or less means one worker
+    per core. A single job always runs serially.
+    If given, initializer(*initargs) runs once
+    in each worker before any tasks.
+    """
+    if kind is None:
+        kind = iconfig.EXECUTOR
+    if jobs is None:
+        jobs = iconfig.JOBS
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    if kind not in executors:
+        raise ValueError("Unknown executor: "+str(kind))
+    if jobs == 1:
+        kind = 'serial'
+    return executors[kind](max_workers=jobs,
+                           initializer=initializer,
+                           initargs=initargs)
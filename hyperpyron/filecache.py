@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/filecache.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import os
+import json
+import hashlib
+import threading
+import pandas as pd
+from os import path
+
+# hyperpyron
+from . import iconfig
+from .utils import file_digest,make_sure_path_exists
+
+def file_entry(fpath):
+    """The size, modification time and content hash of
+    the file at fpath, as recorded in the manifest. Taken
+    before the file is parsed, so that a file modified
+    while it is read is seen as changed next time.
+    """
+    stat = os.stat(fpath)
+    return {'size' : stat.st_size,
+            'mtime' : stat.st_mtime_ns,
+            'sha256' : file_digest(fpath)}
+
+class FileCache:
+    """
+    Caches the parsed contents of individual data files
+    so that only new or changed files need to be re-read.
+
+    A manifest in the cache directory records each file's
+    path, size, modification time and content hash, along
+    with the name of the pickle holding its parsed frame.
+    Each entry is also tagged with a digest of the rules
+    used to parse it, so changing the rules invalidates
+    the entry.
+    Files whose size and modification time are unchanged
+    are trusted without being hashed. Files whose metadata
+    changed are hashed, and only re-read if the contents
+    actually differ.
+
+    Initiate with
+    c = FileCache(cache_dir)
+    """
+    def __init__(self,cache_dir):
+        self.directory = path.join(cache_dir,iconfig.FILECACHE_DIR)
+        self.manifest_path = path.join(self.directory,
+                                       iconfig.MANIFEST_NAME)
+        self.manifest = self.load_manifest()
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def load_manifest(self):
+        "Read the manifest from disk, if there is one"
+        try:
+            with open(self.manifest_path,'r') as f:
+                return json.load(f)
+        except (OSError,ValueError):
+            return {}
+
+    def save(self):
+        "Write the manifest to disk"
+        make_sure_path_exists(self.directory)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp,'w') as f:
+            json.dump(self.manifest,f,indent=1,sort_keys=True)
+        os.replace(tmp,self.manifest_path)
+
+    def frame_path(self,fpath):
+        "Where the parsed frame for fpath is stored"
+        name = hashlib.sha1(fpath.encode('utf-8')).hexdigest()
+        return path.join(self.directory,name+'.pickle')
+
+    def get(self,fpath,tag=None):
+        """Returns the cached frame for fpath,
+        or None if the file is new or has changed,
+        or was parsed with rules other than tag.
+        """
+        fpath = path.abspath(fpath)
+        with self.lock:
+            self.seen.add(fpath)
+            entry = self.manifest.get(fpath)
+        if entry is None or entry.get('tag') != tag:
+            return None
+        if not self.is_current(fpath,entry):
+            return None
+        try:
+            return pd.read_pickle(self.frame_path(fpath))
+        except (OSError,ValueError):
+            return None
+
+    def is_current(self,fpath,entry):
+        """Whether the file at fpath still has the contents
+        recorded in its manifest entry. Files are only hashed
+        if their size is unchanged but their mtime is not.
+        """
+        try:
+            stat = os.stat(fpath)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns != entry['mtime']:
+            if file_digest(fpath) != entry['sha256']:
+                return False
+            entry['mtime'] = stat.st_mtime_ns
+        return True
+
+    def changed(self):
+        """Returns every file in the manifest that has
+        since been modified or deleted.
+        """
+        return [fpath for fpath,entry in sorted(self.manifest.items())
+                if not self.is_current(fpath,entry)]
+
+    def put(self,fpath,frame,tag=None,entry=None):
+        """Stores the parsed frame for fpath. entry is
+        file_entry(fpath) from before it was parsed. If
+        None, the file is described as it is now.
+        """
+        fpath = path.abspath(fpath)
+        if entry is None:
+            entry = file_entry(fpath)
+        entry = dict(entry,tag=tag)
+        with self.lock:
+            self.seen.add(fpath)
+            self.manifest[fpath] = entry
+        make_sure_path_exists(self.directory)
+        frame.to_pickle(self.frame_path(fpath))
+
+    def prune(self):
+        """Forgets every file that has not been seen
+        since the cache was loaded, e.g., because
+        it was deleted. Returns the forgotten paths.
+        """
+        stale = [f for f in self.manifest if f not in self.seen]
+        self.invalidate(stale)
+        return stale
+
+    def invalidate(self,fpaths):
+        "Forgets every file in fpaths, so they will be re-read"
+        for fpath in fpaths:
+            fpath = path.abspath(fpath)
+            if self.manifest.pop(fpath,None) is None:
+                continue
+            try:
+                os.remove(self.frame_path(fpath))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        "Forgets every file"
+        self.seen = set()
+        self.prune()
+
+    def __contains__(self,fpath):
+        return path.abspath(fpath) in self.manifest
+
+    def __len__(self):
+        return len(self.manifest)
@@ -6,44 +6,336 @@ Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
 """
 
 # python
+import os
+import json
 from os import path
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
 # hyperpyron
 from . import iconfig
-from .sysdirs import cache_dir,conf_dir,parse_conf_dir
-from .utils import invert_dict
-from .categories import CATEGORIES,COLUMNS,get_categories
-from .parsers import parsers
+from ._version import __version__
+from .utils import data_digest
+from .utils import make_sure_path_exists
+from .parsers import get_data_parser
 from .parseconfig import DataRulesParser
+from .filecache import FileCache
+from .dedupe import DuplicateIndex
+from .cacheformats import get_cache_format
+from .schema import compact,index_by_date
+from .rollup import Rollup
+from .store import TransactionStore
+from .executors import get_executor,SerialExecutor
+from .profiling import profiled
+from .configs import config_digest
 
-def parse_from_data():
-    "Loads data from files specified in YAML configs"
-    all_rules = DataRulesParser(parse_conf_dir)
-    frames = []
-    for rules in all_rules.values():
-        ParserClass = parsers[rules['type']]
-        p = ParserClass(rules)
-        frames.append(p.get_frame())
+@profiled()
+def parse_from_data(workspace,rebuild=False,jobs=None,executor=None):
+    """Loads data from files specified in the YAML configs
+    of workspace, a sysdirs.Workspace.
+
+    Parsed files are cached individually, so only new or
+    changed files are re-read. Rows from deleted files are
+    dropped. If rebuild is True, every file is re-read.
+
+    jobs and executor choose how files are parsed.
+    See executors.get_executor. With more than one job,
+    the rule sets are also processed concurrently. The
+    result does not depend on the executor.
+
+    The frame is sorted and indexed by date, so date
+    windows can be selected by binary search. See
+    schema.index_by_date.
+
+    Rule sets with cross-file duplicates share a
+    DuplicateIndex, and are read one after another so
+    that which copy of a duplicate is kept does not
+    depend on thread timing.
+    """
+    all_rules = DataRulesParser(workspace.parse_conf_dir)
+    file_cache = FileCache(workspace.cache_dir)
+    deduper = DuplicateIndex(workspace.cache_dir)
+    if rebuild:
+        file_cache.clear()
+        deduper.clear()
+    update_duplicate_index(workspace,deduper,file_cache)
+    with get_executor(executor,jobs) as pool:
+        def build(rules):
+            ParserClass = get_data_parser(rules['type'])
+            return ParserClass(rules,file_cache,pool,
+                               deduper=deduper,
+                               workspace=workspace).get_frame()
+        if (isinstance(pool,SerialExecutor) or len(all_rules) < 2
+            or any(rules.get('cross-file duplicates')
+                   for rules in all_rules.values())):
+            outer = SerialExecutor()
+        else:
+            # Threads that only wait on the pool,
+            # and run the vectorized per rule set stages.
+            outer = ThreadPoolExecutor(max_workers=len(all_rules))
+        with outer:
+            frames = list(outer.map(build,all_rules.values()))
+    for fpath in file_cache.prune():
+        if iconfig.DEBUG:
+            print("Forgetting: ",fpath)
+    file_cache.save()
+    deduper.save()
     frame = pd.concat(frames,
                       axis=0,
                       ignore_index=True)
-    frame.reset_index(inplace=True)
-    return frame
+    return index_by_date(compact(frame))
+
+def update_duplicate_index(workspace,deduper,file_cache):
+    """Makes the duplicate index consistent with the
+    data files before they are read. Files that changed
+    since they were cached are forgotten, along with any
+    files that lost rows to them, so that all of them
+    are re-read. If the parse rules changed, everything
+    in the index is re-read.
+    """
+    rules = directory_digest(workspace.parse_conf_dir)
+    if deduper.rules_digest != rules:
+        file_cache.invalidate(deduper.files())
+        deduper.clear()
+        deduper.rules_digest = rules
+        return
+    changed = file_cache.changed()
+    dependents = deduper.dependents(changed)
+    for fpath in dependents:
+        if iconfig.DEBUG:
+            print("Re-reading: ",fpath)
+    file_cache.invalidate(dependents)
+    deduper.forget(changed+dependents)
+
+def directory_digest(d):
+    """Returns a digest of the contents of every file in d.
+    Files are only hashed again once they change. See
+    configs.config_digest.
+    """
+    contents = []
+    for root,dirs,files in os.walk(d):
+        for name in files:
+            fpath = path.join(root,name)
+            contents.append((path.relpath(fpath,d),
+                             config_digest(fpath)))
+    return data_digest(sorted(contents))
+
+def get_config_digests(workspace):
+    """Returns digests of everything besides the data
+    files that the cached frame of workspace depends on:
+    the hyperpyron version and frame schema, the parse
+    rules, and the categories file.
+    """
+    return {'version' : __version__,
+            'schema' : iconfig.SCHEMA_VERSION,
+            'rules' : directory_digest(workspace.parse_conf_dir),
+            'categories' : config_digest(workspace.categories_file)}
+
+@profiled()
+def stream_to_cache(workspace,chunksize,cache_format=None):
+    """Loads data from files specified in YAML configs
+    and writes it straight to the cache, chunksize rows
+    at a time. Peak memory is bounded by the chunk size
+    rather than the size of the data. The per-file cache
+    is not used. Returns the number of rows written.
+
+    Unlike parse_from_data, rows are not sorted by date
+    across chunks. load_from_cache sorts them.
+
+    Rule sets with cross-file duplicates share a
+    DuplicateIndex, rebuilt from scratch since every file
+    is read, and saved afterwards as in parse_from_data.
+    It holds a hash per ingested row, so memory grows
+    with those rule sets' data rather than the chunk size.
+    """
+    all_rules = DataRulesParser(workspace.parse_conf_dir)
+    fmt = get_cache_format(cache_format)
+    target = fmt.target(workspace.cache_dir,iconfig.FCACHE_NAME)
+    make_sure_path_exists(workspace.cache_dir)
+    deduper = DuplicateIndex(workspace.cache_dir)
+    deduper.clear()
+    deduper.rules_digest = directory_digest(workspace.parse_conf_dir)
+    rollup = Rollup.empty()
+    with fmt.writer(target,chunked=True) as w:
+        for rules in all_rules.values():
+            ParserClass = get_data_parser(rules['type'])
+            p = ParserClass(rules,chunksize=chunksize,deduper=deduper,
+                            workspace=workspace)
+            for chunk in p.stream():
+                chunk = compact(chunk)
+                w.write(chunk)
+                rollup.add(chunk)
+    deduper.save()
+    save_rollup(workspace,rollup,fmt)
+    write_cache_meta(workspace,fmt)
+    return w.rows
+
+@profiled()
+def save_to_cache(workspace,frame,cache_format=None,rollup=None):
+    """Save a data frame to the cache of workspace, along
+    with its rollup cube. If rollup is None, it is built
+    from frame. cache_format defaults to iconfig.CACHE_FORMAT.
+    """
+    fmt = get_cache_format(cache_format)
+    make_sure_path_exists(workspace.cache_dir)
+    fmt.save(frame,fmt.target(workspace.cache_dir,iconfig.FCACHE_NAME))
+    if rollup is None:
+        rollup = Rollup.from_frame(compact(frame))
+    save_rollup(workspace,rollup,fmt)
+    write_cache_meta(workspace,fmt)
+
+@profiled()
+def append_to_cache(workspace,frame,rollup):
+    """Adds the rows of frame to the frame cache of
+    workspace without rewriting the rows already in it,
+    where the format allows, and saves rollup, which
+    must already include them. See CacheFormat.append.
+    Returns False, and saves nothing, if there is no
+    current cache to add to.
+    """
+    meta = read_cache_meta(workspace)
+    if not cache_is_current(workspace,meta):
+        return False
+    fmt = get_cache_format(meta.get('format'))
+    if fmt.name != meta.get('format'):
+        return False
+    target = fmt.target(workspace.cache_dir,iconfig.FCACHE_NAME)
+    if not path.exists(target):
+        return False
+    fmt.append(compact(frame),target)
+    save_rollup(workspace,rollup,fmt)
+    return True
+
+def save_rollup(workspace,rollup,fmt):
+    "Save the daily rollup cube next to the frame cache"
+    fmt.save(rollup.daily,fmt.target(workspace.cache_dir,
+                                     iconfig.ROLLUP_NAME))
 
-def save_to_cache(frame):
-    "Save a data frame to the cache"
-    frame.to_pickle(path.join(cache_dir,
-                              iconfig.FCACHE_NAME),
-                    None)
+def cache_meta_path(workspace):
+    "Where the metadata of the frame cache is saved"
+    return path.join(workspace.cache_dir,iconfig.FCACHE_META_NAME)
 
-def load_from_cache():
-    "Load a data frame from cache"
-    target = path.join(cache_dir,
-                       iconfig.FCACHE_NAME)
+def write_cache_meta(workspace,fmt):
+    "Records what the cached frame was built from"
+    meta = get_config_digests(workspace)
+    meta['format'] = fmt.name
+    with open(cache_meta_path(workspace),'w') as f:
+        json.dump(meta,f,indent=1,sort_keys=True)
+
+def read_cache_meta(workspace):
+    "Reads the metadata saved alongside the cached frame"
+    try:
+        with open(cache_meta_path(workspace),'r') as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return {}
+
+def cache_is_current(workspace,meta=None):
+    """Checks whether the cached frame was built from
+    the current configuration. If not, the reason is
+    reported when debugging.
+    """
+    if meta is None:
+        meta = read_cache_meta(workspace)
+    current = get_config_digests(workspace)
+    changed = [k for k in sorted(current.keys())
+               if meta.get(k) != current[k]]
+    if changed and iconfig.DEBUG:
+        print("Cache is stale. Changed: ",", ".join(changed))
+    return not changed
+
+@profiled()
+def load_from_cache(workspace,before=None,after=None):
+    """Load a data frame from the cache of workspace.
+
+    If before and/or after are given, only rows between
+    those dates are returned. Columnar cache formats only
+    read those rows from disk.
+
+    Returns None if there is no cache, or if the parse
+    rules, categories or hyperpyron version changed since
+    it was saved. In that case, parse_from_data only
+    re-reads data files whose parse rules changed. The
+    rest are re-categorized from the per-file cache.
+
+    The frame is indexed by date, as in parse_from_data.
+    """
+    meta = read_cache_meta(workspace)
+    if not cache_is_current(workspace,meta):
+        return None
+    fmt = get_cache_format(meta.get('format'))
+    target = fmt.target(workspace.cache_dir,iconfig.FCACHE_NAME)
     try:
-        frame = pd.read_pickle(target,None)
+        frame = fmt.load(target,before,after)
     except FileNotFoundError:
         frame = None
+    if frame is not None:
+        frame = index_by_date(compact(frame))
     return frame
+
+@profiled()
+def load_rollup(workspace):
+    """Load the rollup cube saved with the cached frame.
+    See rollup.Rollup. Returns None if there is no cube,
+    or if it is stale, as in load_from_cache.
+    """
+    meta = read_cache_meta(workspace)
+    if not cache_is_current(workspace,meta):
+        return None
+    fmt = get_cache_format(meta.get('format'))
+    target = fmt.target(workspace.cache_dir,iconfig.ROLLUP_NAME)
+    try:
+        daily = fmt.load(target)
+    except FileNotFoundError:
+        return None
+    if daily is None:
+        return None
+    return Rollup(daily)
+
+def get_store(workspace):
+    "The transaction store in the cache directory of workspace. See store."
+    return TransactionStore(path.join(workspace.cache_dir,
+                                      iconfig.STORE_NAME))
+
+@profiled()
+def save_to_store(workspace,frame):
+    """Syncs the transaction store with frame, as returned
+    by parse_from_data. Only new, re-categorized and
+    removed rows are written. Returns the number of rows
+    inserted, updated and deleted.
+    """
+    store = get_store(workspace)
+    changes = store.sync(frame)
+    store.set_meta(get_config_digests(workspace))
+    if iconfig.DEBUG:
+        print("Store: {} inserted, {} updated, {} deleted".format(*changes))
+    return changes
+
+def append_to_store(workspace,frame):
+    """Inserts the rows of frame into the transaction
+    store of workspace, if there is a current one, so
+    that it keeps up with the frame cache. Identical
+    rows on the same day are told apart by their order,
+    see store.store_keys, so frame must hold every row
+    on the days it covers, not only the new ones.
+    Returns the number of rows inserted, updated and
+    deleted.
+    """
+    store = get_store(workspace)
+    if (not store.exists()
+        or not cache_is_current(workspace,store.get_meta())):
+        return 0,0,0
+    return store.upsert(frame)
+
+def load_store(workspace):
+    """A store.StoreRollup over every transaction in the
+    store, which computes totals over a date window in
+    SQL. Returns None if there is no store, or if it is
+    stale, as in load_from_cache.
+    """
+    store = get_store(workspace)
+    if not store.exists():
+        return None
+    if not cache_is_current(workspace,store.get_meta()):
+        return None
+    return store.window()
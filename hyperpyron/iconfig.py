@@ -12,7 +12,34 @@ APP_AUTHOR="Yurlungur"
 CACHE_DIR = "cache"
 CONF_DIR = "conf"
 PARSECONF_DIR = "parse"
-FCACHE_NAME = "frame.pickle"
+REPORTS_DIR = "reports"
+FCACHE_NAME = "frame"
+CACHE_FORMAT = "auto"
+FCACHE_META_NAME = "frame.json"
+ROLLUP_NAME = "rollup"
+STORE_NAME = "transactions.sqlite"
+FILECACHE_DIR = "files"
+MANIFEST_NAME = "manifest.json"
+DEDUPE_INDEX_NAME = "duplicates.npz"
+SCHEMA_VERSION = 3
+EXECUTOR = "thread"
+JOBS = 1
+BUDGET_PERIOD = "month"
+SOCKET_NAME = "server.sock"
+TOKEN_NAME = "server.token"
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 48151
+SERVER_POLL = 2.0
+WATCH_POLL = 2.0
+WATCH_SETTLE = 0.5
+WATCH_SAVE = 10.0
+PERIODS = ["month","week","year"]
 PERCENT_FILENAME="percent-expenditures"
 CASHFLOW_FILENAME="net-cashflow"
 BUDGET_FILENAME="budget"
+TRENDS_FILENAME="spending-trends"
+ROLLING_FILENAME="rolling-cashflow"
+CUMULATIVE_FILENAME="cumulative-cashflow"
+DELTAS_FILENAME="spending-changes"
+PROFILE_FILENAME="hyperpyron-profile.json"
+TRACKING_FILENAME="budget-tracking.csv"
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/matching.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import re
+import numpy as np
+import pandas as pd
+
+# hyperpyron
+from .categories import CATEGORIES,get_categories
+from .sysdirs import get_workspace
+from .configs import derived
+
+def trie_pattern(words):
+    """Builds a regular expression matching any of words.
+
+    The words are merged into a prefix tree first, so
+    the resulting expression never has to backtrack over
+    a shared prefix. This keeps matching fast as the
+    number of keywords grows.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char,{})
+        node[''] = {}
+    return _trie_to_regex(trie)
+
+def _trie_to_regex(node):
+    "Recursively converts a prefix tree to a regex"
+    if '' in node and len(node) == 1:
+        return ''
+    optional = '' in node
+    branches = [re.escape(char)+_trie_to_regex(child)
+                for char,child in sorted(node.items())
+                if char != '']
+    if len(branches) == 1 and not optional:
+        return branches[0]
+    out = '(?:'+'|'.join(branches)+')'
+    if optional:
+        out += '?'
+    return out
+
+class CategoryMatcher:
+    """
+    Assigns categories to transactions based on the
+    keywords in the categories file.
+
+    The matcher is built once from the output of
+    categories.get_categories(). Each category's
+    keywords are compiled into a single regular
+    expression. Descriptions are lowercased once and
+    each distinct description is only matched once.
+
+    As before, if a description matches keywords
+    from several categories, the last category in
+    iteration order wins.
+
+    Initiate with
+    m = CategoryMatcher(get_categories())
+    or use the shared matcher, get_matcher().
+    """
+    def __init__(self,categories,order=None):
+        if order is None:
+            order = list(CATEGORIES)
+        self.rules = []
+        for c in order:
+            keywords = set(str(d) for d in categories.get(c,[]))
+            if not keywords:
+                continue
+            if '' in keywords:
+                # the empty keyword matches everything
+                pattern = ''
+            else:
+                pattern = trie_pattern(keywords)
+            self.rules.append((c,re.compile(pattern)))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self,descriptions):
+        """Returns a series aligned with descriptions
+        containing the matched category for each row,
+        or NaN if no keyword matched.
+        """
+        lowered = descriptions.str.lower()
+        codes,uniques = pd.factorize(lowered)
+        uniques = pd.Series(uniques,dtype=object)
+        matched = np.full(len(uniques),None,dtype=object)
+        for c,pattern in self.rules:
+            mask = uniques.str.contains(pattern,regex=True,
+                                        na=False).values
+            matched[mask] = c
+        out = np.full(len(codes),None,dtype=object)
+        found = codes >= 0
+        out[found] = matched[codes[found]]
+        return pd.Series(out,index=descriptions.index,
+                         name="Category")
+
+def get_matcher(workspace=None):
+    """The CategoryMatcher for workspace's categories file,
+    by default the one HYPERPYRON_HOME points to. It is
+    built once, and again only when the file changes.
+    """
+    if workspace is None:
+        workspace = get_workspace()
+    return derived(workspace.categories_file,'matcher',
+                   lambda: CategoryMatcher(get_categories(workspace)))
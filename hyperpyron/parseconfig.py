@@ -6,16 +6,25 @@ Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
 """
 
 # python
-import yaml
 import os
-from abc import ABC,abstractmethod
 from os import path
 
 # hyperpyron
 from . import iconfig
-from .sysdirs import cache_dir,conf_dir,parse_conf_dir
-from .utils import invert_dict
-from .categories import CATEGORIES,COLUMNS,get_categories
+from .configs import read_config,derived,freeze
+from .profiling import profiled
+
+def read_rules(fname):
+    """Reads the rules in fname. Transactions are labeled
+    by the rules file they came from, unless the rules
+    say otherwise.
+    """
+    rules = read_config(fname)
+    if isinstance(rules,dict):
+        account = path.splitext(path.basename(fname))[0]
+        rules = dict(rules)
+        rules.setdefault('account',account)
+    return freeze(rules)
 
 class DataRulesParser:
     """
@@ -23,6 +32,9 @@ class DataRulesParser:
     from various classes. The parser caches
     information, so the data can be recalled.
 
+    Each file is only read again once it changes,
+    and the rules are read-only. See configs.
+
     Initiate with
     p = DataRulesParser(parse_conf_dir)
     """
@@ -30,14 +42,16 @@ class DataRulesParser:
         self.parsed_rules = {}
         self.parse_directory(parse_conf_dir)
 
+    @profiled('DataRulesParser.parse_one_file')
     def parse_one_file(self,fname):
-        with open(fname,'r') as f:
-            self.parsed_rules[fname] = yaml.load(f.read())
+        self.parsed_rules[fname] = derived(fname,'rules',
+                                           lambda: read_rules(fname))
         return self.parsed_rules[fname]
 
     def parse_directory(self,d):
         for root, dirs, files in os.walk(d):
-            for name in files:
+            dirs.sort()
+            for name in sorted(files):
                 fpath = path.join(root,name)
                 if iconfig.DEBUG:
                     print("parsing ",fpath)
@@ -7,6 +7,7 @@ Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
 
 # python
 import os
+import re
 import numpy as np
 import pandas as pd
 from abc import ABC,abstractmethod
@@ -14,79 +15,342 @@ from os import path
 
 # hyperpyron
 from . import iconfig
-from .sysdirs import cache_dir,conf_dir,parse_conf_dir
-from .utils import invert_dict
+from ._version import __version__
+from .utils import invert_dict,data_digest
+from .dedupe import OccurrenceCounts
+from .filecache import file_entry
 from .categories import CATEGORIES,COLUMNS,get_categories
+from .matching import get_matcher
+from .configs import FrozenDict,freeze
+from .executors import SerialExecutor
+from .profiling import profiler
+
+CURRENCY_SYMBOLS = "$\u20ac\u00a3\u00a5"
+_AMOUNT_JUNK = r"[\s,()"+re.escape(CURRENCY_SYMBOLS)+"]"
+
+def parse_amounts(column):
+    """Converts a column of amounts to floats.
+
+    Text may contain currency symbols, thousands separators,
+    and a minus sign or parentheses marking negative amounts,
+    e.g., '$1,234.50', '-$3.00', '$-3.00' or '($3.00)'.
+    Blank entries become NaN, as does anything that still
+    isn't a number once cleaned up.
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype(float)
+    try:
+        return column.astype(float)
+    except (TypeError,ValueError):
+        pass
+    text = column.astype(str)
+    try:
+        # the common case of a currency symbol in front
+        # of each amount, e.g., '$3.00' or '$-3.00',
+        # without the slower clean up below
+        return text.str.lstrip(CURRENCY_SYMBOLS).astype(float)
+    except ValueError:
+        pass
+    text = text.str.strip()
+    negative = (text.str.startswith('(')
+                & text.str.endswith(')')).values
+    text = text.str.replace(_AMOUNT_JUNK,'',regex=True)
+    text = text.mask(column.isnull() | (text == ''),'nan')
+    try:
+        values = text.astype(float)
+    except ValueError:
+        values = pd.to_numeric(text,errors='coerce').astype(float)
+    return values.mask(negative,-values)
+
+def find_files(directory):
+    "List the files in directory and below, in a stable order"
+    out = []
+    for root,dirs,files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            out.append(path.join(root,name))
+    return out
+
+def remap_categories(column,mapping):
+    """Translates the values of column through mapping,
+    returning a pandas Categorical. Mappings are applied
+    in order, so with {'A':'B','B':'C'} both A and B
+    become C. Each distinct value is only translated
+    once, however long the column.
+    """
+    codes,uniques = pd.factorize(column)
+    translated = []
+    for value in uniques:
+        for k,v in mapping.items():
+            if value == k:
+                value = v
+        translated.append(value)
+    categories = pd.Index(translated).unique()
+    new_codes = np.append(categories.get_indexer(translated),-1)
+    return pd.Categorical.from_codes(new_codes[codes],categories)
 
 class DataParser(ABC):
     """
     This is the base class for parsing and importing data.
+    Transactions are categorized with the categories file
+    of workspace, by default the one HYPERPYRON_HOME
+    points to.
     """
-    def __init__(self,data_rules):
-        self.categories = get_categories()
-        data_rules = self.validate_rules(data_rules)
+    def __init__(self,data_rules,file_cache=None,executor=None,
+                 chunksize=None,deduper=None,lazy=False,
+                 workspace=None):
+        self.categories = get_categories(workspace)
+        self.matcher = get_matcher(workspace)
+        if isinstance(data_rules,FrozenDict):
+            # rules from DataRulesParser are only
+            # checked once per version of their file
+            prepared = data_rules.memoize(
+                type(self),lambda: self.prepare_rules(data_rules))
+        else:
+            prepared = self.prepare_rules(data_rules)
+        self.rules,self.digest,self.column_map = prepared
+        data_rules = self.rules
         self.file_names = []
-        self.rules = data_rules
-        self.frame = self.import_all()
+        self.file_cache = file_cache
+        if executor is None:
+            executor = SerialExecutor()
+        self.executor = executor
+        self.chunksize = chunksize
+        if not data_rules['cross-file duplicates']:
+            deduper = None
+        self.deduper = deduper
+        if chunksize is None and not lazy:
+            self.frame = self.import_all()
+        else:
+            # read lazily with self.stream() or self.import_files()
+            self.frame = None
+
+    def prepare_rules(self,data_rules):
+        """Validates a copy of data_rules and fills in
+        defaults. Returns the rules, frozen, their digest
+        and the map from column names in files to standard
+        column names.
+        """
+        data_rules = self.validate_rules(dict(data_rules))
+        if 'account' not in data_rules.keys():
+            # Rules read by parseconfig.read_rules are named
+            # after their file. Otherwise use the directory.
+            directory = data_rules.get('directory')
+            if directory:
+                data_rules['account'] = path.basename(
+                    path.normpath(directory))
+            else:
+                data_rules['account'] = 'default'
+        if 'cross-file duplicates' not in data_rules.keys():
+            data_rules['cross-file duplicates'] = False
+        if type(data_rules['cross-file duplicates']) is not bool:
+            raise TypeError("'cross-file duplicates'"
+                            " must be a Boolean.")
+        if 'duplicate tolerance' not in data_rules.keys():
+            data_rules['duplicate tolerance'] = 0
+        if type(data_rules['duplicate tolerance']) is not int:
+            raise TypeError("Duplicate tolerance must be"
+                            " an integer number of days")
+        if data_rules['duplicate tolerance'] < 0:
+            raise TypeError("Duplicate tolerance must be positive")
+        digest = data_digest([__version__,
+                              iconfig.SCHEMA_VERSION,
+                              type(self).__name__,
+                              data_rules])
+        column_map = invert_dict(data_rules.get('columns',{}))
+        return freeze(data_rules),digest,freeze(column_map)
+
+    def __getstate__(self):
+        "Caches and executors stay in the parent process"
+        state = self.__dict__.copy()
+        state['file_cache'] = None
+        state['executor'] = None
+        state['deduper'] = None
+        state['frame'] = None
+        return state
 
     def import_all(self):
+        self.file_names = self.find_files()
+        return self.import_files(self.file_names)
+
+    def import_files(self,fpaths):
+        """Runs every stage of the import on the files in
+        fpaths and returns the resulting frame, sorted by
+        date, or None if there are no files.
+        """
         rules = self.rules
-        frames = []
-        for root,dirs,files in os.walk(rules['directory']):
-            for name in files:
-                fpath = path.join(root,name)
-                self.file_names.append(fpath)
-                if iconfig.DEBUG:
-                    print("Reading in: ",name)
-                frames.append(self.import_one(fpath))
+        frames = self.read_all(fpaths)
         if not frames:
             return None
         frame = pd.concat(frames)
         if 'duplicate checking' in rules.keys():
             if rules['duplicate checking']:
-                frame = self.remove_duplicates(frame)
-        frame = self.standardize_columns(frame)
-        frame = self.standardize_categories(frame)
-        frame = self.categorize_missing(frame)
-        frame = self.drop_rows(frame)
-        frame["Date"] = pd.to_datetime(frame.Date)
+                frame = self.run_stage('remove_duplicates',frame)
+        frame = self.normalize(frame)
         frame.sort_values("Date",
                           inplace=True)
         return frame
 
+    def stream(self):
+        """Reads every file in chunks of self.chunksize rows,
+        yielding each chunk once it has been through every
+        stage of import_all except the final sort. Only one
+        chunk is held in memory at a time, plus the set of
+        hashes seen so far when duplicate checking. With
+        cross-file duplicates, rows already ingested from
+        another file are dropped by the deduper, as in
+        read_all.
+        """
+        rules = self.rules
+        seen = set()
+        self.file_names = self.find_files()
+        for fpath in self.file_names:
+            if iconfig.DEBUG:
+                print("Streaming in: ",path.basename(fpath))
+            counts = OccurrenceCounts()
+            for chunk in self.iter_chunks(fpath,self.chunksize):
+                chunk = self.run_stage('standardize_columns',chunk)
+                chunk = self.run_stage('drop_missing_amounts',chunk)
+                if self.deduper is not None:
+                    chunk = self.deduper.drop_duplicates(
+                        fpath,chunk,rules['duplicate tolerance'],counts)
+                if rules.get('duplicate checking'):
+                    chunk = self.run_stage('remove_duplicates',chunk,seen)
+                chunk = self.normalize(chunk)
+                if len(chunk) > 0:
+                    yield chunk
+
+    def normalize(self,frame):
+        """Runs the stages that depend on the categories
+        file rather than the data file itself.
+        """
+        frame = self.run_stage('standardize_categories',frame)
+        frame = self.run_stage('categorize_missing',frame)
+        frame["Date"] = pd.to_datetime(frame.Date)
+        frame["Account"] = self.rules['account']
+        frame = self.run_stage('drop_rows',frame)
+        return frame
+
+    def find_files(self):
+        "List the files in the rules directory, in a stable order"
+        return find_files(self.rules['directory'])
+
+    def read_all(self,fpaths):
+        """Read in every file in fpaths and return their
+        frames in the same order. Files in the file cache
+        are not re-read. The rest are parsed by the
+        executor, possibly in parallel.
+
+        With cross-file duplicates, rows of newly parsed
+        files that were already ingested from another file
+        are dropped before caching. See dedupe.DuplicateIndex.
+        """
+        deduper = self.deduper
+        frames = [None]*len(fpaths)
+        if self.file_cache is not None:
+            for i,fpath in enumerate(fpaths):
+                if deduper is None or fpath in deduper:
+                    frames[i] = self.file_cache.get(fpath,self.digest)
+        missing = [i for i,frame in enumerate(frames) if frame is None]
+        todo = [fpaths[i] for i in missing]
+        if self.file_cache is None:
+            parsed = ((None,frame) for frame
+                      in self.executor.map(self.parse_one,todo))
+        else:
+            parsed = self.executor.map(self.read_one,todo)
+        for i,(entry,frame) in zip(missing,parsed):
+            if deduper is not None:
+                frame = deduper.drop_duplicates(
+                    fpaths[i],frame,
+                    self.rules['duplicate tolerance'])
+            frames[i] = frame
+            if self.file_cache is not None:
+                self.file_cache.put(fpaths[i],frame,self.digest,entry)
+        return frames
+
+    def read_one(self,fpath):
+        """Parse one file, see parse_one, for the file cache.
+        Returns the file's filecache.file_entry, taken before
+        it is parsed, and the frame.
+        """
+        entry = file_entry(fpath)
+        return entry,self.parse_one(fpath)
+
+    def parse_one(self,fpath):
+        "Import one file and standardize its columns"
+        if iconfig.DEBUG:
+            print("Reading in: ",path.basename(fpath))
+        frame = self.run_stage('import_one',fpath)
+        frame = self.run_stage('standardize_columns',frame)
+        return self.run_stage('drop_missing_amounts',frame)
+
+    def run_stage(self,stage,*args):
+        """Calls the method named stage with args, recording
+        it as a stage of this parser when profiling. See
+        profiling.Profiler.
+        """
+        return profiler.call(type(self).__name__+'.'+stage,
+                             getattr(self,stage),*args)
+
     def get_frame(self):
         return self.frame
 
+    def drop_missing_amounts(self,frame):
+        """Drop rows without an amount. parse_amounts
+        leaves blank or unreadable amounts as NaN.
+        """
+        missing = frame["Amount"].isnull()
+        if missing.any():
+            if iconfig.DEBUG:
+                print("Dropping",missing.sum(),
+                      "rows without an amount")
+            frame = frame.loc[~missing]
+        return frame
+
     def drop_rows(self,frame):
         "Ignore a row if the categories file tells us to"
-        out = frame.copy()
-        for c in self.categories['Ignore']:
-            out = out[out.Category != c]
-        return out
+        row_mask = frame.Category.isin(list(self.categories['Ignore']))
+        if row_mask.any():
+            frame = frame.loc[~row_mask]
+        return frame
 
     def categorize_missing(self,frame):
         """The categories file tells us how to
         categorize some transactions based on
         their description. We utilize that here.
+
+        Afterwards, Category is a Categorical over
+        CATEGORIES. Anything else becomes "Other".
+        Modifies frame in place and returns it.
         """
-        out = frame.copy()
-        for c in CATEGORIES:
-            for d in self.categories[c]:
-                row_mask = out["Description"].apply(
-                    lambda x: d in x.lower())
-                out.loc[row_mask,"Category"] = c
-        row_mask = out["Category"].apply(
-            lambda x: x not in CATEGORIES)
-        out.loc[row_mask,"Category"] = "Other"
-        return out
+        categories = pd.Index(sorted(CATEGORIES))
+        current = pd.Categorical(frame["Category"])
+        codes = np.append(categories.get_indexer(current.categories),-1)
+        codes = codes[current.codes]
+        codes[codes < 0] = categories.get_loc("Other")
+        matched = pd.Categorical(self.matcher.match(frame["Description"]),
+                                 categories=categories).codes
+        codes = np.where(matched >= 0,matched,codes)
+        frame["Category"] = pd.Categorical.from_codes(codes,categories)
+        return frame
 
     @abstractmethod
     def import_one(self,fpath):
         "Import one file and return it"
 
+    def iter_chunks(self,fpath,chunksize):
+        """Import one file in chunks of about chunksize rows.
+        Parsers that can't read incrementally yield the
+        whole file at once.
+        """
+        yield self.import_one(fpath)
+
     @abstractmethod
-    def remove_duplicates(self,frame):
-        "Remove duplicates from frame if possible"
+    def remove_duplicates(self,frame,seen=None):
+        """Remove duplicates from frame if possible.
+        If seen is a set of previously seen hashes, also
+        remove rows in it, then add the new hashes to it.
+        """
 
     @abstractmethod
     def standardize_columns(self,frame):
@@ -112,13 +376,23 @@ class CSVParser(DataParser):
             raise TypeError("Must skip integer number of lines")
         if data_rules['skip lines'] < 0:
             raise TypeError("Must skip positive number of lines")
-        if set(data_rules['columns'].keys()) != set(COLUMNS):
+        columns = set(COLUMNS)
+        if ('debit column' in data_rules.keys()
+            or 'credit column' in data_rules.keys()):
+            if not ('debit column' in data_rules.keys()
+                    and 'credit column' in data_rules.keys()):
+                raise ValueError("Debit and credit columns"
+                                 +" must be used together.")
+            columns.remove('Amount')
+        if set(data_rules['columns'].keys()) != columns:
             raise ValueError("The columns must be exactly:\n"
                              +"\tDate\n"
                              +"\tDescription\n"
                              +"\tAmount\n"
                              +"\tCategory\n"
-                             +"in any order.")
+                             +"in any order."
+                             +" Leave out Amount if you use"
+                             +" debit and credit columns.")
         if 'duplicate checking' not in data_rules.keys():
             data_rules['duplicate checking'] = False
         if data_rules['duplicate checking']:
@@ -133,45 +407,68 @@ class CSVParser(DataParser):
                                 " must be a Boolean.")
         return data_rules
 
-    def import_one(self,fpath):
+    def extra_columns(self):
+        "Columns read from file besides the standard ones"
+        rules = self.rules
+        extra = []
+        if rules['duplicate checking']:
+            extra.append(rules['hash column'])
+        if 'debit column' in rules.keys():
+            extra += [rules['debit column'],rules['credit column']]
+        return extra
+
+    def usecols(self):
+        "The columns to read from each file"
         rules = self.rules
         if rules['use column names']:
             usecols = list(rules['columns'].values())
-            if rules['duplicate checking']:
-                usecols.append(rules['hash column'])
+            usecols += self.extra_columns()
         else:
-            usecols = sorted(rules['columns'].values())
-            if rules['duplicate checking']:
-                usecols = sorted(usecols
-                                 + [rules['hash column']])
-        df = pd.read_csv(fpath,usecols=usecols)
+            usecols = sorted(list(rules['columns'].values())
+                             + self.extra_columns())
+        return usecols
+
+    def import_one(self,fpath):
+        df = pd.read_csv(fpath,usecols=self.usecols())
         return df
 
+    def iter_chunks(self,fpath,chunksize):
+        return pd.read_csv(fpath,usecols=self.usecols(),
+                           chunksize=chunksize)
+
     def standardize_columns(self,frame):
         rules = self.rules
-        name_map = invert_dict(rules['columns'])
+        name_map = self.column_map
         if rules['use column names']:
             out = frame.rename(columns = name_map)
         else:
             name_map = dict((frame.columns[k],v)\
                             for k,v in name_map.items())
             out = frame.rename(columns = name_map)
-        if not np.any(out["Amount"].apply(
-                lambda x: type(x) is float)):
-            out["Amount"] = out["Amount"].apply(
-                lambda x: float(x.lstrip("$")))
+        if 'debit column' in rules.keys():
+            if rules['use column names']:
+                debit = rules['debit column']
+                credit = rules['credit column']
+            else:
+                debit = frame.columns[rules['debit column']]
+                credit = frame.columns[rules['credit column']]
+            debits = parse_amounts(out[debit]).fillna(0).abs()
+            credits = parse_amounts(out[credit]).fillna(0).abs()
+            out["Amount"] = credits - debits
+            del out[debit]
+            del out[credit]
+        else:
+            out["Amount"] = parse_amounts(out["Amount"])
         if rules['expenditures positive']:
-            out["Amount"] = out["Amount"].apply(
-                lambda x: x*-1)
+            out["Amount"] = -out["Amount"]
         return out
 
     def standardize_categories(self,frame):
-        out = frame.copy()
-        for k,v in self.rules['categories'].items():
-            out.loc[out.Category==k,"Category"]=v
-        return out
+        frame["Category"] = remap_categories(frame["Category"],
+                                             self.rules['categories'])
+        return frame
 
-    def remove_duplicates(self,frame):
+    def remove_duplicates(self,frame,seen=None):
         rules = self.rules
         if rules['use column names']:
             c = rules['hash column']
@@ -179,7 +476,380 @@ class CSVParser(DataParser):
             c = frame.columns[rules['hash column']]
         out = frame.drop_duplicates(subset=c,
                                     keep='first')
+        if seen is not None:
+            out = out.loc[~out[c].isin(seen)]
+            seen.update(out[c])
         del out[rules['hash column']]
         return out
 
-parsers = {'csv':CSVParser,'CSV':CSVParser}
+def read_records(fpath,terminator,encoding='utf-8',blocksize=None):
+    """Reads the text file at fpath in blocks of about
+    blocksize characters, or all at once if blocksize is
+    None. Each block is cut just after the last
+    terminator in it, so no record is split between
+    blocks. terminator is matched case-insensitively.
+    """
+    with open(fpath,'r',encoding=encoding,errors='replace') as f:
+        if blocksize is None:
+            yield f.read()
+            return
+        tail = ''
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            text = tail + block
+            cut = text.upper().rfind(terminator.upper())
+            if cut < 0:
+                tail = text
+                continue
+            cut += len(terminator)
+            yield text[:cut]
+            tail = text[cut:]
+        if tail:
+            yield tail
+
+def extract_fields(records,fields):
+    """Pulls fields out of records, a list of strings
+    holding one record each. fields maps column names to
+    regular expressions with one group matching the value.
+    Each field is extracted from every record at once with
+    pandas string methods, so no object is built per
+    record. Returns a frame with one column per field,
+    NaN where a record lacks the field.
+    """
+    records = pd.Series(records,dtype=object)
+    out = {}
+    for name,pattern in fields.items():
+        out[name] = records.str.extract(pattern,expand=False).str.strip()
+    return pd.DataFrame(out,columns=list(fields.keys()))
+
+class RecordParser(DataParser):
+    """The base class for formats whose fields are fixed
+    by the format, rather than named in the rules, such as
+    OFX and QIF. Subclasses set FIELDS, mapping the standard
+    columns, and optionally 'Memo' and 'Hash', to the names
+    of the fields holding them in import_one's output.
+
+    Rules may contain:
+    categories               How to translate the file's categories
+    expenditures positive    Whether expenditures are positive
+    encoding                 The text encoding of the files
+    duplicate checking       Whether to drop repeated 'Hash' fields
+    """
+    TYPES = []
+    FIELDS = {}
+    # characters of text per record, to size blocks
+    RECORD_SIZE = 256
+
+    def validate_rules(self,data_rules):
+        if data_rules['type'].lower() not in self.TYPES:
+            raise ValueError("{} only works for {} files".format(
+                type(self).__name__,"/".join(self.TYPES).upper()))
+        defaults = {'categories' : {},
+                    'expenditures positive' : False,
+                    'encoding' : 'utf-8',
+                    'duplicate checking' : False}
+        for k,v in defaults.items():
+            if k not in data_rules.keys():
+                data_rules[k] = v
+        if type(data_rules['expenditures positive']) is not bool:
+            raise TypeError("'expenditures positive'"
+                            " must be a Boolean.")
+        if data_rules['duplicate checking'] and 'Hash' not in self.FIELDS:
+            raise ValueError("{} files have no field to check"
+                             " for duplicates.".format(
+                                 "/".join(self.TYPES).upper()))
+        return data_rules
+
+    def import_one(self,fpath):
+        frames = list(self.iter_chunks(fpath,None))
+        return pd.concat(frames,ignore_index=True)
+
+    def iter_chunks(self,fpath,chunksize):
+        if chunksize is None:
+            blocksize = None
+        else:
+            blocksize = chunksize*self.RECORD_SIZE
+        for text in read_records(fpath,self.TERMINATOR,
+                                 self.rules['encoding'],
+                                 blocksize):
+            yield self.parse_text(text)
+
+    @abstractmethod
+    def parse_text(self,text):
+        """Parses text holding whole records into a frame
+        with a column for each field in FIELDS.
+        """
+
+    @abstractmethod
+    def parse_dates(self,column):
+        "Converts a column of dates as written in the file"
+
+    def standardize_columns(self,frame):
+        fields = self.FIELDS
+        out = pd.DataFrame({
+            'Date' : self.parse_dates(frame[fields['Date']]),
+            'Description' : frame[fields['Description']],
+            'Amount' : parse_amounts(frame[fields['Amount']]),
+            'Category' : (frame[fields['Category']]
+                          if 'Category' in fields
+                          else pd.Series(np.nan,index=frame.index,
+                                         dtype=object))})
+        if 'Memo' in fields:
+            out['Description'] = out['Description'].fillna(
+                frame[fields['Memo']])
+        if self.rules['duplicate checking']:
+            out['Hash'] = frame[fields['Hash']]
+        if self.rules['expenditures positive']:
+            out["Amount"] = -out["Amount"]
+        # text outside any record, e.g., headers
+        out = out.loc[out['Date'].notnull()]
+        return out.reset_index(drop=True)
+
+    def standardize_categories(self,frame):
+        frame["Category"] = remap_categories(frame["Category"],
+                                             self.rules['categories'])
+        return frame
+
+    def remove_duplicates(self,frame,seen=None):
+        out = frame.drop_duplicates(subset='Hash',keep='first')
+        if seen is not None:
+            out = out.loc[~out['Hash'].isin(seen)]
+            seen.update(out['Hash'])
+        return out.drop(columns='Hash')
+
+class OFXParser(RecordParser):
+    """The data parser for OFX and QFX files, the
+    SGML based versions 1.x as well as the XML based
+    versions 2.x. Only bank and credit card transactions,
+    STMTTRN records, are read. Description is the NAME
+    of each transaction, or its MEMO if it has none.
+    FITID, the bank's transaction ID, is used for
+    duplicate checking. OFX has no categories, so
+    transactions are categorized by description.
+    """
+    TYPES = ['ofx','qfx']
+    TERMINATOR = '</STMTTRN>'
+    FIELDS = {'Date' : 'DTPOSTED',
+              'Description' : 'NAME',
+              'Memo' : 'MEMO',
+              'Amount' : 'TRNAMT',
+              'Hash' : 'FITID'}
+
+    def parse_text(self,text):
+        records = re.findall(r'(?is)<STMTTRN>(.*?)</STMTTRN>',text)
+        # SGML leaves elements unclosed,
+        # so a value ends at a newline or tag.
+        return extract_fields(records,
+                              {tag : r'(?i)<'+tag+r'>([^<\r\n]*)'
+                               for tag in set(self.FIELDS.values())})
+
+    def parse_dates(self,column):
+        # YYYYMMDD, then an optional time and time zone
+        return pd.to_datetime(column.str[:8],format='%Y%m%d',
+                              errors='coerce')
+
+class QIFParser(RecordParser):
+    """The data parser for QIF files. Description is the
+    payee, P, of each transaction, or its memo, M, if it
+    has none. The category is L, including any
+    subcategory, e.g., 'Food:Groceries'. Transfers,
+    '[Account]', keep their brackets. Splits are ignored,
+    in favor of the total amount, T.
+
+    Dates are read as month/day/year, where a two digit
+    year is in the 1900s, unless it follows a quote, as in
+    1/31'20, in which case it is in the 2000s. Spaces may
+    pad the month and day. Set 'date format' in the rules
+    to a strftime format to read dates some other way.
+    """
+    TYPES = ['qif']
+    TERMINATOR = '\n^'
+    FIELDS = {'Date' : 'D',
+              'Description' : 'P',
+              'Memo' : 'M',
+              'Amount' : 'T',
+              'Category' : 'L'}
+
+    def validate_rules(self,data_rules):
+        data_rules = super().validate_rules(data_rules)
+        if 'date format' not in data_rules.keys():
+            data_rules['date format'] = None
+        return data_rules
+
+    def parse_text(self,text):
+        # Each line is a one letter code followed by a
+        # value, and ^ ends each record. Lines are numbered
+        # by the record they belong to, then the first line
+        # with each code in each record is kept.
+        lines = pd.Series(text.splitlines(),dtype=object)
+        codes = lines.str[:1]
+        record = (codes == '^').cumsum().values
+        nrecords = record[-1]+1 if len(record) else 0
+        out = {}
+        for code in set(self.FIELDS.values()):
+            mask = (codes == code).values
+            values = pd.Series(lines.values[mask]).str[1:].str.strip()
+            values.index = record[mask]
+            values = values[~values.index.duplicated()]
+            out[code] = values.reindex(np.arange(nrecords))
+        return pd.DataFrame(out)
+
+    def parse_dates(self,column):
+        if self.rules['date format'] is not None:
+            return pd.to_datetime(column,
+                                  format=self.rules['date format'],
+                                  errors='coerce')
+        try:
+            # the usual case, parsed without a regex
+            return pd.to_datetime(column,format='%m/%d/%Y')
+        except (TypeError,ValueError):
+            pass
+        parts = column.str.extract(
+            r"^\s*(\d{1,2})/\s*(\d{1,2})\s*(['/])\s*(\d{2,4})\s*$")
+        year = pd.to_numeric(parts[3],errors='coerce')
+        short = year < 100
+        year = year.mask(short & (parts[2] == "'"),year+2000)
+        year = year.mask(short & (parts[2] == '/'),year+1900)
+        return pd.to_datetime(pd.DataFrame({
+            'year' : year,
+            'month' : pd.to_numeric(parts[0],errors='coerce'),
+            'day' : pd.to_numeric(parts[1],errors='coerce')}),
+                              errors='coerce')
+
+class JSONLinesParser(DataParser):
+    """The data parser for JSON Lines files, one JSON
+    object per transaction. As for CSV files, 'columns'
+    maps Date, Description and Amount, and optionally
+    Category, to the keys holding them. Objects are parsed
+    straight into columns by pandas.
+
+    Rules may also contain 'categories', 'expenditures
+    positive' and 'duplicate checking' with a 'hash
+    column', as for CSV files.
+    """
+    TYPES = ['jsonl','json lines','ndjson']
+
+    def validate_rules(self,data_rules):
+        if data_rules['type'].lower() not in self.TYPES:
+            raise ValueError("JSONLinesParser only works"
+                             " for JSON Lines files")
+        columns = set(data_rules['columns'].keys())
+        if not (set(COLUMNS)-{'Category'} <= columns <= set(COLUMNS)):
+            raise ValueError("The columns must be:\n"
+                             +"\tDate\n"
+                             +"\tDescription\n"
+                             +"\tAmount\n"
+                             +"and optionally\n"
+                             +"\tCategory\n"
+                             +"in any order.")
+        defaults = {'categories' : {},
+                    'expenditures positive' : False,
+                    'duplicate checking' : False}
+        for k,v in defaults.items():
+            if k not in data_rules.keys():
+                data_rules[k] = v
+        if data_rules['duplicate checking']:
+            if 'hash column' not in data_rules.keys():
+                raise ValueError("If you use duplicate checking,"
+                                 +" you must include a"
+                                 +" hash column.")
+        if type(data_rules['expenditures positive']) is not bool:
+            raise TypeError("'expenditures positive'"
+                            " must be a Boolean.")
+        return data_rules
+
+    def import_one(self,fpath):
+        return pd.read_json(fpath,lines=True,dtype=False,
+                            convert_dates=False)
+
+    def iter_chunks(self,fpath,chunksize):
+        with pd.read_json(fpath,lines=True,dtype=False,
+                          convert_dates=False,
+                          chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
+
+    def standardize_columns(self,frame):
+        rules = self.rules
+        keys = list(rules['columns'].values())
+        if rules['duplicate checking']:
+            keys.append(rules['hash column'])
+        # objects missing a key don't produce its column
+        out = frame.reindex(columns=keys)
+        out = out.rename(columns=self.column_map)
+        if 'Category' not in out.columns:
+            out['Category'] = np.nan
+        out["Amount"] = parse_amounts(out["Amount"])
+        if rules['expenditures positive']:
+            out["Amount"] = -out["Amount"]
+        return out
+
+    def standardize_categories(self,frame):
+        frame["Category"] = remap_categories(frame["Category"],
+                                             self.rules['categories'])
+        return frame
+
+    def remove_duplicates(self,frame,seen=None):
+        c = self.rules['hash column']
+        out = frame.drop_duplicates(subset=c,keep='first')
+        if seen is not None:
+            out = out.loc[~out[c].isin(seen)]
+            seen.update(out[c])
+        return out.drop(columns=c)
+
+# The built in parsers, by data type. Other packages can
+# add parsers by declaring an entry point in the
+# PARSER_ENTRY_POINTS group, named after the data type,
+# pointing to a DataParser subclass. For example, in setup.py,
+#   entry_points={'hyperpyron.parsers' :
+#                 ['xlsx = mypackage.parsers:ExcelParser']}
+PARSER_ENTRY_POINTS = 'hyperpyron.parsers'
+parsers = {'csv':CSVParser,
+           'ofx':OFXParser,
+           'qfx':OFXParser,
+           'qif':QIFParser,
+           'jsonl':JSONLinesParser,
+           'json lines':JSONLinesParser,
+           'ndjson':JSONLinesParser}
+_entry_points_loaded = False
+
+def register_parser(data_type,parser_class):
+    """Makes parser_class, a DataParser subclass,
+    read data rules of type data_type
+    """
+    if not (isinstance(parser_class,type)
+            and issubclass(parser_class,DataParser)):
+        raise TypeError("Parsers must subclass DataParser")
+    parsers[data_type.lower()] = parser_class
+
+def load_entry_points():
+    """Registers the parsers declared by installed
+    packages. Built in parsers are not replaced.
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    from importlib import metadata
+    try:
+        found = metadata.entry_points(group=PARSER_ENTRY_POINTS)
+    except TypeError:
+        # python < 3.10
+        found = metadata.entry_points().get(PARSER_ENTRY_POINTS,[])
+    for entry_point in found:
+        if entry_point.name.lower() in parsers:
+            continue
+        register_parser(entry_point.name,entry_point.load())
+
+def get_data_parser(data_type):
+    "Returns the parser class for data rules of type data_type"
+    key = data_type.lower()
+    if key not in parsers:
+        load_entry_points()
+    if key not in parsers:
+        raise ValueError("No parser for data of type '{}'."
+                         " Known types are: {}".format(
+                             data_type,", ".join(sorted(parsers))))
+    return parsers[key]
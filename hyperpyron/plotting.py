@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/plotting.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# hyperpyron
+from . import iconfig
+from .profiling import profiled
+
+# matplotlib is slow to import, so it is
+# only imported once something is plotted.
+RC_PARAMS = {'font.size': 16}
+
+def new_figure(show=True):
+    """Returns a new figure and its axes.
+
+    Figures that will be shown are made by pyplot, so
+    the GUI backend can display them. The rest are plain
+    Figures rendered with Agg when saved. These never
+    touch pyplot's global state, so any number of them
+    can be drawn at once, in threads or processes.
+    """
+    import matplotlib as mpl
+    from matplotlib.figure import Figure
+    mpl.rcParams.update(RC_PARAMS)
+    if show:
+        from matplotlib import pyplot as plt
+        fig = plt.figure()
+    else:
+        fig = Figure()
+    return fig,fig.add_subplot(111)
+
+@profiled()
+def finish_figure(fig,savepath=None,show=True):
+    "Saves and shows fig, then releases it"
+    fig.tight_layout()
+    if savepath:
+        fig.savefig(savepath,bbox_inches='tight')
+        if iconfig.DEBUG:
+            print("saved file ",savepath)
+    if show:
+        from matplotlib import pyplot as plt
+        plt.show()
+        plt.close(fig)
+
+def label_empty(ax,message):
+    """Writes message in the middle of ax, for plots
+    with nothing to draw, e.g., a window without
+    expenditures
+    """
+    ax.text(0.5,0.5,message,ha='center',va='center',
+            transform=ax.transAxes)
+    ax.set_xticks([])
+    ax.set_yticks([])
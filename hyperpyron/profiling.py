@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/profiling.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import os
+import json
+import time
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+class Stage:
+    """One timed run of a pipeline stage. rows_in and
+    rows_out are the lengths of the frames it was given
+    and returned, or None. peak is the most memory traced
+    while it ran, above what was in use when it started,
+    or None if a stage in another thread overlapped it.
+    """
+    __slots__ = ['name','start','wall','rows_in','rows_out',
+                 'peak','depth','thread','base','high','overlapped']
+
+    def __init__(self,name,rows_in=None,depth=0):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.depth = depth
+        self.thread = threading.get_ident()
+        self.start = 0.0
+        self.wall = 0.0
+        self.peak = None
+        self.base = 0
+        self.high = 0
+        self.overlapped = False
+
+def nrows(obj):
+    "The number of rows in obj if it is a frame, and None otherwise"
+    if hasattr(obj,'shape') and hasattr(obj,'columns'):
+        return len(obj)
+    return None
+
+class Profiler:
+    """
+    Records the wall time, rows in and out, and peak
+    memory of each pipeline stage while enabled. Peak
+    memory is measured with tracemalloc, which slows
+    everything down, so it can be turned off.
+
+    Stages may nest, and may run in threads. But
+    tracemalloc keeps one peak for the whole process,
+    so a peak can only be attributed to a stage while
+    no other thread is running one. Stages that overlap
+    a stage in another thread get no peak. Profile
+    serially to measure memory, as the CLI does. Stages
+    run by process pools happen in other interpreters,
+    and are not recorded. When disabled, a stage costs
+    one attribute lookup.
+
+    Use the module level profiler:
+    profiler.enable()
+    with profiler.stage('name',len(frame)) as s:
+        out = f(frame)
+        s.rows_out = len(out)
+    profiler.save('trace.json')
+    """
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.stages = []
+        self.origin = 0.0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.tracing = False
+        self.open = {}
+
+    def enable(self,memory=True):
+        "Forgets recorded stages and starts recording"
+        self.stages = []
+        self.open = {}
+        self.origin = time.perf_counter()
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        self.enabled = True
+
+    def disable(self):
+        "Stops recording. Recorded stages are kept."
+        self.enabled = False
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    @contextmanager
+    def stage(self,name,rows_in=None):
+        """Records the code run in the with block as
+        stage name. Set rows_out on the stage yielded.
+        """
+        if not self.enabled:
+            yield Stage(name,rows_in)
+            return
+        stack = self.local.__dict__.setdefault('stack',[])
+        s = Stage(name,rows_in,len(stack))
+        with self.lock:
+            self.open[s] = s.thread
+            if len(set(self.open.values())) > 1:
+                for other in self.open:
+                    other.overlapped = True
+        if self.memory:
+            current,peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].high = max(stack[-1].high,peak)
+            tracemalloc.reset_peak()
+            s.base = current
+        stack.append(s)
+        s.start = time.perf_counter()
+        try:
+            yield s
+        finally:
+            s.wall = time.perf_counter() - s.start
+            stack.pop()
+            if self.memory:
+                s.high = max(s.high,tracemalloc.get_traced_memory()[1])
+                if not s.overlapped:
+                    s.peak = s.high - s.base
+                if stack:
+                    stack[-1].high = max(stack[-1].high,s.high)
+            with self.lock:
+                del self.open[s]
+                self.stages.append(s)
+
+    def call(self,name,f,*args,**kwargs):
+        """Calls f with args as stage name. Rows in are
+        counted from the first argument, and rows out from
+        the result.
+        """
+        if not self.enabled:
+            return f(*args,**kwargs)
+        with self.stage(name,nrows(args[0]) if args else None) as s:
+            out = f(*args,**kwargs)
+            s.rows_out = nrows(out)
+        return out
+
+    def summary(self):
+        """Totals for each stage name, slowest first, as
+        a list of dicts. Time is in seconds and memory
+        in bytes.
+        """
+        totals = {}
+        for s in self.stages:
+            t = totals.setdefault(s.name,{'stage' : s.name,
+                                          'calls' : 0,
+                                          'wall' : 0.0,
+                                          'rows_in' : None,
+                                          'rows_out' : None,
+                                          'peak' : None})
+            t['calls'] += 1
+            t['wall'] += s.wall
+            for k in ['rows_in','rows_out']:
+                if getattr(s,k) is not None:
+                    t[k] = (t[k] or 0) + getattr(s,k)
+            if s.peak is not None:
+                t['peak'] = max(t['peak'] or 0,s.peak)
+        return sorted(totals.values(),key=lambda t: -t['wall'])
+
+    def trace(self):
+        """The recorded stages in the Trace Event Format,
+        which chrome://tracing and Perfetto can display,
+        along with the summary.
+        """
+        pid = os.getpid()
+        events = []
+        for s in sorted(self.stages,key=lambda s: s.start):
+            events.append({'name' : s.name,
+                           'ph' : 'X',
+                           'ts' : 1e6*(s.start-self.origin),
+                           'dur' : 1e6*s.wall,
+                           'pid' : pid,
+                           'tid' : s.thread,
+                           'args' : {'rows_in' : s.rows_in,
+                                     'rows_out' : s.rows_out,
+                                     'peak_bytes' : s.peak,
+                                     'depth' : s.depth}})
+        return {'traceEvents' : events,
+                'displayTimeUnit' : 'ms',
+                'summary' : self.summary()}
+
+    def save(self,fpath):
+        "Writes the trace to fpath as JSON"
+        with open(fpath,'w') as f:
+            json.dump(self.trace(),f,indent=1)
+
+    def report(self):
+        "Prints the summary as a table"
+        print("{:>40} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+            "stage","calls","wall (s)","rows in","rows out","peak (MB)"))
+        blank = lambda v,fmt: '-' if v is None else fmt.format(v)
+        for t in self.summary():
+            print("{:>40} {:>6} {:>10.4f} {:>10} {:>10} {:>10}".format(
+                t['stage'],t['calls'],t['wall'],
+                blank(t['rows_in'],'{}'),
+                blank(t['rows_out'],'{}'),
+                blank(t['peak'] and t['peak']/2**20,'{:.1f}')))
+
+profiler = Profiler()
+
+def profiled(name=None):
+    """Decorator recording each call of a function as a
+    stage, by default named module.function.
+    """
+    def decorate(f):
+        stage = name
+        if stage is None:
+            stage = f.__module__.split('.')[-1] + '.' + f.__name__
+        @functools.wraps(f)
+        def wrapper(*args,**kwargs):
+            return profiler.call(stage,f,*args,**kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/reports.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+from os import path
+import pandas as pd
+
+# hyperpyron
+from . import iconfig
+from . import analysis
+from .utils import make_sure_path_exists
+from .schema import compact
+from .rollup import Rollup
+from .budget import get_budget,PANDAS_PERIODS
+from .executors import get_executor
+from .profiling import profiled
+
+REPORT_PLOTS = ['percentages','cashflow','budget']
+
+def report_windows(start,end,period='month'):
+    """Splits the dates from start to end into periods,
+    'week', 'month' or 'year'. Returns a list of
+    (label, before, after) for each period, where label
+    names the period and before and after are its first
+    and last days, clipped to start and end.
+    """
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end).normalize()
+    out = []
+    for p in pd.period_range(start,end,freq=PANDAS_PERIODS[period]):
+        if period == 'week':
+            label = p.start_time.strftime('%Y-%m-%d')
+        else:
+            label = str(p)
+        out.append((label,
+                    max(p.start_time,start),
+                    min(p.end_time.normalize(),end)))
+    return out
+
+# The data each worker renders from. See init_worker.
+_state = {}
+
+def init_worker(rollup,budget,plots,cutoff,suffix):
+    """Stores what every window is rendered from, once per
+    worker, so that tasks only carry their dates.
+    """
+    _state.update(rollup=rollup,budget=budget,plots=plots,
+                  cutoff=cutoff,suffix=suffix)
+
+def render_window(task):
+    """Renders the report plots for one window into
+    savedir/label. Returns the paths written. Windows
+    without transactions are skipped.
+    """
+    label,before,after,savedir = task
+    data = _state['rollup'].window(before,after)
+    if len(data.days()) == 0:
+        return []
+    directory = path.join(savedir,label)
+    make_sure_path_exists(directory)
+    suffix,cutoff = _state['suffix'],_state['cutoff']
+    written = []
+    def target(name):
+        written.append(path.join(directory,name+suffix))
+        return written[-1]
+    if 'percentages' in _state['plots']:
+        analysis.plot_percent_expenditures(
+            data,target(iconfig.PERCENT_FILENAME),False,cutoff)
+    if 'cashflow' in _state['plots']:
+        analysis.plot_net_cashflow(
+            data,target(iconfig.CASHFLOW_FILENAME),False,cutoff)
+    if 'budget' in _state['plots']:
+        analysis.compare_cashflow_to_budget(
+            data,_state['budget'],target(iconfig.BUDGET_FILENAME),False)
+    return written
+
+@profiled()
+def batch_report(data,savedir,period='month',
+                 before=None,after=None,
+                 plots=REPORT_PLOTS,
+                 cutoff=0.0,
+                 suffix='.png',
+                 jobs=None,
+                 executor='process',
+                 budget=None):
+    """Renders plots for every period, 'week', 'month' or
+    'year', between before and after, which default to the
+    first and last transactions in data. Each period's plots
+    are saved in a directory named after it in savedir.
+    plots lists which of REPORT_PLOTS to make. The budget
+    plot compares against budget, by default the budget
+    for one period. See budget.get_budget.
+
+    data may be a transaction frame or a rollup.Rollup.
+    Frames are rolled up first, so each window costs time
+    proportional to its buckets. Windows are rendered
+    headless with the Agg backend, jobs at a time, by
+    the given executor. See executors.get_executor.
+
+    Returns the paths of the files written.
+    """
+    if not isinstance(data,Rollup):
+        data = Rollup.from_frame(compact(data))
+    dates = data.days()['Date']
+    if len(dates) == 0:
+        return []
+    if before is None:
+        before = dates.iloc[0]
+    if after is None:
+        after = dates.iloc[-1]
+    if 'budget' in plots and budget is None:
+        budget = get_budget(period)
+    tasks = [(label,b,a,savedir)
+             for label,b,a in report_windows(before,after,period)]
+    with get_executor(executor,jobs,
+                      initializer=init_worker,
+                      initargs=(data.window(),budget,list(plots),
+                                cutoff,suffix)) as pool:
+        written = list(pool.map(render_window,tasks))
+    return [f for files in written for f in files]
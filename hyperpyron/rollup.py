@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/rollup.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import numpy as np
+import pandas as pd
+
+# hyperpyron
+from .schema import category_dtype,date_slice,index_by_date
+
+# The columns of a rollup cube. Each row is one
+# day (or month), category and account:
+#   Date      the first day of the bucket
+#   Category  Categorical over CATEGORIES
+#   Account   Categorical
+#   Income    int64 cents, sum of positive amounts
+#   Expenses  int64 cents, sum of negative amounts
+#   Count     int64, number of transactions
+ROLLUP_KEYS = ['Date','Category','Account']
+ROLLUP_VALUES = ['Income','Expenses','Count']
+ROLLUP_COLUMNS = ROLLUP_KEYS + ROLLUP_VALUES
+
+def bucket(frame,freq='D'):
+    """Rolls a compact transaction frame, or another
+    cube, up into buckets of freq, 'D' or 'M', by
+    category and account. Returns a cube sorted and
+    indexed by date, see schema.index_by_date.
+    """
+    if 'Amount' in frame.columns:
+        amounts = frame['Amount'].values
+        parts = pd.DataFrame({
+            'Date' : pd.to_datetime(frame['Date']).values,
+            'Category' : frame['Category'].values,
+            'Account' : frame['Account'].values,
+            'Income' : np.where(amounts > 0,amounts,0),
+            'Expenses' : np.where(amounts < 0,amounts,0),
+            'Count' : np.ones(len(amounts),dtype=np.int64)})
+    else:
+        parts = frame.reset_index(drop=True)
+    dates = pd.DatetimeIndex(parts['Date'])
+    if freq == 'M':
+        parts['Date'] = dates.to_period('M').to_timestamp()
+    else:
+        parts['Date'] = dates.normalize()
+    parts['Category'] = parts['Category'].astype(category_dtype())
+    parts['Account'] = parts['Account'].astype('category')
+    out = parts.groupby(ROLLUP_KEYS,observed=True,
+                        sort=True)[ROLLUP_VALUES].sum()
+    out = out.reset_index().astype({v : np.int64
+                                    for v in ROLLUP_VALUES})
+    return index_by_date(out)
+
+def between(cube,start,stop):
+    "The buckets of cube from start up to, but excluding, stop"
+    index = cube.index
+    return cube.iloc[index.searchsorted(start,'left'):
+                     index.searchsorted(stop,'left')]
+
+def splice(cube,start,stop,middle):
+    """Replaces the buckets of cube from start up to,
+    but excluding, stop with middle. The buckets on
+    either side are kept as they are, apart from their
+    Account categories, which are made to match.
+    """
+    index = cube.index
+    parts = [cube.iloc[:index.searchsorted(start,'left')],
+             middle,
+             cube.iloc[index.searchsorted(stop,'left'):]]
+    accounts = set()
+    for part in parts:
+        accounts.update(part['Account'].cat.categories)
+    dtype = pd.CategoricalDtype(sorted(accounts))
+    parts = [part if part['Account'].dtype == dtype
+             else part.astype({'Account' : dtype}) for part in parts]
+    return index_by_date(pd.concat(parts))
+
+class Rollup:
+    """
+    A precomputed cube of transaction totals by day,
+    category and account, along with the same totals
+    by month. Totals over a date window are read from
+    the cube, so they cost time proportional to the
+    number of buckets in the window rather than the
+    number of transactions. Whole months in the window
+    are read from the monthly cube and only the days
+    at either end from the daily cube.
+
+    The cube is built once when data is ingested and
+    saved next to the frame cache. New transactions
+    can be added with add, without revisiting old ones.
+
+    Initiate with
+    r = Rollup.from_frame(frame)
+    and select a date window with
+    r.window(before,after)
+    """
+    def __init__(self,daily,monthly=None,before=None,after=None):
+        self.daily = index_by_date(daily)
+        if monthly is None:
+            monthly = bucket(self.daily,'M')
+        self.monthly = monthly
+        self.before = before
+        self.after = after
+
+    @classmethod
+    def from_frame(cls,frame):
+        "Builds the cube from a compact transaction frame"
+        return cls(bucket(frame))
+
+    @classmethod
+    def empty(cls):
+        "A cube with no transactions in it"
+        daily = pd.DataFrame({c : pd.Series([],dtype=np.int64)
+                              for c in ROLLUP_COLUMNS})
+        daily['Date'] = pd.to_datetime(daily['Date'])
+        daily['Category'] = daily['Category'].astype(category_dtype())
+        daily['Account'] = daily['Account'].astype('category')
+        return cls(daily)
+
+    def add(self,frame):
+        """Adds the transactions in the compact frame
+        to the cube. Only the new rows are rolled up.
+        They are merged with the existing daily buckets
+        between their first and last dates, and only the
+        months those dates fall in are rolled up again.
+        Buckets outside that range are not regrouped.
+        """
+        new = bucket(frame)
+        if len(new) == 0:
+            return self
+        if len(self.daily) == 0:
+            self.daily = new
+            self.monthly = bucket(new,'M')
+            return self
+        first = new.index[0]
+        stop = new.index[-1] + pd.Timedelta(days=1)
+        touched = between(self.daily,first,stop)
+        self.daily = splice(self.daily,first,stop,
+                            bucket(pd.concat([touched,new])))
+        first = first.to_period('M').to_timestamp()
+        stop = (stop - pd.Timedelta(days=1)).to_period('M')
+        stop = (stop + 1).to_timestamp()
+        self.monthly = splice(self.monthly,first,stop,
+                              bucket(between(self.daily,first,stop),'M'))
+        return self
+
+    def window(self,before=None,after=None):
+        """Returns the same cube restricted to dates
+        between before and after, inclusive. Nothing
+        is copied.
+        """
+        return Rollup(self.daily,self.monthly,before,after)
+
+    def days(self):
+        "The daily buckets in the window"
+        return date_slice(self.daily,self.before,self.after)
+
+    def buckets(self):
+        """The buckets covering the window, whole months
+        from the monthly cube and the rest from the daily
+        cube. Found by binary search.
+        """
+        before,after = self.before,self.after
+        if before is None and after is None:
+            return self.monthly
+        if before is None or after is None:
+            return date_slice(self.daily,before,after)
+        before,after = pd.Timestamp(before),pd.Timestamp(after)
+        first = before.to_period('M').to_timestamp()
+        if first < before:
+            first = (before.to_period('M')+1).to_timestamp()
+        stop = (after.normalize()
+                + pd.Timedelta(days=1)).to_period('M').to_timestamp()
+        if first >= stop:
+            return date_slice(self.daily,before,after)
+        return pd.concat([between(self.daily,before,first),
+                          between(self.monthly,first,stop),
+                          date_slice(self.daily,stop,after)])
+
+    def totals(self,by='Category'):
+        """Sums Income, Expenses and Count over the
+        window, grouped by by, which may be 'Category',
+        'Account' or both. Adds a Net column.
+        """
+        out = self.buckets().groupby(by,observed=True)[ROLLUP_VALUES].sum()
+        out['Net'] = out['Income'] + out['Expenses']
+        return out
+
+    def sums(self):
+        "Net amount in each category, in cents"
+        out = self.totals()['Net']
+        out.name = None
+        return out
+
+    def expenses(self):
+        """Expenditures in each category, as positive
+        cents. Categories with no expenditures are left out.
+        """
+        out = -self.totals()['Expenses']
+        out.name = None
+        return out.loc[out > 0]
+
+    def __len__(self):
+        return len(self.daily)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/schema.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import numpy as np
+import pandas as pd
+
+# hyperpyron
+from .categories import CATEGORIES
+
+# The columns of the normalized transaction frame
+# and how each one is stored:
+#   Date         datetime64
+#   Description  Categorical, one entry per distinct description
+#   Amount       int64 cents
+#   Category     Categorical over CATEGORIES
+#   Account      Categorical, one entry per rule set
+SCHEMA_COLUMNS = ['Date','Description','Amount','Category','Account']
+CENTS_PER_DOLLAR = 100
+
+def to_cents(dollars):
+    """Converts an array of dollar amounts to int64 cents.
+    Raises ValueError if any amount is missing, rather
+    than counting it as zero. Parsers drop rows without
+    an amount before this point.
+    """
+    dollars = np.asarray(dollars,dtype=float)
+    missing = np.isnan(dollars)
+    if missing.any():
+        raise ValueError("{} amounts are missing and can't be"
+                         " converted to cents.".format(missing.sum()))
+    return np.round(dollars*CENTS_PER_DOLLAR).astype(np.int64)
+
+def to_dollars(cents):
+    "Converts cents back to dollars"
+    return cents/CENTS_PER_DOLLAR
+
+def category_dtype():
+    "The dtype of the Category column"
+    return pd.CategoricalDtype(sorted(CATEGORIES))
+
+def is_compact(frame):
+    "Whether frame already follows the compact schema"
+    dtypes = frame.dtypes
+    return (list(frame.columns) == SCHEMA_COLUMNS
+            and dtypes['Amount'] == np.int64
+            and isinstance(dtypes['Description'],pd.CategoricalDtype)
+            and isinstance(dtypes['Account'],pd.CategoricalDtype)
+            and dtypes['Category'] == category_dtype())
+
+def compact(frame):
+    """Converts a normalized transaction frame to the
+    compact schema above, dropping any other columns.
+    Amounts are rounded to the nearest cent. Missing
+    amounts raise ValueError, see to_cents. Frames that
+    are already compact are returned unchanged.
+    """
+    if is_compact(frame):
+        return frame
+    out = pd.DataFrame({
+        'Date' : pd.to_datetime(frame['Date']),
+        'Description' : frame['Description'].astype('category'),
+        'Amount' : frame['Amount'],
+        'Category' : frame['Category'].astype(category_dtype()),
+        'Account' : frame['Account'].astype('category')},
+                       index=frame.index)
+    if out['Amount'].dtype != np.int64:
+        out['Amount'] = to_cents(out['Amount'])
+    return out
+
+def index_by_date(frame):
+    """Returns frame sorted by date, with a DatetimeIndex
+    holding the same dates as the Date column. The sort
+    is stable, so rows on the same day keep their order.
+    Frames that already have a sorted DatetimeIndex are
+    returned unchanged.
+    """
+    index = frame.index
+    if (isinstance(index,pd.DatetimeIndex)
+        and index.is_monotonic_increasing):
+        return frame
+    if not frame['Date'].is_monotonic_increasing:
+        frame = frame.sort_values('Date',kind='mergesort')
+    frame = frame.set_axis(pd.DatetimeIndex(frame['Date'].values),
+                           axis=0)
+    return frame
+
+def insert_sorted(frame,rows):
+    """Inserts rows into frame, which is compact and
+    indexed by date, see index_by_date. Where each row
+    goes is found by binary search, so frame is not
+    sorted again. New rows go after the rows already
+    there on the same day, as with index_by_date of the
+    two concatenated.
+    """
+    rows = index_by_date(compact(rows))
+    if len(frame) == 0:
+        return rows
+    for column in ['Description','Account']:
+        old,new = frame[column].cat,rows[column].cat
+        if not old.categories.equals(new.categories):
+            # existing codes stay valid when categories
+            # are only added at the end
+            categories = old.categories.append(
+                new.categories.difference(old.categories))
+            frame = frame.assign(**{column :
+                                    old.set_categories(categories)})
+            rows = rows.assign(**{column :
+                                  new.set_categories(categories)})
+    at = frame.index.searchsorted(rows.index,'right')
+    at += np.arange(len(rows))
+    is_new = np.zeros(len(frame)+len(rows),dtype=bool)
+    is_new[at] = True
+    order = np.empty(len(is_new),dtype=np.intp)
+    order[~is_new] = np.arange(len(frame))
+    order[is_new] = len(frame) + np.arange(len(rows))
+    return pd.concat([frame,rows]).iloc[order]
+
+def date_slice(frame,before=None,after=None):
+    """Selects the rows of frame between before and after,
+    inclusive. Either may be None. If frame has a sorted
+    DatetimeIndex, see index_by_date, the window is found
+    by binary search and returned as a slice of frame
+    without copying. Otherwise every date is compared.
+    """
+    if before is None and after is None:
+        return frame
+    index = frame.index
+    if (isinstance(index,pd.DatetimeIndex)
+        and index.is_monotonic_increasing):
+        start,stop = 0,len(index)
+        if before is not None:
+            start = index.searchsorted(pd.Timestamp(before),'left')
+        if after is not None:
+            stop = index.searchsorted(pd.Timestamp(after),'right')
+        return frame.iloc[start:stop]
+    mask = np.ones(len(frame),dtype=bool)
+    if before is not None:
+        mask &= (frame['Date'] >= pd.Timestamp(before)).values
+    if after is not None:
+        mask &= (frame['Date'] <= pd.Timestamp(after)).values
+    return frame.loc[mask]
+
+def expand(frame):
+    """Converts a compact frame back to plain strings
+    and float dollars, as it was stored before the
+    compact schema.
+    """
+    return pd.DataFrame({
+        'Date' : frame['Date'],
+        'Description' : frame['Description'].astype(object),
+        'Amount' : to_dollars(frame['Amount']),
+        'Category' : frame['Category'].astype(object),
+        'Account' : frame['Account'].astype(object)},
+                        index=frame.index)
+
+def memory_report(frame):
+    """Returns the memory used by each column of frame,
+    in bytes, both compact and expanded to plain strings
+    and floats, along with the totals.
+    """
+    frame = compact(frame)
+    compact_usage = frame.memory_usage(index=False,deep=True)
+    expanded_usage = expand(frame).memory_usage(index=False,deep=True)
+    report = pd.DataFrame({'compact' : compact_usage,
+                           'expanded' : expanded_usage})
+    report.loc['Total'] = report.sum()
+    report['ratio'] = report['expanded']/report['compact']
+    return report
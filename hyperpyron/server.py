@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/server.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+# The client side only needs the standard library,
+# so that --remote starts quickly. The server imports
+# the rest when it loads data.
+import os
+import io
+import sys
+import hmac
+import json
+import socket
+import secrets
+import socketserver
+import signal
+import threading
+import traceback
+from os import path
+from contextlib import redirect_stdout,redirect_stderr
+
+# hyperpyron
+from . import iconfig
+
+def server_address(workspace):
+    """Where the server for workspace listens. A Unix socket
+    in its cache directory where available, or a port on
+    localhost.
+    """
+    if hasattr(socket,'AF_UNIX'):
+        return path.join(workspace.cache_dir,iconfig.SOCKET_NAME)
+    return (iconfig.SERVER_HOST,iconfig.SERVER_PORT)
+
+def token_path(workspace):
+    """Where the server for workspace keeps the token that
+    requests must carry
+    """
+    return path.join(workspace.cache_dir,iconfig.TOKEN_NAME)
+
+def write_token(workspace):
+    """Creates a new random token for the server of
+    workspace and returns it. Only the owner of the cache
+    directory can read it, so only they can send requests,
+    whether the server listens on a Unix socket or a port.
+    """
+    fpath = token_path(workspace)
+    os.makedirs(workspace.cache_dir,exist_ok=True)
+    if path.exists(fpath):
+        os.remove(fpath)
+    token = secrets.token_hex(32)
+    fd = os.open(fpath,os.O_WRONLY | os.O_CREAT | os.O_EXCL,0o600)
+    with os.fdopen(fd,'w') as f:
+        f.write(token)
+    return token
+
+def read_token(workspace):
+    """The token of the server for workspace, or None if
+    there is none or it can't be read
+    """
+    try:
+        with open(token_path(workspace),'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def connect(address):
+    "Opens a connection to the server at address"
+    if isinstance(address,str):
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+class WarmState:
+    """
+    Holds everything a request needs in memory: the
+    normalized frame of workspace, its rollup cube and
+    the budgets.
+    The parse rules, categories and budget files and the
+    data directories are watched for changes, and new
+    data files are added as they land. See watch.LiveData.
+
+    Requests and updates hold a lock, so they run
+    one at a time.
+
+    Initiate with
+    s = WarmState(workspace,jobs,executor)
+    """
+    def __init__(self,workspace,jobs=None,executor=None):
+        self.workspace = workspace
+        self.jobs = jobs
+        self.executor = executor
+        self.lock = threading.RLock()
+        self.data = None
+        self.budgets = {}
+
+    @property
+    def frame(self):
+        return self.data.frame
+
+    @property
+    def rollup(self):
+        return self.data.rollup
+
+    def refresh(self,force=False,rebuild=False):
+        """Loads the data the first time, and reloads it if
+        force or rebuild is True. Returns whether it loaded.
+        """
+        from .watch import LiveData
+        with self.lock:
+            if self.data is None:
+                self.data = LiveData(self.workspace,self.jobs,
+                                     self.executor)
+            elif force or rebuild:
+                self.data.load(rebuild)
+            else:
+                return False
+            self.budgets = {}
+            return True
+
+    def update(self,fpaths):
+        "Applies changes to the files in fpaths"
+        with self.lock:
+            if self.data.update(fpaths):
+                self.budgets = {}
+
+    def save(self):
+        "Saves rows added since the last save. See LiveData.save"
+        with self.lock:
+            if self.data is not None:
+                self.data.save()
+
+    def load(self,args):
+        """Returns the data asked for by the CLI arguments
+        args, reloading first if needed. As in the CLI, the
+        frame is returned for --memory and the rollup cube
+        otherwise.
+        """
+        from . import hyperparse
+        with self.lock:
+            if args.chunksize:
+                nrows = hyperparse.stream_to_cache(self.workspace,
+                                                   args.chunksize)
+                print("Streamed",nrows,"rows from files into cache.")
+            self.refresh(args.reload or bool(args.chunksize),
+                         args.rebuild)
+            if args.memory:
+                return self.frame
+            return self.rollup
+
+    def budget(self,period=None):
+        "The budget for period, loaded once per version of the file"
+        from .budget import get_budget
+        with self.lock:
+            if period not in self.budgets:
+                self.budgets[period] = get_budget(period,self.workspace)
+            return self.budgets[period]
+
+    def run(self,argv,cwd=None):
+        """Runs the CLI with arguments argv against the warm
+        state. Plots are saved, not shown. Relative paths are
+        taken relative to cwd. Returns the exit status and
+        everything printed.
+        """
+        from .__main__ import get_parser,run
+        out = io.StringIO()
+        status = os.EX_OK
+        with self.lock, redirect_stdout(out), redirect_stderr(out):
+            try:
+                args = get_parser().parse_args(argv)
+                if (args.serve or args.watch or args.remote
+                    or args.init or args.store):
+                    print("--serve, --watch, --remote, --init and --store"
+                          " can't be run by the server.")
+                    status = os.EX_USAGE
+                else:
+                    args.hide = True
+                    if args.savedir and cwd:
+                        args.savedir = path.join(cwd,args.savedir)
+                    if args.profile and cwd:
+                        args.profile = path.join(cwd,args.profile)
+                    run(args,self)
+            except SystemExit as e:
+                if e.code is None:
+                    status = os.EX_OK
+                elif isinstance(e.code,int):
+                    status = e.code
+                else:
+                    print(e.code)
+                    status = 1
+            except Exception:
+                traceback.print_exc()
+                status = 1
+        return status,out.getvalue()
+
+    def watch(self,interval=None):
+        """Applies changes as they happen, forever. Where
+        inotify is not available, checks for them every
+        interval seconds.
+        """
+        from .watch import get_watcher
+        if interval is None:
+            interval = iconfig.SERVER_POLL
+        watcher = get_watcher(self.data.watched(),interval)
+        while True:
+            changed = watcher.wait(self.data.save_timeout())
+            try:
+                if changed:
+                    self.update(changed)
+                else:
+                    self.save()
+            except Exception:
+                traceback.print_exc()
+            if watcher.paths != self.data.watched():
+                watcher.close()
+                watcher = get_watcher(self.data.watched(),interval)
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Reads one request, a line of JSON holding the CLI
+    arguments, working directory and server token, and
+    replies with a line of JSON holding the exit status
+    and output. Requests without the token are refused.
+    """
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+        token = str(request.get('token') or '')
+        if not hmac.compare_digest(token.encode('utf-8'),
+                                   self.server.token.encode('utf-8')):
+            status,output = os.EX_NOPERM,"Invalid server token.\n"
+        else:
+            status,output = self.server.state.run(request['argv'],
+                                                  request.get('cwd'))
+        reply = json.dumps({'status' : status,'output' : output})
+        self.wfile.write((reply+'\n').encode('utf-8'))
+
+def make_server(address):
+    "Binds a server to address, a socket path or (host, port)"
+    if isinstance(address,str):
+        if path.exists(address):
+            try:
+                connect(address).close()
+            except OSError:
+                # left behind by a server that died
+                os.remove(address)
+            else:
+                raise RuntimeError("A server is already running at "
+                                   +address)
+        return socketserver.UnixStreamServer(address,RequestHandler)
+    socketserver.TCPServer.allow_reuse_address = True
+    return socketserver.TCPServer(address,RequestHandler)
+
+def serve(workspace,jobs=None,executor=None,address=None):
+    """Loads the data of workspace and answers requests
+    from hyperpyron --remote until interrupted.
+    """
+    if address is None:
+        address = server_address(workspace)
+    state = WarmState(workspace,jobs,executor)
+    state.refresh()
+    server = make_server(address)
+    server.state = state
+    server.token = write_token(workspace)
+    if isinstance(address,str):
+        os.chmod(address,0o600)
+    watcher = threading.Thread(target=state.watch,daemon=True)
+    watcher.start()
+    # so that the socket is cleaned up on kill
+    signal.signal(signal.SIGTERM,lambda *args: sys.exit(os.EX_OK))
+    print("Serving on",address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        state.save()
+        if isinstance(address,str) and path.exists(address):
+            os.remove(address)
+        if path.exists(token_path(workspace)):
+            os.remove(token_path(workspace))
+
+def request(argv,address,token=None):
+    """Sends the CLI arguments argv to the server at
+    address, along with its token, see write_token, and
+    prints its output. Returns the exit status.
+    """
+    try:
+        sock = connect(address)
+    except OSError:
+        print("No hyperpyron server is running."
+              " Start one with hyperpyron --serve.")
+        return os.EX_UNAVAILABLE
+    message = json.dumps({'argv' : list(argv),'cwd' : os.getcwd(),
+                          'token' : token})
+    with sock, sock.makefile('rwb') as f:
+        f.write((message+'\n').encode('utf-8'))
+        f.flush()
+        reply = json.loads(f.readline().decode('utf-8'))
+    print(reply['output'],end='')
+    return reply['status']
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/store.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import json
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from os import path
+
+# hyperpyron
+from .schema import compact,index_by_date,category_dtype
+from .rollup import Rollup,ROLLUP_KEYS,ROLLUP_VALUES,bucket
+from .dedupe import transaction_keys,transaction_days
+from .utils import make_sure_path_exists
+
+NS_PER_DAY = 86400*10**9
+
+# Dates are stored as int64 nanoseconds since the epoch,
+# amounts as int64 cents. Categories outside CATEGORIES
+# are NULL. key identifies a transaction independently
+# of its category, so re-categorized rows are updated
+# in place rather than added again. seq numbers rows
+# in the order they were inserted, so rows on the same
+# day are read back in that order. key is a hash, so
+# it can't order them.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    key INTEGER PRIMARY KEY,
+    date INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    category TEXT,
+    account TEXT NOT NULL,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_date
+    ON transactions (date, seq);
+CREATE INDEX IF NOT EXISTS transactions_category
+    ON transactions (category, date);
+CREATE INDEX IF NOT EXISTS transactions_account
+    ON transactions (account, date);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# The day a date falls on, rounding down before the epoch too
+DAY = ("(CASE WHEN date >= 0 THEN date/{0} "
+       "ELSE (date-{0}+1)/{0} END)").format(NS_PER_DAY)
+
+# Columns of the rollup cube, as SQL aggregates
+AGGREGATES = ("SUM(MAX(amount,0)) AS income, "
+              "SUM(MIN(amount,0)) AS expenses, "
+              "COUNT(*) AS count")
+
+UPSERT = """
+INSERT INTO transactions
+SELECT key,date,description,amount,category,account,? + seq
+FROM incoming WHERE true
+ON CONFLICT (key) DO UPDATE SET
+    description = excluded.description,
+    category = excluded.category
+WHERE description IS NOT excluded.description
+   OR category IS NOT excluded.category
+"""
+
+def store_keys(frame):
+    """A signed 64 bit key for each row of a compact
+    frame, hashed from its account, day, amount and
+    normalized description, and from how many identical
+    rows precede it that day. So identical purchases on
+    the same day are kept apart. See dedupe.DuplicateIndex.
+    """
+    keys = transaction_keys(frame)
+    days = transaction_days(frame)
+    account = np.asarray(frame['Account'].astype(object),dtype=object)
+    parts = pd.DataFrame({'account' : account,
+                          'key' : keys,
+                          'day' : days})
+    parts['occurrence'] = parts.groupby(['account','key','day'],
+                                        sort=False).cumcount().values
+    hashes = pd.util.hash_pandas_object(parts,index=False).values
+    return hashes.view(np.int64)
+
+def store_rows(frame):
+    """The rows of a compact frame, as tuples to insert,
+    each ending with its position in frame
+    """
+    frame = compact(frame)
+    dates = pd.to_datetime(frame['Date']).values
+    columns = [store_keys(frame).tolist(),
+               dates.astype('datetime64[ns]').astype(np.int64).tolist(),
+               frame['Description'].astype(str).tolist(),
+               frame['Amount'].values.tolist(),
+               [c if isinstance(c,str) else None
+                for c in frame['Category'].astype(object)],
+               frame['Account'].astype(str).tolist(),
+               range(len(frame))]
+    return zip(*columns)
+
+def to_ns(date):
+    "A date as nanoseconds since the epoch"
+    return pd.Timestamp(date).as_unit('ns').value
+
+def where(before=None,after=None,*clauses):
+    """The WHERE clause and parameters selecting dates
+    between before and after, inclusive, and matching
+    any further clauses. Either date may be None. Uses
+    the index on date.
+    """
+    clauses,params = list(clauses),[]
+    if before is not None:
+        clauses.append("date >= ?")
+        params.append(to_ns(before))
+    if after is not None:
+        clauses.append("date <= ?")
+        params.append(to_ns(after))
+    if not clauses:
+        return "",params
+    return "WHERE " + " AND ".join(clauses),params
+
+class TransactionStore:
+    """
+    An embedded SQLite database of transactions, kept
+    in the cache directory. It holds the same rows as
+    the frame cache, indexed by date, by category and
+    date, and by account and date, so a query over one
+    window reads only that window from disk. Totals are
+    computed by SQLite, so transactions outside the
+    window, or the transactions themselves, are never
+    loaded into memory. See StoreRollup.
+
+    Rows are keyed by a hash of everything but their
+    category, see store_keys, so syncing the store with
+    a freshly parsed frame only inserts new rows, updates
+    re-categorized ones and deletes those no longer in
+    the data.
+
+    Each thread opens its own connection. The store may
+    be pickled, and is reopened in the process that
+    unpickles it.
+
+    Initiate with
+    s = TransactionStore(path.join(cache_dir,iconfig.STORE_NAME))
+    """
+    def __init__(self,fpath):
+        self.fpath = path.abspath(fpath)
+        self.local = threading.local()
+
+    def __getstate__(self):
+        return {'fpath' : self.fpath}
+
+    def __setstate__(self,state):
+        self.__init__(state['fpath'])
+
+    def exists(self):
+        return path.isfile(self.fpath)
+
+    def connect(self):
+        "This thread's connection, opened if needed"
+        conn = getattr(self.local,'conn',None)
+        if conn is None:
+            make_sure_path_exists(path.dirname(self.fpath))
+            conn = sqlite3.connect(self.fpath)
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in
+                       conn.execute("PRAGMA table_info(transactions)")]
+            if columns and 'seq' not in columns:
+                # stores from before seq are rebuilt.
+                # Without meta they are never current.
+                conn.executescript("DROP TABLE transactions;"
+                                   "DROP TABLE IF EXISTS meta;")
+            conn.executescript(SCHEMA)
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        "Closes this thread's connection"
+        conn = getattr(self.local,'conn',None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def query(self,sql,params=()):
+        return self.connect().execute(sql,params).fetchall()
+
+    def __len__(self):
+        return self.query("SELECT COUNT(*) FROM transactions")[0][0]
+
+    def get_meta(self):
+        "What the stored rows were built from. See set_meta."
+        return {name : json.loads(value) for name,value
+                in self.query("SELECT name,value FROM meta")}
+
+    def set_meta(self,meta):
+        "Records meta, a dict of JSON-able values"
+        conn = self.connect()
+        with conn:
+            conn.execute("DELETE FROM meta")
+            conn.executemany("INSERT INTO meta VALUES (?,?)",
+                             [(k,json.dumps(v))
+                              for k,v in sorted(meta.items())])
+
+    def stage(self,conn,frame):
+        "Loads frame into a temporary table, incoming"
+        conn.execute("DROP TABLE IF EXISTS temp.incoming")
+        conn.execute("CREATE TEMP TABLE incoming "
+                     "(key INTEGER PRIMARY KEY,date,description,"
+                     "amount,category,account,seq)")
+        conn.executemany("INSERT OR REPLACE INTO incoming "
+                         "VALUES (?,?,?,?,?,?,?)",store_rows(frame))
+
+    def upsert(self,frame,prune=False):
+        """Inserts the rows of frame, a normalized
+        transaction frame, that are not in the store and
+        updates the category and description of those that
+        are. If prune is True, rows that are not in frame
+        are then deleted. Returns the number of rows
+        inserted, updated and deleted.
+
+        New rows are numbered after every row already in
+        the store, in their order in frame, so they come
+        after the rows already there on the same day.
+        """
+        conn = self.connect()
+        with conn:
+            before = len(self)
+            start = conn.execute("SELECT COALESCE(MAX(seq)+1,0) "
+                                 "FROM transactions").fetchone()[0]
+            self.stage(conn,frame)
+            changes = conn.total_changes
+            conn.execute(UPSERT,(start,))
+            changed = conn.total_changes - changes
+            inserted = len(self) - before
+            deleted = 0
+            if prune:
+                deleted = conn.execute(
+                    "DELETE FROM transactions WHERE key NOT IN "
+                    "(SELECT key FROM incoming)").rowcount
+            conn.execute("DROP TABLE temp.incoming")
+        return inserted,changed-inserted,deleted
+
+    def sync(self,frame):
+        """Makes the store hold exactly the rows of frame.
+        See upsert.
+        """
+        return self.upsert(frame,prune=True)
+
+    def clear(self):
+        "Deletes every transaction"
+        conn = self.connect()
+        with conn:
+            conn.execute("DELETE FROM transactions")
+            conn.execute("DELETE FROM meta")
+
+    def transactions(self,before=None,after=None):
+        """The transactions between before and after,
+        inclusive, as a compact frame indexed by date.
+        Rows on the same day are in the order they were
+        inserted. See schema.compact.
+        """
+        clause,params = where(before,after)
+        rows = self.query("SELECT date,description,amount,category,account "
+                          "FROM transactions {} "
+                          "ORDER BY date,seq".format(clause),params)
+        columns = list(zip(*rows)) or [[]]*5
+        frame = pd.DataFrame({
+            'Date' : pd.to_datetime(np.array(columns[0],dtype=np.int64)),
+            'Description' : pd.Series(columns[1],dtype=object),
+            'Amount' : np.array(columns[2],dtype=np.int64),
+            'Category' : pd.Series(columns[3],dtype=object),
+            'Account' : pd.Series(columns[4],dtype=object)})
+        return index_by_date(compact(frame))
+
+    def window(self,before=None,after=None):
+        "A rollup of the transactions between before and after"
+        return StoreRollup(self,before,after)
+
+def cube(rows,keys):
+    """Builds a frame with keys followed by ROLLUP_VALUES
+    from rows returned by SQL, with the dtypes of a rollup
+    cube.
+    """
+    columns = list(zip(*rows)) or [[]]*(len(keys)+len(ROLLUP_VALUES))
+    out = {}
+    for name,values in zip(keys+ROLLUP_VALUES,columns):
+        if name == 'Date':
+            days = np.array(values,dtype=np.int64)
+            out[name] = pd.to_datetime(days*NS_PER_DAY)
+        elif name == 'Category':
+            out[name] = pd.Series(values,dtype=object).astype(
+                category_dtype())
+        elif name == 'Account':
+            out[name] = pd.Series(values,dtype=object).astype('category')
+        else:
+            out[name] = np.array(values,dtype=np.int64)
+    return pd.DataFrame(out)
+
+class StoreRollup(Rollup):
+    """
+    A Rollup whose buckets are computed by SQLite from
+    a TransactionStore, so it can be used wherever a
+    rollup.Rollup can: analysis, trends, budget tracking
+    and reports. Selecting a window costs nothing. Totals
+    and daily buckets are aggregated over the window only,
+    found with the index on date, so their cost does not
+    depend on how much history lies outside it.
+
+    Initiate with
+    r = store.window(before,after)
+    """
+    def __init__(self,store,before=None,after=None):
+        self.store = store
+        self.before = before
+        self.after = after
+
+    @property
+    def daily(self):
+        "Every daily bucket in the store"
+        return self.store.window().days()
+
+    @property
+    def monthly(self):
+        return bucket(self.daily,'M')
+
+    def add(self,frame):
+        "Adds the transactions in frame to the store"
+        self.store.upsert(frame)
+        return self
+
+    def window(self,before=None,after=None):
+        return StoreRollup(self.store,before,after)
+
+    def days(self):
+        "The daily buckets in the window"
+        clause,params = where(self.before,self.after,
+                              "category IS NOT NULL")
+        rows = self.store.query(
+            "SELECT {day} AS day,category,account,{aggregates} "
+            "FROM transactions {where} "
+            "GROUP BY day,category,account "
+            "ORDER BY day,category,account".format(
+                day=DAY,aggregates=AGGREGATES,where=clause),params)
+        return index_by_date(cube(rows,ROLLUP_KEYS))
+
+    def buckets(self):
+        return self.days()
+
+    def totals(self,by='Category'):
+        """Sums Income, Expenses and Count over the
+        window, grouped by by, as Rollup.totals does,
+        in one SQL aggregate.
+        """
+        keys = [by] if isinstance(by,str) else list(by)
+        if not set(keys) <= {'Category','Account'}:
+            raise ValueError("Can only total by Category or Account.")
+        names = ",".join(k.lower() for k in keys)
+        clause,params = where(self.before,self.after,
+                              "category IS NOT NULL")
+        rows = self.store.query(
+            "SELECT {names},{aggregates} FROM transactions {where} "
+            "GROUP BY {names} ORDER BY {names}".format(
+                names=names,aggregates=AGGREGATES,where=clause),params)
+        out = cube(rows,keys).set_index(by)
+        out['Net'] = out['Income'] + out['Expenses']
+        return out
+
+    def transactions(self):
+        "The transactions in the window, as a compact frame"
+        return self.store.transactions(self.before,self.after)
+
+    def __len__(self):
+        """The number of daily buckets in the store, as
+        for Rollup. Count transactions with len(store).
+        """
+        return self.store.query(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM transactions "
+            "WHERE category IS NOT NULL "
+            "GROUP BY {day},category,account)".format(day=DAY))[0][0]
@@ -12,12 +12,19 @@ from appdirs import AppDirs
 
 # hyperpyron
 from . import iconfig
+from .utils import make_sure_path_exists
 
-def get_sysdirs():
-    hyperpyron_home = os.environ.get('HYPERPYRON_HOME')
-    if hyperpyron_home:
-        if iconfig.DEBUG:
+def get_sysdirs(hyperpyron_home=None):
+    """Returns the cache, config and parse config
+    directories of hyperpyron_home, which defaults to
+    the HYPERPYRON_HOME environment variable. If neither
+    is set, the user's cache and data directories are used.
+    """
+    if hyperpyron_home is None:
+        hyperpyron_home = os.environ.get('HYPERPYRON_HOME')
+        if hyperpyron_home and iconfig.DEBUG:
             print("hyerpyron_home = ",hyperpyron_home)
+    if hyperpyron_home:
         cache_dir =path.join(hyperpyron_home,iconfig.CACHE_DIR)
         conf_dir = path.join(hyperpyron_home,iconfig.CONF_DIR)
     else:
@@ -25,11 +32,68 @@ def get_sysdirs():
         cache_dir = dirs.user_cache_dir
         conf_dir = dirs.user_data_dir
     parse_conf_dir = path.join(conf_dir,iconfig.PARSECONF_DIR)
-    if False:
-        print("Data and home directories:")
-        print("\t",cache_dir)
-        print("\t",conf_dir)
-        print("\t",parse_conf_dir)
     return cache_dir,conf_dir,parse_conf_dir
 
-cache_dir,conf_dir,parse_conf_dir = get_sysdirs()
+class Workspace:
+    """
+    The directories of one hyperpyron home: where its
+    configs live and where its caches go. Everything
+    that reads configs or caches is handed the workspace
+    to use, so several homes can be worked on at once,
+    in threads or processes. The CLI uses the one
+    HYPERPYRON_HOME points to, see get_workspace.
+
+    Initiate with
+    w = Workspace('/path/to/home')
+    """
+    def __init__(self,home=None):
+        self.home = home
+        (self.cache_dir,
+         self.conf_dir,
+         self.parse_conf_dir) = get_sysdirs(home)
+
+    @property
+    def categories_file(self):
+        return path.join(self.conf_dir,"categories.yaml")
+
+    @property
+    def budget_file(self):
+        return path.join(self.conf_dir,"budget.yaml")
+
+    def make_directories(self):
+        "Check directories and make them if necessary"
+        make_sure_path_exists(self.cache_dir)
+        make_sure_path_exists(self.conf_dir)
+        make_sure_path_exists(self.parse_conf_dir)
+
+    def __eq__(self,other):
+        return (isinstance(other,Workspace)
+                and (self.cache_dir,self.conf_dir)
+                == (other.cache_dir,other.conf_dir))
+
+    def __hash__(self):
+        return hash((self.cache_dir,self.conf_dir))
+
+    def __repr__(self):
+        return "Workspace({!r})".format(self.home)
+
+def get_workspace():
+    """The default workspace, the one HYPERPYRON_HOME
+    points to, or the user's directories if it isn't set.
+    This is what the CLI uses. Nothing else falls back
+    on it unless told to.
+    """
+    return Workspace()
+
+def make_directories():
+    "Check the default workspace's directories and make them if necessary"
+    get_workspace().make_directories()
+
+def __getattr__(name):
+    """cache_dir, conf_dir and parse_conf_dir are those of
+    the default workspace. See PEP 562.
+    """
+    if name in ['cache_dir','conf_dir','parse_conf_dir']:
+        return getattr(get_workspace(),name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+        __name__,name))
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/trends.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import numpy as np
+import pandas as pd
+
+# hyperpyron
+from .schema import compact,to_dollars
+from .rollup import Rollup
+from .plotting import new_figure,finish_figure,label_empty
+from .profiling import profiled
+
+# pandas offsets for each period
+PERIODS = {'week' : 'W',
+           'month' : 'MS',
+           'year' : 'YS'}
+ROLLING_WINDOWS = [30,90,365]
+
+def daily_by_category(frame,expenses=False):
+    """Returns a frame with one row per day, from the
+    first transaction in frame to the last, and one column
+    per category, holding the net amount in dollars.
+    Days without transactions hold zero. frame may be a
+    transaction frame or a rollup.Rollup.
+
+    If expenses is True, only expenditures are summed,
+    as positive numbers, and categories with none are
+    left out.
+
+    Every day and category is summed at once with
+    np.bincount, so there is no loop over days.
+    """
+    if isinstance(frame,Rollup):
+        frame = frame.days()
+        if expenses:
+            amounts = -frame['Expenses'].values
+        else:
+            amounts = (frame['Income']+frame['Expenses']).values
+    else:
+        frame = compact(frame)
+        amounts = frame['Amount'].values
+        if expenses:
+            amounts = np.where(amounts < 0,-amounts,0)
+    category = frame['Category']
+    if not isinstance(category.dtype,pd.CategoricalDtype):
+        category = category.astype('category')
+    categories = category.cat.categories
+    codes = category.cat.codes.values
+    dates = pd.DatetimeIndex(frame['Date']).normalize()
+    mask = codes >= 0
+    if not mask.any():
+        return pd.DataFrame(index=pd.DatetimeIndex([],name='Date'),
+                            columns=pd.Index([],name='Category'),
+                            dtype=float)
+    codes,amounts,dates = codes[mask],amounts[mask],dates[mask]
+    first = dates.min()
+    days = pd.date_range(first,dates.max(),freq='D',name='Date')
+    offsets = ((dates - first) // pd.Timedelta(days=1)).to_numpy()
+    ncategories = len(categories)
+    sums = np.bincount(offsets*ncategories + codes,
+                       weights=amounts,
+                       minlength=len(days)*ncategories)
+    sums = sums.reshape(len(days),ncategories)
+    present = np.bincount(codes,minlength=ncategories) > 0
+    if expenses:
+        present &= sums.any(axis=0)
+    out = pd.DataFrame(sums[:,present],index=days,
+                       columns=pd.Index(categories[present],
+                                        name='Category'))
+    return to_dollars(out)
+
+def daily_net(frame):
+    "Net cashflow on each day, in dollars"
+    return daily_by_category(frame).sum(axis=1)
+
+def spending_by_period(frame,period='month'):
+    """Expenditures in each category in each period,
+    'week', 'month' or 'year', as positive dollars.
+    """
+    return daily_by_category(frame,expenses=True).resample(
+        PERIODS[period]).sum()
+
+def net_by_period(frame,period='month'):
+    """Net cashflow in each category in each period,
+    'week', 'month' or 'year', in dollars.
+    """
+    return daily_by_category(frame).resample(PERIODS[period]).sum()
+
+def rolling_cashflow(frame,windows=ROLLING_WINDOWS):
+    """Net cashflow summed over the trailing windows,
+    given in days, ending on each day. Near the start
+    of the data, the sums cover fewer days.
+    """
+    net = daily_net(frame)
+    return pd.DataFrame({'{} days'.format(n) :
+                         net.rolling(n,min_periods=1).sum()
+                         for n in windows})
+
+def cumulative_cashflow(frame):
+    """Net cashflow accumulated since the first
+    transaction in frame, on each day. This is how
+    much net worth has grown or shrunk.
+    """
+    return daily_net(frame).cumsum()
+
+def period_over_period(frame,period='month',percent=False):
+    """The change in expenditures in each category from
+    one period to the next, 'week', 'month' or 'year',
+    in dollars, or as a percentage if percent is True.
+    The first period has no change and is left out.
+    """
+    spending = spending_by_period(frame,period)
+    if percent:
+        out = 100*spending.pct_change()
+        out = out.replace([np.inf,-np.inf],np.nan)
+    else:
+        out = spending.diff()
+    return out.iloc[1:]
+
+def combine_columns(frame,cutoff):
+    """Consolidates the columns of frame holding less
+    than cutoff percent of the total into "Other".
+    """
+    if cutoff <= 0:
+        return frame
+    if cutoff >= 100:
+        raise ValueError("Can't cutoff more than 100%"
+                         " of expenditures!")
+    totals = frame.abs().sum()
+    percentages = 100*totals/totals.sum()
+    small = percentages.index[percentages < cutoff]
+    if len(small) == 0:
+        return frame
+    other = frame[small].sum(axis=1)
+    out = frame.drop(columns=small)
+    if "Other" in out.columns:
+        out = out.assign(Other=out["Other"]+other)
+    else:
+        out = out.assign(Other=other)
+    return out
+
+@profiled()
+def plot_spending_trends(frame,period='month',
+                         savepath=None,
+                         show=True,
+                         cutoff=0.0):
+    """Plots expenditures per period, stacked by category.
+
+    Consolidates all categories that are less than cutoff%
+    of total expenditures into "Other"
+    """
+    toplot = combine_columns(spending_by_period(frame,period),cutoff)
+    fig,ax = new_figure(show)
+    if toplot.shape[1] == 0 or len(toplot) == 0:
+        label_empty(ax,'No expenditures in this window')
+        finish_figure(fig,savepath,show)
+        return
+    ax.stackplot(toplot.index,toplot.to_numpy().T,
+                 labels=toplot.columns.tolist(),
+                 alpha=0.8)
+    ax.legend(loc="upper left",fontsize='small')
+    ax.tick_params(axis='x',labelrotation=90)
+    ax.set_ylabel('Expenditures per {} ($)'.format(period))
+    ax.set_xlabel('Date')
+    finish_figure(fig,savepath,show)
+    return
+
+@profiled()
+def plot_rolling_cashflow(frame,
+                          savepath=None,
+                          show=True,
+                          windows=ROLLING_WINDOWS):
+    """Plots net cashflow over trailing windows
+    of each length in windows, in days.
+    """
+    toplot = rolling_cashflow(frame,windows)
+    fig,ax = new_figure(show)
+    for label in toplot.columns:
+        ax.plot(toplot.index,toplot[label].to_numpy(),
+                label=label)
+    ax.axhline(0,color='k',lw=1)
+    ax.legend(loc="best")
+    ax.tick_params(axis='x',labelrotation=90)
+    ax.set_ylabel('Net Cashflow ($)')
+    ax.set_xlabel('Date')
+    finish_figure(fig,savepath,show)
+    return
+
+@profiled()
+def plot_cumulative_cashflow(frame,
+                             savepath=None,
+                             show=True):
+    "Plots net cashflow accumulated over time"
+    toplot = cumulative_cashflow(frame)
+    fig,ax = new_figure(show)
+    ax.plot(toplot.index,toplot.to_numpy(),color='b')
+    ax.axhline(0,color='k',lw=1)
+    ax.tick_params(axis='x',labelrotation=90)
+    ax.set_ylabel('Cumulative Net Cashflow ($)')
+    ax.set_xlabel('Date')
+    finish_figure(fig,savepath,show)
+    return
+
+@profiled()
+def plot_period_over_period(frame,period='month',
+                            savepath=None,
+                            show=True):
+    """Plots the change in total expenditures
+    from each period to the next.
+    """
+    toplot = period_over_period(frame,period).sum(axis=1)
+    vals = toplot.to_numpy()
+    colors = np.where(vals > 0,'r','g')
+    width = {'week' : 5, 'month' : 25, 'year' : 300}[period]
+    fig,ax = new_figure(show)
+    ax.bar(toplot.index,vals,
+           width=width,
+           color=colors,
+           alpha=0.8)
+    ax.axhline(0,color='k',lw=1)
+    ax.tick_params(axis='x',labelrotation=90)
+    ax.set_ylabel('Change in Expenditures ($)')
+    ax.set_xlabel('Date')
+    finish_figure(fig,savepath,show)
+    return
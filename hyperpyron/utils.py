@@ -5,6 +5,56 @@ hyperpyron/utils.py
 Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
 """
 
+# python
+import os
+import errno
+import json
+import hashlib
+
 def invert_dict(my_map):
     "Invert a dictionary"
     return dict((v, k) for k, v in my_map.items())
+
+def make_sure_path_exists(path):
+    "Make the path, if it doesn't already exist"
+    try:
+        os.makedirs(path)
+    except OSError as exception:
+        if exception.errno != errno.EEXIST:
+            raise
+
+def file_digest(fpath,blocksize=1<<20):
+    "Returns the sha256 hex digest of a file's contents"
+    h = hashlib.sha256()
+    with open(fpath,'rb') as f:
+        for block in iter(lambda: f.read(blocksize),b''):
+            h.update(block)
+    return h.hexdigest()
+
+def data_digest(data):
+    "Returns the sha256 hex digest of JSON-like data"
+    encoded = json.dumps(data,sort_keys=True,default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def directory_snapshot(paths):
+    """Returns the path, modification time and size of
+    every file in paths, which may be files or directories,
+    as a sorted tuple. Two snapshots differ if a file was
+    added, removed or modified in between. Missing paths
+    are skipped.
+    """
+    out = []
+    for p in paths:
+        if os.path.isfile(p):
+            stat = os.stat(p)
+            out.append((p,stat.st_mtime_ns,stat.st_size))
+            continue
+        for root,dirs,files in os.walk(p):
+            for name in files:
+                fpath = os.path.join(root,name)
+                try:
+                    stat = os.stat(fpath)
+                except FileNotFoundError:
+                    continue
+                out.append((fpath,stat.st_mtime_ns,stat.st_size))
+    return tuple(sorted(out))
@@ -0,0 +1,470 @@
+#!/usr/bin/env python
+
+"""
+hyperpyron/watch.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+"""
+
+# python
+import os
+import sys
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+import traceback
+from os import path
+
+# hyperpyron
+from . import iconfig
+from .utils import directory_snapshot
+
+# inotify flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+# wd, mask, cookie, length of the name that follows
+INOTIFY_EVENT = struct.Struct('iIII')
+
+def load_inotify():
+    """Returns libc if it provides inotify, as on Linux,
+    and None otherwise.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError,AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int,ctypes.c_char_p,
+                                       ctypes.c_uint32]
+    return libc
+
+class PollingWatcher:
+    """
+    Watches files and directories for changes by comparing
+    the size and modification time of every file in them
+    every interval seconds. See utils.directory_snapshot.
+    Works everywhere, but each poll stats every file.
+
+    Initiate with
+    w = PollingWatcher(paths)
+    and wait for changes with
+    changed = w.wait()
+    """
+    def __init__(self,paths,interval=None,settle=None):
+        if interval is None:
+            interval = iconfig.WATCH_POLL
+        if settle is None:
+            settle = iconfig.WATCH_SETTLE
+        self.paths = list(paths)
+        self.interval = interval
+        self.settle = settle
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        return {p : (mtime,size)
+                for p,mtime,size in directory_snapshot(self.paths)}
+
+    def poll(self):
+        """Returns the paths of the files added, modified
+        or deleted since the last poll.
+        """
+        snapshot = self.take_snapshot()
+        changed = set(p for p in set(snapshot) | set(self.snapshot)
+                      if snapshot.get(p) != self.snapshot.get(p))
+        self.snapshot = snapshot
+        return changed
+
+    def wait(self,timeout=None):
+        """Blocks until something changes, or until timeout
+        seconds pass, and returns the paths that changed.
+        Files still being written are waited on until they
+        stop changing for self.settle seconds.
+        """
+        start = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                while True:
+                    time.sleep(self.settle)
+                    more = self.poll()
+                    if not more:
+                        return changed
+                    changed |= more
+            if timeout is not None and time.monotonic()-start >= timeout:
+                return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """
+    Watches files and directories for changes with Linux
+    inotify. The kernel reports each file as it is closed
+    after writing, moved in or out, or deleted, so there
+    is nothing to scan. Directories are watched along with
+    every directory below them, including new ones.
+
+    Initiate with
+    w = InotifyWatcher(paths)
+    and wait for changes with
+    changed = w.wait()
+    """
+    MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+            | IN_CREATE | IN_DELETE)
+
+    def __init__(self,paths,settle=None,libc=None):
+        if libc is None:
+            libc = load_inotify()
+        if libc is None:
+            raise OSError("inotify is not available")
+        if settle is None:
+            settle = iconfig.WATCH_SETTLE
+        self.libc = libc
+        self.settle = settle
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(),"inotify_init1 failed")
+        self.directories = {} # watch descriptor -> directory
+        self.files = {} # directory -> watched files, or None for all
+        self.paths = list(paths)
+        for p in self.paths:
+            self.add(p)
+
+    def add_watch(self,directory,files=None):
+        """Watches directory, for changes to the names in
+        files, or to anything if files is None.
+        """
+        wd = self.libc.inotify_add_watch(self.fd,
+                                         os.fsencode(directory),
+                                         self.MASK)
+        if wd < 0:
+            return
+        self.directories[wd] = directory
+        if files is None or self.files.get(directory,set()) is None:
+            self.files[directory] = None
+        else:
+            self.files.setdefault(directory,set()).update(files)
+
+    def add(self,p):
+        """Watches the file or directory at p. Files that
+        don't exist yet are watched for in their directory.
+        Returns every file found below a directory.
+        """
+        if not path.isdir(p):
+            if path.isdir(path.dirname(p)):
+                self.add_watch(path.dirname(p),[path.basename(p)])
+            return []
+        found = []
+        for root,dirs,files in os.walk(p):
+            self.add_watch(root)
+            found.extend(path.join(root,name) for name in files)
+        return found
+
+    def read(self):
+        "Reads pending events and returns the paths they concern"
+        changed = set()
+        data = os.read(self.fd,64*1024)
+        offset = 0
+        while offset < len(data):
+            wd,mask,cookie,length = INOTIFY_EVENT.unpack_from(data,offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset+length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, so assume everything changed
+                changed |= set(p for p,mtime,size
+                               in directory_snapshot(self.paths))
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            files = self.files.get(directory)
+            if files is not None and name not in files:
+                continue
+            fpath = path.join(directory,name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # files may land before the watch is added
+                    changed.update(self.add(fpath))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_FROM
+                         | IN_MOVED_TO | IN_DELETE):
+                changed.add(fpath)
+        return changed
+
+    def wait(self,timeout=None):
+        """Blocks until something changes, or until timeout
+        seconds pass, and returns the paths that changed.
+        Events are collected until none arrive for
+        self.settle seconds, so a batch of files is
+        handled at once.
+        """
+        ready,_,_ = select.select([self.fd],[],[],timeout)
+        if not ready:
+            return set()
+        changed = self.read()
+        while select.select([self.fd],[],[],self.settle)[0]:
+            changed |= self.read()
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def get_watcher(paths,interval=None):
+    """Returns a watcher for the files and directories
+    in paths. Uses inotify where available, and polls
+    every interval seconds otherwise.
+    """
+    libc = load_inotify()
+    if libc is not None:
+        try:
+            return InotifyWatcher(paths,libc=libc)
+        except OSError:
+            pass
+    return PollingWatcher(paths,interval)
+
+class LiveData:
+    """
+    Keeps the normalized frame and its rollup cube of
+    workspace, a sysdirs.Workspace, up to date as data
+    files land, and saves both to its cache.
+
+    Files that appear in a rule set's directory are
+    parsed on their own, through the same pipeline as
+    parse_from_data, and their rows appended to the frame
+    and added to the cube. Nothing else is re-read.
+
+    If a file that was already ingested changed or was
+    deleted, or the rule set checks for duplicates within
+    it, or the parse rules or categories changed, the
+    data is reloaded with parse_from_data instead. That
+    still only re-reads files that changed.
+
+    New rows are only added to the cache by save, which
+    appends them to the cached frame, and the store if
+    there is one, rather than rewriting either. update
+    saves at most every iconfig.WATCH_SAVE seconds, so
+    call save once files stop landing.
+
+    Initiate with
+    d = LiveData(workspace,jobs,executor)
+    and apply changes with
+    d.update(changed_paths)
+    d.save()
+    """
+    def __init__(self,workspace,jobs=None,executor=None):
+        self.jobs = jobs
+        self.executor = executor
+        self.workspace = workspace
+        self.load(use_cache=True)
+
+    def load(self,rebuild=False,use_cache=False):
+        """Loads every rule set. If use_cache is True, the
+        frame cache is used when it is current and no data
+        file changed since it was saved.
+        """
+        from . import hyperparse
+        from .rollup import Rollup
+        from .filecache import FileCache
+        from .dedupe import DuplicateIndex
+        from .parseconfig import DataRulesParser
+        self.rules = DataRulesParser(self.workspace.parse_conf_dir)
+        frame = None
+        if use_cache and not rebuild and not self.pending():
+            frame = hyperparse.load_from_cache(self.workspace)
+        if frame is None:
+            frame = hyperparse.parse_from_data(self.workspace,rebuild,
+                                               self.jobs,self.executor)
+            rollup = Rollup.from_frame(frame)
+            hyperparse.save_to_cache(self.workspace,frame,rollup=rollup)
+            print("Loaded data from files.")
+        else:
+            rollup = hyperparse.load_rollup(self.workspace)
+            if rollup is None:
+                rollup = Rollup.from_frame(frame)
+            print("Loaded data from cache.")
+        self.frame = frame
+        self.rollup = rollup
+        self.file_cache = FileCache(self.workspace.cache_dir)
+        self.deduper = DuplicateIndex(self.workspace.cache_dir)
+        self.unsaved = []
+        self.dirty = False
+        self.saved = time.monotonic()
+
+    def pending(self):
+        """Whether any data file was added, modified or
+        deleted since the files were last parsed.
+        """
+        from .parsers import find_files
+        from .filecache import FileCache
+        file_cache = FileCache(self.workspace.cache_dir)
+        if file_cache.changed():
+            return True
+        return any(fpath not in file_cache
+                   for rules in self.rules.values()
+                   for fpath in find_files(rules['directory']))
+
+    def watched(self):
+        "The files and directories that the data depends on"
+        workspace = self.workspace
+        directories = sorted(set(path.abspath(rules['directory'])
+                                 for rules in self.rules.values()))
+        return ([workspace.parse_conf_dir,
+                 workspace.categories_file,
+                 workspace.budget_file]
+                + directories)
+
+    def rule_set(self,fpath):
+        "The name of the rule set whose directory holds fpath"
+        fpath = path.abspath(fpath)
+        for name in self.rules.keys():
+            directory = path.abspath(self.rules[name]['directory'])
+            if path.commonpath([fpath,directory]) == directory:
+                return name
+        return None
+
+    def update(self,fpaths):
+        """Brings the data up to date with changes to
+        the files in fpaths. Returns whether anything the
+        analysis depends on changed, including the budget.
+        """
+        workspace = self.workspace
+        fpaths = [path.abspath(f) for f in fpaths]
+        conf = path.abspath(workspace.parse_conf_dir)
+        if any(f == path.abspath(workspace.categories_file)
+               or path.commonpath([f,conf]) == conf
+               for f in fpaths):
+            self.load()
+            return True
+        changed = any(f == path.abspath(workspace.budget_file)
+                      for f in fpaths)
+        new = {}
+        for fpath in fpaths:
+            name = self.rule_set(fpath)
+            if name is None:
+                continue
+            entry = self.file_cache.manifest.get(fpath)
+            if entry is not None:
+                if self.file_cache.is_current(fpath,entry):
+                    continue
+                # rows already ingested changed or disappeared
+                self.load()
+                return True
+            if not path.isfile(fpath):
+                continue
+            if self.rules[name].get('duplicate checking'):
+                self.load()
+                return True
+            new.setdefault(name,[]).append(fpath)
+        for name,files in sorted(new.items()):
+            self.append(self.rules[name],sorted(files))
+        if self.dirty and (time.monotonic()-self.saved
+                           >= iconfig.WATCH_SAVE):
+            self.save()
+        return changed or bool(new)
+
+    def append(self,rules,fpaths):
+        """Parses the new files in fpaths with rules and
+        adds their rows to the frame and the cube. They
+        are kept until the next save.
+        """
+        from .parsers import get_data_parser
+        from .schema import compact,insert_sorted
+        ParserClass = get_data_parser(rules['type'])
+        parser = ParserClass(rules,self.file_cache,
+                             deduper=self.deduper,lazy=True,
+                             workspace=self.workspace)
+        frame = parser.import_files(fpaths)
+        # the file cache now lists the files either way
+        self.dirty = True
+        if frame is None or len(frame) == 0:
+            return
+        frame = compact(frame)
+        self.rollup.add(frame)
+        self.frame = insert_sorted(self.frame,frame)
+        self.unsaved.append(frame)
+        print("Added",len(frame),"rows from",len(fpaths),"files.")
+
+    def same_days(self,rows):
+        "The rows of the frame on the days that rows fall on"
+        import numpy as np
+        import pandas as pd
+        days = pd.DatetimeIndex(rows['Date']).normalize().unique()
+        days = days.sort_values()
+        index = self.frame.index
+        starts = index.searchsorted(days,'left')
+        stops = index.searchsorted(days+pd.Timedelta(days=1),'left')
+        return self.frame.iloc[np.concatenate(
+            [np.arange(a,b) for a,b in zip(starts,stops)])]
+
+    def save_timeout(self):
+        """How long to wait for more files before saving,
+        or None if there is nothing to save
+        """
+        if not self.dirty:
+            return None
+        return iconfig.WATCH_SAVE
+
+    def save(self):
+        """Saves the file cache, and the rows added since
+        the last save to the frame cache and the store,
+        along with the cube. If the frame cache can't be
+        appended to, the whole frame is saved.
+        """
+        import pandas as pd
+        from . import hyperparse
+        if not self.dirty:
+            return
+        self.file_cache.save()
+        self.deduper.save()
+        if self.unsaved:
+            rows = pd.concat(self.unsaved,ignore_index=True)
+            if not hyperparse.append_to_cache(self.workspace,rows,
+                                              self.rollup):
+                hyperparse.save_to_cache(self.workspace,self.frame,
+                                         rollup=self.rollup)
+            hyperparse.append_to_store(self.workspace,
+                                       self.same_days(rows))
+        self.unsaved = []
+        self.dirty = False
+        self.saved = time.monotonic()
+
+def run(workspace,jobs=None,executor=None,interval=None):
+    """Keeps the cache of workspace up to date as data
+    files land, until interrupted.
+    """
+    data = LiveData(workspace,jobs,executor)
+    watcher = get_watcher(data.watched(),interval)
+    print("Watching",", ".join(data.watched()))
+    try:
+        while True:
+            changed = watcher.wait(data.save_timeout())
+            try:
+                if changed:
+                    data.update(changed)
+                else:
+                    data.save()
+            except Exception:
+                traceback.print_exc()
+            if watcher.paths != data.watched():
+                watcher.close()
+                watcher = get_watcher(data.watched(),interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        data.save()
@@ -0,0 +1,95 @@
+"""
+tests/conftest.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Shared fixtures. Every test gets its own HYPERPYRON_HOME
+in a temporary directory, so nothing reads the user's
+configs or caches.
+"""
+
+# python
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+# hyperpyron
+from hyperpyron.sysdirs import Workspace
+from hyperpyron.schema import compact,index_by_date
+
+@pytest.fixture
+def workspace(tmp_path,monkeypatch):
+    "An empty home with a categories file and no parse rules"
+    home = tmp_path/'home'
+    monkeypatch.setenv('HYPERPYRON_HOME',str(home))
+    workspace = Workspace(str(home))
+    workspace.make_directories()
+    with open(workspace.categories_file,'w') as f:
+        f.write("Restaurants: [pizza]\nIgnore: [Transfer]\n")
+    return workspace
+
+# date windows to compare aggregates over: everything,
+# open ended, within a month, across months, one whole
+# month, and after the data
+WINDOWS = [(None,None),
+           ('2020-03-01',None),
+           (None,'2020-06-15'),
+           ('2020-01-15','2020-01-20'),
+           ('2020-02-10','2020-11-03'),
+           ('2020-04-01','2020-04-30'),
+           ('2021-06-01','2021-12-31')]
+
+def make_frame(nrows,seed=0,accounts=('checking','credit'),
+               start='2020-01-01',ndays=400):
+    """A compact transaction frame of nrows random rows,
+    indexed by date. A few descriptions repeat on the
+    same day, so identical rows are exercised too.
+    """
+    rng = np.random.default_rng(seed)
+    categories = ['Groceries','Restaurants','Income','Retail','Other']
+    frame = pd.DataFrame({
+        'Date' : (pd.Timestamp(start)
+                  + pd.to_timedelta(rng.integers(0,ndays,nrows),'D')),
+        'Description' : rng.choice(['shop {}'.format(i)
+                                    for i in range(20)],nrows),
+        'Amount' : rng.integers(-20000,5000,nrows)/100,
+        'Category' : rng.choice(categories,nrows),
+        'Account' : rng.choice(list(accounts),nrows)})
+    return index_by_date(compact(frame))
+
+@pytest.fixture
+def frame():
+    return make_frame(2000)
+
+RULES = """type: csv
+directory: {}
+use column names: true
+columns:
+  Date: Posted
+  Description: Payee
+  Amount: Amount
+  Category: Cat
+categories:
+  Food: Groceries
+"""
+
+def write_statement(fpath,frame):
+    "Writes a compact frame to fpath as the bank in RULES does"
+    pd.DataFrame({'Posted' : frame['Date'].dt.strftime('%Y-%m-%d'),
+                  'Payee' : frame['Description'].astype(str),
+                  'Amount' : frame['Amount']/100,
+                  'Cat' : frame['Category'].astype(str)}).to_csv(
+                      fpath,index=False)
+
+@pytest.fixture
+def home(workspace,tmp_path):
+    """workspace, with parse rules for one bank account
+    and a CSV statement of 500 rows to read. Returns the
+    workspace and the data directory.
+    """
+    data = tmp_path/'data'/'bank'
+    data.mkdir(parents=True)
+    with open(os.path.join(workspace.parse_conf_dir,'bank.yaml'),'w') as f:
+        f.write(RULES.format(data))
+    write_statement(str(data/'2020.csv'),make_frame(500,accounts=('bank',)))
+    return workspace,data
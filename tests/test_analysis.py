@@ -0,0 +1,48 @@
+"""
+tests/test_analysis.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Category sums and percentages, and their consolidation
+into "Other".
+"""
+
+# python
+import pandas as pd
+import pytest
+
+# hyperpyron
+from hyperpyron import analysis
+from hyperpyron.rollup import Rollup
+
+PERCENTAGES = pd.Series({'Groceries' : 60.0,'Housing' : 36.0,
+                         'Retail' : 3.0,'Cash' : 1.0})
+
+@pytest.mark.parametrize('cutoff,expected',[
+    (0,PERCENTAGES),
+    (2,pd.Series({'Groceries' : 60.0,'Housing' : 36.0,
+                  'Retail' : 3.0,'Other' : 1.0})),
+    (50,pd.Series({'Groceries' : 60.0,'Other' : 40.0}))])
+def test_combine_percentages(cutoff,expected):
+    pd.testing.assert_series_equal(
+        analysis.combine_percentages(PERCENTAGES,cutoff),expected)
+
+def test_combine_percentages_into_other():
+    percentages = PERCENTAGES.rename({'Housing' : 'Other'})
+    out = analysis.combine_percentages(percentages,5)
+    pd.testing.assert_series_equal(
+        out,pd.Series({'Groceries' : 60.0,'Other' : 40.0}))
+
+@pytest.mark.parametrize('cutoff',[0,5,50])
+def test_combine_expenses_is_a_series(frame,cutoff):
+    for data in [frame,Rollup.from_frame(frame)]:
+        out = analysis.combine_expenses(data,cutoff)
+        assert isinstance(out,pd.Series)
+        assert "Total" in out.index
+        assert out.drop("Total").sum() == pytest.approx(out["Total"])
+
+@pytest.mark.parametrize('cutoff',[0,5])
+def test_plots(frame,tmp_path,cutoff):
+    analysis.plot_percent_expenditures(frame,str(tmp_path/'p.png'),
+                                       False,cutoff)
+    analysis.plot_net_cashflow(frame,str(tmp_path/'c.png'),False,cutoff)
+    assert (tmp_path/'p.png').exists() and (tmp_path/'c.png').exists()
@@ -0,0 +1,108 @@
+"""
+tests/test_cache.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Each cache format gives back the frame it was given,
+over any window, however it was written.
+"""
+
+# python
+import os
+import pandas as pd
+import pytest
+
+# hyperpyron
+from hyperpyron import hyperparse
+from hyperpyron.rollup import Rollup
+from hyperpyron.schema import compact,index_by_date,date_slice
+from hyperpyron.cacheformats import cache_formats,get_cache_format
+
+from conftest import WINDOWS,make_frame
+
+@pytest.fixture(params=sorted(cache_formats))
+def fmt(request):
+    FormatClass = cache_formats[request.param]
+    if not FormatClass.available():
+        pytest.skip(request.param+" is not available")
+    return FormatClass()
+
+def canonical(frame):
+    "frame as load_from_cache returns it, comparable across formats"
+    frame = index_by_date(compact(frame))
+    return frame.astype({'Date' : 'datetime64[ns]',
+                         'Description' : str,
+                         'Account' : str})
+
+def assert_same_rows(got,expected):
+    got,expected = canonical(got),canonical(expected)
+    pd.testing.assert_frame_equal(got,expected,check_index_type=False,
+                                  check_freq=False)
+
+@pytest.mark.parametrize('before,after',WINDOWS)
+def test_round_trip(tmp_path,fmt,frame,before,after):
+    target = fmt.target(str(tmp_path),'frame')
+    fmt.save(frame.reset_index(drop=True),target)
+    assert_same_rows(fmt.load(target,before,after),
+                     date_slice(frame,before,after))
+
+@pytest.mark.parametrize('before,after',WINDOWS[:4])
+def test_chunked_writer(tmp_path,fmt,frame,before,after):
+    target = fmt.target(str(tmp_path),'frame')
+    chunks = [make_frame(300,seed=i) for i in range(4)]
+    with fmt.writer(target,chunked=True) as w:
+        for chunk in chunks:
+            w.write(chunk.reset_index(drop=True))
+    assert w.rows == 1200
+    expected = pd.concat(chunks).sort_index(kind='mergesort')
+    assert_same_rows(fmt.load(target,before,after),
+                     date_slice(expected,before,after))
+
+def test_append(tmp_path,fmt,frame):
+    target = fmt.target(str(tmp_path),'frame')
+    fmt.save(frame.reset_index(drop=True),target)
+    extra = [make_frame(30,seed=7,accounts=('savings',)),
+             make_frame(5,seed=8)]
+    for rows in extra:
+        fmt.append(rows.reset_index(drop=True),target)
+    expected = pd.concat([frame]+extra).sort_index(kind='mergesort')
+    assert_same_rows(fmt.load(target),expected)
+    assert_same_rows(fmt.load(target,'2020-03-01','2020-05-01'),
+                     date_slice(expected,'2020-03-01','2020-05-01'))
+
+def test_failed_write_keeps_old_cache(tmp_path,fmt,frame):
+    target = fmt.target(str(tmp_path),'frame')
+    fmt.save(frame.reset_index(drop=True),target)
+    with pytest.raises(RuntimeError):
+        with fmt.writer(target,chunked=True) as w:
+            w.write(make_frame(10,seed=3).reset_index(drop=True))
+            raise RuntimeError("interrupted")
+    assert_same_rows(fmt.load(target),frame)
+    assert os.listdir(str(tmp_path)) == [os.path.basename(target)]
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        get_cache_format('csv')
+
+def test_workspace_cache(workspace,fmt,frame):
+    assert hyperparse.load_from_cache(workspace) is None
+    hyperparse.save_to_cache(workspace,frame,fmt.name)
+    assert_same_rows(hyperparse.load_from_cache(workspace),frame)
+    assert_same_rows(hyperparse.load_from_cache(workspace,
+                                                '2020-06-01','2020-07-01'),
+                     date_slice(frame,'2020-06-01','2020-07-01'))
+    rollup = hyperparse.load_rollup(workspace)
+    pd.testing.assert_frame_equal(rollup.totals(),
+                                  Rollup.from_frame(frame).totals())
+    # new rows are appended, along with the cube that includes them
+    extra = make_frame(20,seed=9)
+    rollup.add(extra)
+    assert hyperparse.append_to_cache(workspace,extra,rollup)
+    expected = pd.concat([frame,extra]).sort_index(kind='mergesort')
+    assert_same_rows(hyperparse.load_from_cache(workspace),expected)
+    pd.testing.assert_frame_equal(hyperparse.load_rollup(workspace).totals(),
+                                  Rollup.from_frame(expected).totals())
+    # stale once the categories change
+    with open(workspace.categories_file,'a') as f:
+        f.write("Groceries: [market]\n")
+    assert hyperparse.load_from_cache(workspace) is None
+    assert not hyperparse.append_to_cache(workspace,extra,rollup)
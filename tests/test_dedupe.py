@@ -0,0 +1,137 @@
+"""
+tests/test_dedupe.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Cross-file duplicate checking with dedupe.DuplicateIndex.
+"""
+
+# python
+import numpy as np
+import pandas as pd
+import pytest
+
+# hyperpyron
+from hyperpyron.dedupe import DuplicateIndex,OccurrenceCounts
+
+def statement(rows):
+    "A parsed statement from (date, description, amount) rows"
+    return pd.DataFrame(rows,columns=['Date','Description','Amount'])
+
+JANUARY = statement([('2020-01-03','Coffee',-3.0),
+                     ('2020-01-03','Coffee',-3.0),
+                     ('2020-01-20','Rent',-900.0),
+                     ('2020-01-31','Pay',2000.0)])
+# overlaps January by its last two rows, one of them
+# exported with different spacing and capitalization
+FEBRUARY = statement([('2020-01-20','RENT ',-900.0),
+                      ('2020-01-31','Pay',2000.0),
+                      ('2020-02-03','Coffee',-3.0),
+                      ('2020-02-20','Rent',-900.0)])
+
+@pytest.fixture
+def deduper(tmp_path):
+    return DuplicateIndex(str(tmp_path))
+
+def test_identical_rows_in_one_file_are_kept(deduper):
+    kept = deduper.drop_duplicates('/a.csv',JANUARY)
+    pd.testing.assert_frame_equal(kept,JANUARY)
+
+def test_overlapping_files(deduper):
+    deduper.drop_duplicates('/a.csv',JANUARY)
+    kept = deduper.drop_duplicates('/b.csv',FEBRUARY)
+    assert kept['Date'].tolist() == ['2020-02-03','2020-02-20']
+    assert deduper.dependents(['/a.csv']) == ['/b.csv']
+    assert deduper.dependents(['/b.csv']) == []
+
+def test_repeated_purchase_is_kept(deduper):
+    deduper.drop_duplicates('/a.csv',JANUARY)
+    # a third coffee that day is a new purchase
+    extra = statement([('2020-01-03','Coffee',-3.0)]*3)
+    kept = deduper.drop_duplicates('/b.csv',extra)
+    assert len(kept) == 1
+
+def test_tolerance(deduper):
+    deduper.drop_duplicates('/a.csv',JANUARY)
+    late = statement([('2020-01-22','Rent',-900.0)])
+    assert len(deduper.drop_duplicates('/b.csv',late,tolerance=1)) == 1
+    assert len(deduper.drop_duplicates('/c.csv',late,tolerance=2)) == 0
+
+def test_reading_a_file_again_replaces_it(deduper):
+    deduper.drop_duplicates('/a.csv',JANUARY)
+    deduper.merge()
+    size = len(deduper.hashes)
+    kept = deduper.drop_duplicates('/a.csv',JANUARY)
+    assert len(kept) == len(JANUARY)
+    deduper.merge()
+    assert len(deduper.hashes) == size
+
+def test_forget(deduper):
+    deduper.drop_duplicates('/a.csv',JANUARY)
+    deduper.drop_duplicates('/b.csv',FEBRUARY)
+    deduper.forget(['/a.csv'])
+    assert '/a.csv' not in deduper
+    # February's copies of the overlap were dropped, not
+    # recorded, which is why it depends on January
+    assert len(deduper.drop_duplicates('/c.csv',JANUARY)) == len(JANUARY)
+
+def test_save_and_load(tmp_path,deduper):
+    deduper.drop_duplicates('/a.csv',JANUARY)
+    deduper.drop_duplicates('/b.csv',FEBRUARY)
+    deduper.save()
+    loaded = DuplicateIndex(str(tmp_path))
+    np.testing.assert_array_equal(loaded.hashes,deduper.hashes)
+    np.testing.assert_array_equal(loaded.owners,deduper.owners)
+    assert loaded.files() == ['/a.csv','/b.csv']
+    assert loaded.dependents(['/a.csv']) == ['/b.csv']
+    assert len(loaded.drop_duplicates('/c.csv',FEBRUARY)) == 0
+
+@pytest.mark.parametrize('chunksize',[1,2,3])
+def test_chunks_match_whole_file(tmp_path,chunksize):
+    whole = DuplicateIndex(str(tmp_path/'whole'))
+    whole.drop_duplicates('/a.csv',JANUARY)
+    expected = whole.drop_duplicates('/b.csv',FEBRUARY)
+    chunked = DuplicateIndex(str(tmp_path/'chunked'))
+    for fpath,frame in [('/a.csv',JANUARY),('/b.csv',FEBRUARY)]:
+        counts = OccurrenceCounts()
+        kept = [chunked.drop_duplicates(fpath,frame.iloc[i:i+chunksize],
+                                        counts=counts)
+                for i in range(0,len(frame),chunksize)]
+    pd.testing.assert_frame_equal(pd.concat(kept),expected)
+    whole.merge()
+    chunked.merge()
+    np.testing.assert_array_equal(chunked.hashes,whole.hashes)
+
+@pytest.mark.parametrize('merged',[False,True])
+def test_find_scans_every_owner(deduper,merged):
+    hashes = np.array([5,7,9],dtype=np.uint64)
+    a,b = deduper.owner_id('/a.csv'),deduper.owner_id('/b.csv')
+    deduper.add(hashes,a)
+    deduper.add(hashes[1:],b)
+    if merged:
+        deduper.merge()
+    probes = np.array([9,5,6,7],dtype=np.uint64)
+    found,owners = deduper.find(probes,a)
+    np.testing.assert_array_equal(found,[True,False,False,True])
+    np.testing.assert_array_equal(owners[found],[b,b])
+    found,owners = deduper.find(probes,b)
+    np.testing.assert_array_equal(found,[True,True,False,True])
+    np.testing.assert_array_equal(owners[found],[a,a,a])
+
+def test_hashes_are_merged_on_save(deduper):
+    deduper.drop_duplicates('/a.csv',JANUARY)
+    deduper.drop_duplicates('/b.csv',FEBRUARY)
+    assert len(deduper.hashes) == 0
+    # added hashes are searched before they are merged
+    assert len(deduper.drop_duplicates('/c.csv',FEBRUARY)) == 0
+    deduper.save()
+    assert len(deduper.hashes) == len(JANUARY) + 2
+    assert np.all(np.diff(deduper.hashes.astype(np.float64)) >= 0)
+    assert len(deduper.drop_duplicates('/d.csv',JANUARY)) == 0
+
+def test_occurrence_counts():
+    counts = OccurrenceCounts()
+    keys = np.array([1,1,2,1],dtype=np.uint64)
+    days = np.array([0,0,0,1])
+    np.testing.assert_array_equal(counts.occurrence(keys,days),[0,1,0,0])
+    np.testing.assert_array_equal(counts.occurrence(keys[:2],days[:2]),
+                                  [2,3])
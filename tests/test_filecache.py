@@ -0,0 +1,54 @@
+"""
+tests/test_filecache.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+The file cache only trusts what a file held when it
+was read.
+"""
+
+# python
+import yaml
+
+# hyperpyron
+from hyperpyron.filecache import FileCache,file_entry
+from hyperpyron.parsers import get_data_parser
+
+from conftest import RULES,make_frame,write_statement
+
+def test_put_and_get(tmp_path,frame):
+    fpath = str(tmp_path/'a.csv')
+    write_statement(fpath,frame)
+    cache = FileCache(str(tmp_path/'cache'))
+    cache.put(fpath,frame,'tag')
+    assert cache.get(fpath,'tag') is not None
+    assert cache.get(fpath,'other') is None
+
+def test_entry_is_taken_before_parsing(tmp_path,frame):
+    fpath = str(tmp_path/'a.csv')
+    write_statement(fpath,frame)
+    entry = file_entry(fpath)
+    # modified while it was being parsed
+    write_statement(fpath,frame.iloc[1:])
+    cache = FileCache(str(tmp_path/'cache'))
+    cache.put(fpath,frame,'tag',entry)
+    assert cache.get(fpath,'tag') is None
+    assert cache.changed() == [fpath]
+
+def test_file_modified_while_read(tmp_path,monkeypatch):
+    data = tmp_path/'bank'
+    data.mkdir()
+    fpath = str(data/'2020.csv')
+    write_statement(fpath,make_frame(50,accounts=('bank',)))
+    rules = yaml.safe_load(RULES.format(data))
+    rules['account'] = 'bank'
+    Parser = get_data_parser('csv')
+    parse_one = Parser.parse_one
+    def parse_then_modify(self,f):
+        frame = parse_one(self,f)
+        write_statement(f,make_frame(60,seed=1,accounts=('bank',)))
+        return frame
+    monkeypatch.setattr(Parser,'parse_one',parse_then_modify)
+    cache = FileCache(str(tmp_path/'cache'))
+    assert len(Parser(rules,cache).get_frame()) == 50
+    monkeypatch.setattr(Parser,'parse_one',parse_one)
+    assert len(Parser(rules,cache).get_frame()) == 60
@@ -0,0 +1,218 @@
+"""
+tests/test_parsers.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+The OFX, QIF and JSON Lines parsers, on small files
+written out here. Checks dates, signs and amounts, and
+that reading in chunks gives the same rows.
+"""
+
+# python
+import pandas as pd
+import pytest
+
+# hyperpyron
+from hyperpyron.parsers import get_data_parser,parse_amounts
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<DTSTART>20200101
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20200105120000.000[-5:EST]
+<TRNAMT>-45.10
+<FITID>1001
+<NAME>SHELL OIL 123
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20200106
+<TRNAMT>1,500.00
+<FITID>1002
+<MEMO>PAYROLL ACME
+</STMTTRN>
+<stmttrn>
+<trntype>DEBIT
+<dtposted>20200107
+<trnamt>-12.00
+<fitid>1001
+<name>REPEAT
+</stmttrn>
+</BANKTRANLIST><LEDGERBAL><BALAMT>100<DTASOF>20200131</LEDGERBAL>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+OFX_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<?OFX OFXHEADER="200" VERSION="220"?>
+<OFX><CREDITCARDMSGSRSV1><CCSTMTTRNRS><CCSTMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20211230</DTPOSTED><TRNAMT>-7.25</TRNAMT><FITID>a</FITID><NAME>Pizza Place</NAME></STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20220102093000</DTPOSTED><TRNAMT>30</TRNAMT><FITID>b</FITID><NAME>Refund</NAME><MEMO>ignored</MEMO></STMTTRN>
+</BANKTRANLIST></CCSTMTRS></CCSTMTTRNRS></CREDITCARDMSGSRSV1></OFX>
+"""
+
+QIF = """!Type:CCard
+D1/31'20
+T-12.50
+PSHELL
+LAuto:Fuel
+^
+D12/ 1/99
+T1,000.00
+MPaycheck
+LSalary
+^
+D2/29'20
+T-3.00
+Ppizza night
+^
+"""
+
+QIF_DAY_FIRST = """!Type:Bank
+D15.03.2021
+T-20.00
+PGrocer
+LGroceries
+^
+D16.03.2021
+T5.00
+PCashback
+^
+"""
+
+JSONL = """{"when": "2021-03-04", "who": "Cafe", "amt": "-3.50", "cat": "Dining"}
+{"when": "2021-03-05", "who": "Boss", "amt": 2000, "cat": "Payroll"}
+{"when": "2021-03-05", "who": "Pizza Hut", "amt": "$1,234.56"}
+{"when": "2021-03-06", "who": "Bank", "amt": "-10", "cat": "Transfer"}
+"""
+
+def write(tmp_path,name,text):
+    directory = tmp_path/'data'
+    directory.mkdir(exist_ok=True)
+    fpath = directory/name
+    fpath.write_text(text)
+    return str(directory),str(fpath)
+
+def parse(workspace,rules,fpath):
+    ParserClass = get_data_parser(rules['type'])
+    parser = ParserClass(rules,lazy=True,workspace=workspace)
+    return parser.import_files([fpath]).reset_index(drop=True)
+
+def stream(workspace,rules,chunksize):
+    ParserClass = get_data_parser(rules['type'])
+    parser = ParserClass(rules,chunksize=chunksize,workspace=workspace)
+    frame = pd.concat(list(parser.stream()),ignore_index=True)
+    return frame.sort_values('Date',kind='mergesort').reset_index(drop=True)
+
+def check_rows(frame,expected):
+    "Compares frame to a list of (date, description, amount, category)"
+    assert len(frame) == len(expected)
+    frame = frame.sort_values(['Date','Description']).reset_index(drop=True)
+    for (_,row),(date,description,amount,category) in zip(frame.iterrows(),
+                                                           expected):
+        assert row['Date'] == pd.Timestamp(date)
+        assert row['Description'] == description
+        assert row['Amount'] == pytest.approx(amount)
+        assert row['Category'] == category
+
+def test_parse_amounts():
+    column = pd.Series(['$1,234.50','-$3.00','$-3.00','($3.00)',
+                        '',None,'n/a','€7'],dtype=object)
+    amounts = parse_amounts(column)
+    assert amounts[:4].tolist() == [1234.5,-3.0,-3.0,-3.0]
+    assert amounts[4:7].isnull().all()
+    assert amounts[7] == 7.0
+
+def test_parse_amounts_with_currency_prefix():
+    column = pd.Series(['$1234.50','$-3.00',float('nan'),'€7'],
+                       dtype=object)
+    amounts = parse_amounts(column)
+    assert amounts[[0,1,3]].tolist() == [1234.5,-3.0,7.0]
+    assert pd.isnull(amounts[2])
+
+def test_ofx_sgml(workspace,tmp_path):
+    directory,fpath = write(tmp_path,'a.ofx',OFX_SGML)
+    rules = {'type' : 'ofx','directory' : directory,'account' : 'bank'}
+    frame = parse(workspace,rules,fpath)
+    check_rows(frame,[('2020-01-05','SHELL OIL 123',-45.10,'Other'),
+                      ('2020-01-06','PAYROLL ACME',1500.00,'Other'),
+                      ('2020-01-07','REPEAT',-12.00,'Other')])
+    assert (frame['Account'] == 'bank').all()
+
+def test_account_defaults_to_directory(workspace,tmp_path):
+    directory,fpath = write(tmp_path,'a.ofx',OFX_SGML)
+    rules = {'type' : 'ofx','directory' : directory+'/'}
+    assert (parse(workspace,rules,fpath)['Account'] == 'data').all()
+
+def test_ofx_duplicate_checking(workspace,tmp_path):
+    directory,fpath = write(tmp_path,'a.ofx',OFX_SGML)
+    rules = {'type' : 'ofx','directory' : directory,'account' : 'bank',
+             'duplicate checking' : True}
+    frame = parse(workspace,rules,fpath)
+    assert sorted(frame['Description']) == ['PAYROLL ACME','SHELL OIL 123']
+
+def test_ofx_xml_expenditures_positive(workspace,tmp_path):
+    directory,fpath = write(tmp_path,'a.qfx',OFX_XML)
+    rules = {'type' : 'qfx','directory' : directory,'account' : 'card'}
+    check_rows(parse(workspace,rules,fpath),
+               [('2021-12-30','Pizza Place',-7.25,'Restaurants'),
+                ('2022-01-02','Refund',30.0,'Other')])
+    rules['expenditures positive'] = True
+    check_rows(parse(workspace,rules,fpath),
+               [('2021-12-30','Pizza Place',7.25,'Restaurants'),
+                ('2022-01-02','Refund',-30.0,'Other')])
+
+def test_qif(workspace,tmp_path):
+    directory,fpath = write(tmp_path,'a.qif',QIF)
+    rules = {'type' : 'qif','directory' : directory,'account' : 'card',
+             'categories' : {'Auto:Fuel' : 'Automotive',
+                             'Salary' : 'Income'}}
+    check_rows(parse(workspace,rules,fpath),
+               [('1999-12-01','Paycheck',1000.00,'Income'),
+                ('2020-01-31','SHELL',-12.50,'Automotive'),
+                ('2020-02-29','pizza night',-3.00,'Restaurants')])
+
+def test_qif_date_format(workspace,tmp_path):
+    directory,fpath = write(tmp_path,'a.qif',QIF_DAY_FIRST)
+    rules = {'type' : 'qif','directory' : directory,'account' : 'bank',
+             'date format' : '%d.%m.%Y'}
+    check_rows(parse(workspace,rules,fpath),
+               [('2021-03-15','Grocer',-20.00,'Groceries'),
+                ('2021-03-16','Cashback',5.00,'Other')])
+
+def test_jsonl(workspace,tmp_path):
+    # transfers are ignored, as the categories file says
+    directory,fpath = write(tmp_path,'a.jsonl',JSONL)
+    rules = {'type' : 'jsonl','directory' : directory,'account' : 'wallet',
+             'columns' : {'Date' : 'when','Description' : 'who',
+                          'Amount' : 'amt','Category' : 'cat'},
+             'categories' : {'Dining' : 'Restaurants',
+                             'Payroll' : 'Income'}}
+    check_rows(parse(workspace,rules,fpath),
+               [('2021-03-04','Cafe',-3.50,'Restaurants'),
+                ('2021-03-05','Boss',2000.0,'Income'),
+                ('2021-03-05','Pizza Hut',1234.56,'Restaurants')])
+    rules['expenditures positive'] = True
+    frame = parse(workspace,rules,fpath)
+    assert sorted(frame['Amount']) == pytest.approx([-2000.0,-1234.56,3.50])
+
+@pytest.mark.parametrize('name,text,rules',[
+    ('a.ofx',OFX_SGML,{'type' : 'ofx'}),
+    ('a.qif',QIF,{'type' : 'qif'}),
+    ('a.jsonl',JSONL,{'type' : 'jsonl',
+                      'columns' : {'Date' : 'when','Description' : 'who',
+                                   'Amount' : 'amt'}})])
+@pytest.mark.parametrize('chunksize',[1,2,1000])
+def test_stream_matches_import(workspace,tmp_path,name,text,rules,chunksize):
+    directory,fpath = write(tmp_path,name,text)
+    rules = dict(rules,directory=directory,account='x')
+    expected = parse(workspace,rules,fpath)
+    expected = expected.sort_values('Date',kind='mergesort')
+    streamed = stream(workspace,rules,chunksize)
+    pd.testing.assert_frame_equal(
+        streamed.reset_index(drop=True)[list(expected.columns)],
+        expected.reset_index(drop=True),check_dtype=False,
+        check_categorical=False)
@@ -0,0 +1,91 @@
+"""
+tests/test_rollup.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+The rollup cube gives the same aggregates as the frame
+it was built from, over any window, however it was built.
+"""
+
+# python
+import numpy as np
+import pandas as pd
+import pytest
+
+# hyperpyron
+from hyperpyron import analysis
+from hyperpyron.rollup import Rollup
+from hyperpyron.schema import date_slice
+
+from conftest import WINDOWS,make_frame
+
+def frame_totals(frame,by='Category'):
+    "What Rollup.totals should return, computed from frame"
+    amounts = frame['Amount']
+    parts = pd.DataFrame({'Income' : amounts.where(amounts > 0,0),
+                          'Expenses' : amounts.where(amounts < 0,0),
+                          'Count' : 1,
+                          'Category' : frame['Category'],
+                          'Account' : frame['Account']})
+    out = parts.groupby(by,observed=True)[['Income','Expenses',
+                                           'Count']].sum()
+    out['Net'] = out['Income'] + out['Expenses']
+    return out.astype(np.int64)
+
+def assert_same_totals(rollup,frame,by='Category'):
+    pd.testing.assert_frame_equal(rollup.totals(by).astype(np.int64),
+                                  frame_totals(frame,by),
+                                  check_index_type=False,
+                                  check_categorical=False)
+
+@pytest.mark.parametrize('before,after',WINDOWS)
+def test_totals_match_frame(frame,before,after):
+    rollup = Rollup.from_frame(frame).window(before,after)
+    window = date_slice(frame,before,after)
+    assert_same_totals(rollup,window)
+    assert_same_totals(rollup,window,'Account')
+    assert_same_totals(rollup,window,['Category','Account'])
+
+@pytest.mark.parametrize('before,after',WINDOWS[:5])
+def test_analysis_matches_frame(frame,before,after):
+    rollup = Rollup.from_frame(frame).window(before,after)
+    window = date_slice(frame,before,after)
+    pd.testing.assert_frame_equal(analysis.get_category_sums(rollup),
+                                  analysis.get_category_sums(window),
+                                  check_index_type=False)
+    pd.testing.assert_series_equal(analysis.calculate_percentages(rollup),
+                                   analysis.calculate_percentages(window),
+                                   check_index_type=False,
+                                   check_categorical=False)
+
+def assert_same_cube(rollup,expected):
+    for cube,other in [(rollup.daily,expected.daily),
+                       (rollup.monthly,expected.monthly)]:
+        pd.testing.assert_frame_equal(
+            cube.reset_index(drop=True).astype({'Account' : str}),
+            other.reset_index(drop=True).astype({'Account' : str}))
+
+@pytest.mark.parametrize('shuffle',[False,True])
+def test_add_matches_from_frame(frame,shuffle):
+    order = np.arange(len(frame))
+    if shuffle:
+        order = np.random.default_rng(1).permutation(order)
+    rollup = Rollup.empty()
+    for chunk in np.array_split(order,7):
+        rollup.add(frame.iloc[np.sort(chunk)])
+    assert_same_cube(rollup,Rollup.from_frame(frame))
+
+def test_add_new_account(frame):
+    rollup = Rollup.from_frame(frame)
+    extra = make_frame(50,seed=3,accounts=('savings',),
+                       start='2020-05-01',ndays=20)
+    rollup.add(extra)
+    both = pd.concat([frame,extra]).sort_index(kind='mergesort')
+    assert_same_cube(rollup,Rollup.from_frame(both))
+    assert_same_totals(rollup.window('2020-05-03','2020-07-01'),
+                       date_slice(both,'2020-05-03','2020-07-01'),
+                       'Account')
+
+def test_empty():
+    rollup = Rollup.empty()
+    assert len(rollup) == 0
+    assert len(rollup.totals()) == 0
@@ -0,0 +1,76 @@
+"""
+tests/test_server.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+The server only answers requests that carry its token,
+and refuses options it can't run.
+"""
+
+# python
+import os
+import stat
+import socket
+import threading
+import pytest
+
+# hyperpyron
+from hyperpyron import server
+
+class EchoState:
+    "Stands in for a WarmState, replying with the arguments"
+    def run(self,argv,cwd=None):
+        return os.EX_OK," ".join(argv)+"\n"
+
+@pytest.fixture
+def running(workspace):
+    "A server with EchoState, on a Unix socket where available"
+    if hasattr(socket,'AF_UNIX'):
+        address = server.server_address(workspace)
+    else:
+        address = ('127.0.0.1',0)
+    s = server.make_server(address)
+    s.state = EchoState()
+    s.token = server.write_token(workspace)
+    thread = threading.Thread(target=s.serve_forever,daemon=True)
+    thread.start()
+    yield s.server_address
+    s.shutdown()
+    s.server_close()
+
+def test_token_is_private(workspace):
+    token = server.write_token(workspace)
+    mode = os.stat(server.token_path(workspace)).st_mode
+    assert stat.S_IMODE(mode) == 0o600
+    assert server.read_token(workspace) == token
+    assert server.write_token(workspace) != token
+
+def test_request_needs_token(workspace,running,capsys):
+    assert server.request(['-u'],running) == os.EX_NOPERM
+    assert server.request(['-u'],running,'wrong') == os.EX_NOPERM
+    assert "Invalid server token" in capsys.readouterr().out
+    token = server.read_token(workspace)
+    assert server.request(['-u','-d','30'],running,token) == os.EX_OK
+    assert capsys.readouterr().out == "-u -d 30\n"
+
+def test_no_server(workspace):
+    assert (server.request(['-u'],server.server_address(workspace))
+            == os.EX_UNAVAILABLE)
+
+@pytest.mark.parametrize('option',['--serve','--watch','--remote',
+                                   '--init','--store'])
+def test_rejected_options(workspace,option):
+    state = server.WarmState(workspace)
+    status,output = state.run([option,'-u'])
+    assert status == os.EX_USAGE
+    assert "can't be run by the server" in output
+    # nothing was loaded
+    assert state.data is None
+
+def test_warm_state(home,monkeypatch):
+    monkeypatch.setenv('MPLBACKEND','Agg')
+    workspace,data = home
+    state = server.WarmState(workspace)
+    state.refresh()
+    status,output = state.run(['-u','-b','2020-01-01','2021-12-31'])
+    assert status == os.EX_OK,output
+    assert len(state.frame) == 500
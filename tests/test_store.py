@@ -0,0 +1,120 @@
+"""
+tests/test_store.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+The transaction store holds the same rows as the frame
+it was synced with, and computes the same totals as
+the rollup cube.
+"""
+
+# python
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+
+# hyperpyron
+from hyperpyron import hyperparse
+from hyperpyron.rollup import Rollup
+from hyperpyron.schema import date_slice
+from hyperpyron.store import TransactionStore
+
+from conftest import WINDOWS,make_frame
+
+@pytest.fixture
+def store(tmp_path):
+    store = TransactionStore(str(tmp_path/'transactions.sqlite'))
+    yield store
+    store.close()
+
+def rows(frame):
+    "The rows of a compact frame, in a canonical order"
+    out = frame.reset_index(drop=True).astype({'Date' : 'datetime64[ns]',
+                                               'Description' : str,
+                                               'Category' : str,
+                                               'Account' : str})
+    return out.sort_values(list(out.columns)).reset_index(drop=True)
+
+def test_round_trip(store,frame):
+    assert store.sync(frame) == (len(frame),0,0)
+    assert len(store) == len(frame)
+    pd.testing.assert_frame_equal(rows(store.transactions()),rows(frame))
+    window = store.transactions('2020-02-01','2020-03-15')
+    pd.testing.assert_frame_equal(
+        rows(window),rows(date_slice(frame,'2020-02-01','2020-03-15')))
+    assert window.index.is_monotonic_increasing
+
+def test_identical_rows_are_kept_apart(store):
+    frame = make_frame(10,ndays=1)
+    frame = pd.concat([frame,frame,frame])
+    store.sync(frame)
+    assert len(store) == len(frame)
+
+def test_sync_only_writes_changes(store,frame):
+    store.sync(frame)
+    assert store.sync(frame) == (0,0,0)
+    changed = frame.copy()
+    changed.iloc[:5,changed.columns.get_loc('Category')] = 'Housing'
+    removed = changed.iloc[10:]
+    extra = make_frame(7,seed=5,start='2022-01-01',ndays=10)
+    synced = pd.concat([removed,extra])
+    inserted,updated,deleted = store.sync(synced)
+    assert (inserted,deleted) == (7,10)
+    # rows already in Housing weren't changed
+    assert updated <= 5
+    pd.testing.assert_frame_equal(rows(store.transactions()),rows(synced))
+
+def test_same_day_rows_keep_their_order(store):
+    frame = make_frame(40,ndays=2)
+    store.sync(frame)
+    got = store.transactions()
+    assert got['Description'].tolist() == frame['Description'].tolist()
+    # new rows come after those already there that day
+    extra = make_frame(20,seed=3,ndays=2)
+    store.upsert(pd.concat([frame,extra]))
+    got = store.transactions()
+    expected = pd.concat([frame,extra]).sort_values('Date',kind='mergesort')
+    assert got['Description'].tolist() == expected['Description'].tolist()
+
+def test_stores_without_seq_are_rebuilt(tmp_path,frame):
+    fpath = str(tmp_path/'transactions.sqlite')
+    conn = sqlite3.connect(fpath)
+    conn.executescript("CREATE TABLE transactions (key INTEGER PRIMARY KEY,"
+                       "date,description,amount,category,account);"
+                       "CREATE TABLE meta (name TEXT PRIMARY KEY,value);"
+                       "INSERT INTO meta VALUES ('schema','3');")
+    conn.close()
+    store = TransactionStore(fpath)
+    assert store.get_meta() == {}
+    assert store.sync(frame) == (len(frame),0,0)
+    store.close()
+
+@pytest.mark.parametrize('before,after',WINDOWS)
+def test_totals_match_rollup(store,frame,before,after):
+    store.sync(frame)
+    expected = Rollup.from_frame(frame).window(before,after)
+    got = store.window(before,after)
+    for by in ['Category','Account',['Category','Account']]:
+        pd.testing.assert_frame_equal(got.totals(by).astype(np.int64),
+                                      expected.totals(by).astype(np.int64),
+                                      check_index_type=False,
+                                      check_categorical=False)
+    columns = {'Date' : 'datetime64[ns]','Account' : str}
+    pd.testing.assert_frame_equal(
+        got.days().reset_index(drop=True).astype(columns),
+        expected.days().reset_index(drop=True).astype(columns))
+
+def test_len_counts_buckets(store,frame):
+    store.sync(frame)
+    assert len(store.window()) == len(Rollup.from_frame(frame))
+
+def test_workspace_store(workspace,frame):
+    assert hyperparse.load_store(workspace) is None
+    hyperparse.save_to_store(workspace,frame)
+    data = hyperparse.load_store(workspace)
+    pd.testing.assert_frame_equal(rows(data.transactions()),rows(frame))
+    data.store.close()
+    # stale once the categories change
+    with open(workspace.categories_file,'a') as f:
+        f.write("Groceries: [market]\n")
+    assert hyperparse.load_store(workspace) is None
@@ -0,0 +1,58 @@
+"""
+tests/test_trends.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Spending trends, and plots of windows with nothing
+to plot.
+"""
+
+# python
+import os
+import pytest
+
+# hyperpyron
+from hyperpyron import analysis
+from hyperpyron import trends
+from hyperpyron import reports
+from hyperpyron.budget import get_budget
+from hyperpyron.schema import date_slice
+
+def income_only(frame):
+    return frame.loc[frame['Amount'].values > 0]
+
+def test_spending_by_period_totals(frame):
+    spending = trends.spending_by_period(frame,'month')
+    expenses = -frame['Amount'].where(frame['Amount'] < 0,0).sum()/100
+    assert spending.to_numpy().sum() == pytest.approx(expenses)
+
+@pytest.mark.parametrize('window',['empty','income'])
+def test_plots_of_nothing(frame,tmp_path,window):
+    if window == 'empty':
+        data = date_slice(frame,'2030-01-01','2030-02-01')
+    else:
+        data = income_only(frame)
+    assert len(trends.spending_by_period(data,'month').columns) == 0
+    for name,plot in [('t',lambda f: trends.plot_spending_trends(
+                          data,'month',f,False,5.0)),
+                      ('p',lambda f: analysis.plot_percent_expenditures(
+                          data,f,False,5.0))]:
+        fpath = str(tmp_path/(name+'.png'))
+        plot(fpath)
+        assert os.path.exists(fpath)
+
+def test_report_with_empty_month(frame,workspace,tmp_path):
+    # nothing at all in March, and only income in May
+    march = (frame.index >= '2020-03-01') & (frame.index < '2020-04-01')
+    may = ((frame.index >= '2020-05-01') & (frame.index < '2020-06-01')
+           & (frame['Amount'].values < 0))
+    data = frame.loc[~(march | may)]
+    written = reports.batch_report(data,str(tmp_path),'month',
+                                   '2020-01-01','2020-06-30',
+                                   executor='serial',
+                                   budget=get_budget('month',workspace))
+    months = sorted(set(os.path.basename(os.path.dirname(f))
+                        for f in written))
+    # months without any transactions are skipped, but
+    # months without expenditures still get every plot
+    assert months == ['2020-01','2020-02','2020-04','2020-05','2020-06']
+    assert len(written) == 5*len(reports.REPORT_PLOTS)
@@ -0,0 +1,107 @@
+"""
+tests/test_watch.py
+Author: Jonah Miller (jonah.maxwell.miller@gmail.com)
+
+Watching data directories, and keeping the frame, cube
+and cache up to date as files land. See watch.LiveData.
+"""
+
+# python
+import os
+import pandas as pd
+import pytest
+
+# hyperpyron
+from hyperpyron import iconfig
+from hyperpyron import hyperparse
+from hyperpyron import watch
+from hyperpyron.rollup import Rollup
+from hyperpyron.schema import compact,index_by_date,insert_sorted,is_compact
+
+from conftest import make_frame,write_statement
+
+def canonical(frame):
+    return compact(frame).reset_index(drop=True).astype(
+        {'Date' : 'datetime64[ns]','Description' : str,'Account' : str})
+
+def assert_same_rows(got,expected):
+    key = ['Date','Description','Amount','Category']
+    pd.testing.assert_frame_equal(
+        canonical(got).sort_values(key,kind='mergesort').reset_index(drop=True),
+        canonical(expected).sort_values(key,kind='mergesort').reset_index(drop=True))
+
+def test_insert_sorted(frame):
+    rows = make_frame(300,seed=4,accounts=('savings','checking'))
+    got = insert_sorted(frame,rows)
+    expected = index_by_date(compact(pd.concat([frame,rows],
+                                               ignore_index=True)))
+    assert is_compact(got)
+    assert got.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(got.astype({'Description' : str,
+                                              'Account' : str}),
+                                  expected.astype({'Description' : str,
+                                                   'Account' : str}))
+    assert len(insert_sorted(frame.iloc[:0],rows)) == len(rows)
+
+def test_polling_watcher(tmp_path):
+    watcher = watch.PollingWatcher([str(tmp_path)],interval=0.01,settle=0.01)
+    assert watcher.wait(timeout=0.05) == set()
+    fpath = str(tmp_path/'new.csv')
+    with open(fpath,'w') as f:
+        f.write('x')
+    assert watcher.wait(timeout=1) == {fpath}
+
+@pytest.mark.skipif(watch.load_inotify() is None,
+                    reason="inotify is not available")
+def test_inotify_watcher(tmp_path):
+    watcher = watch.InotifyWatcher([str(tmp_path)],settle=0.05)
+    try:
+        assert watcher.wait(timeout=0.05) == set()
+        fpath = str(tmp_path/'new.csv')
+        with open(fpath,'w') as f:
+            f.write('x')
+        assert fpath in watcher.wait(timeout=1)
+        # new directories are watched too
+        os.mkdir(str(tmp_path/'sub'))
+        watcher.wait(timeout=0.2)
+        other = str(tmp_path/'sub'/'other.csv')
+        with open(other,'w') as f:
+            f.write('y')
+        assert other in watcher.wait(timeout=1)
+    finally:
+        watcher.close()
+
+def test_live_data(home,monkeypatch):
+    workspace,data = home
+    monkeypatch.setattr(iconfig,'WATCH_SAVE',3600.0)
+    live = watch.LiveData(workspace)
+    assert len(live.frame) == 500
+    cached = hyperparse.load_from_cache(workspace)
+    fpaths = []
+    for i in range(3):
+        fpath = str(data/'new{}.csv'.format(i))
+        write_statement(fpath,make_frame(40,seed=10+i,accounts=('bank',)))
+        fpaths.append(fpath)
+        assert live.update([fpath])
+    assert len(live.frame) == 620
+    assert live.frame.index.is_monotonic_increasing
+    # nothing is saved until save is due
+    assert len(hyperparse.load_from_cache(workspace)) == len(cached)
+    assert live.save_timeout() == iconfig.WATCH_SAVE
+    live.save()
+    assert live.save_timeout() is None
+    expected = hyperparse.parse_from_data(workspace)
+    assert_same_rows(live.frame,expected)
+    assert_same_rows(hyperparse.load_from_cache(workspace),expected)
+    pd.testing.assert_frame_equal(hyperparse.load_rollup(workspace).totals(),
+                                  Rollup.from_frame(compact(expected)).totals())
+    # and a fresh start needs nothing parsed
+    assert not watch.LiveData(workspace).pending()
+
+def test_live_data_reloads_changed_file(home):
+    workspace,data = home
+    live = watch.LiveData(workspace)
+    write_statement(str(data/'2020.csv'),make_frame(100,accounts=('bank',)))
+    assert live.update([str(data/'2020.csv')])
+    assert len(live.frame) == 100
+    assert len(hyperparse.load_from_cache(workspace)) == 100